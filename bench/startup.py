@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Measure pi-bridge cold-start time for short, read-only commands.
+
+Each command is run repeatedly as a fresh process. Wall time is reported
+alongside a per-phase breakdown taken from `python3 -X importtime`:
+
+  interpreter  bare interpreter with the launcher's shebang flags
+  stdlib       standard library modules imported by the launcher/command
+  config       the shared config module
+  command      the command's own CLI modules (excluding config)
+  run          everything else: argument parsing, subprocesses, output
+
+Usage:
+  bench/startup.py                       # default command set, 20 runs each
+  bench/startup.py -n 50 "interface show" status
+  bench/startup.py --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+LAUNCHER = PROJECT_DIR / "bin" / "pi-bridge"
+CLI_MODULES = {p.stem for p in (PROJECT_DIR / "cli").glob("*.py")}
+
+DEFAULT_COMMANDS = [
+    "--help",
+    "interface show",
+    "forwarding list",
+    "status",
+    "clients",
+]
+
+TARGET_MS = 100
+
+
+def run_once(argv: list[str], env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    return (time.perf_counter() - started) * 1000
+
+
+def wall_times(argv: list[str], runs: int, env: dict) -> list[float]:
+    run_once(argv, env)  # warm the page cache and bytecode
+    return [run_once(argv, env) for _ in range(runs)]
+
+
+def importtime_entries(stderr: str):
+    """Yield (depth, module, cumulative ms) from `-X importtime` output."""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        yield depth, name.strip(), int(cumulative_us) / 1000
+
+
+def interpreter_flags() -> list[str]:
+    """Interpreter flags from the launcher's shebang line (e.g. -S)."""
+    with open(LAUNCHER) as f:
+        shebang = f.readline().split()
+    return [a for a in shebang[shebang.index(next(a for a in shebang if "python" in a)) + 1:]]
+
+
+def interpreter_modules(env: dict) -> set[str]:
+    """Modules already imported by a bare interpreter, counted as interpreter time."""
+    result = subprocess.run([sys.executable, *interpreter_flags(), "-X", "importtime", "-c", "pass"],
+                            capture_output=True, text=True, env=env)
+    return {module for _, module, _ in importtime_entries(result.stderr)}
+
+
+def parse_importtime(stderr: str, skip: set[str] = frozenset()) -> dict[str, float]:
+    """Sum cumulative import times (ms) of top-level imports by phase."""
+    phases = {"stdlib": 0.0, "config": 0.0, "command": 0.0}
+    config_nested = 0.0
+    for depth, module, cumulative in importtime_entries(stderr):
+        if module in skip:
+            continue
+        if module == "config" and depth > 0:
+            config_nested = cumulative
+        if depth != 0:
+            continue
+        if module == "config":
+            phases["config"] += cumulative
+        elif module.split(".")[0] in CLI_MODULES:
+            phases["command"] += cumulative
+        else:
+            phases["stdlib"] += cumulative
+    # config is normally pulled in by the command module; report it on its own
+    phases["config"] += config_nested
+    phases["command"] = max(phases["command"] - config_nested, 0.0)
+    return phases
+
+
+def import_phases(argv: list[str], env: dict, runs: int) -> dict[str, float]:
+    skip = interpreter_modules(env)
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            env={**env, "PYTHONPROFILEIMPORTTIME": "1"},
+        )
+        samples.append(parse_importtime(result.stderr, skip))
+    return {phase: statistics.median(s[phase] for s in samples) for phase in samples[0]}
+
+
+def summarize(times: list[float]) -> dict[str, float]:
+    ordered = sorted(times)
+    return {
+        "min_ms": round(ordered[0], 1),
+        "median_ms": round(statistics.median(ordered), 1),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pi-bridge cold start")
+    parser.add_argument("commands", nargs="*", help="Commands to time (default: read-only set)")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Runs per command (default: 20)")
+    parser.add_argument("--json", metavar="FILE", help="Also write results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PATH"] = f"{LAUNCHER.parent}{os.pathsep}{env.get('PATH', '')}"
+
+    bare = [sys.executable, *interpreter_flags(), "-c", "pass"]
+    interpreter = statistics.median(wall_times(bare, args.runs, env))
+    results = {"python": sys.version.split()[0], "interpreter_ms": round(interpreter, 1),
+               "target_ms": TARGET_MS, "commands": {}}
+
+    print(f"{'COMMAND':<20} {'MEDIAN':>8} {'P90':>8} {'INTERP':>8} {'STDLIB':>8} "
+          f"{'CONFIG':>8} {'COMMAND':>8} {'RUN':>8}")
+    for command in args.commands or DEFAULT_COMMANDS:
+        argv = [str(LAUNCHER)] + command.split()
+        stats = summarize(wall_times(argv, args.runs, env))
+        phases = import_phases(argv, env, max(3, args.runs // 4))
+        run = stats["median_ms"] - interpreter - sum(phases.values())
+        breakdown = {"interpreter": interpreter, **phases, "run": max(run, 0.0)}
+        results["commands"][command] = {
+            **stats,
+            "phases_ms": {k: round(v, 1) for k, v in breakdown.items()},
+        }
+        flag = "" if stats["median_ms"] < TARGET_MS else "  (over target)"
+        print(f"{command:<20} {stats['median_ms']:>8.1f} {stats['p90_ms']:>8.1f} "
+              + " ".join(f"{v:>8.1f}" for v in breakdown.values()) + flag)
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Benchmark pi-bridge commands against the docker stubs at increasing scale.
+
+Each scenario seeds the simulator (docker/simulator) with stations, DHCP
+leases and iptables rules, runs one command several times as a fresh
+process and records:
+
+  wall_ms     median wall time
+  calls       external commands the CLI ran (via PI_BRIDGE_CALL_LOG)
+  peak_rss_kb peak resident set size of the pi-bridge process (os.wait4)
+
+Scales:
+  clients  stations in `iw station dump` and lines in the lease file
+  wans     interfaces with NAT forwarding rules
+  rules    unrelated filter rules already in iptables
+
+Results are written as JSON and can be compared against a stored baseline:
+
+  bench/suite.py --output bench.json
+  bench/suite.py --baseline bench.json --threshold 25
+  bench/suite.py --latency iptables=20 --latency '*=5'   # model a slow Pi
+
+This rewrites simulator state and /etc config, so only run it in the
+docker test container (or an equivalent stub environment).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+LAUNCHER = PROJECT_DIR / "bin" / "pi-bridge"
+
+sys.path.insert(0, os.environ.get("PI_BRIDGE_SIM_PATH", str(PROJECT_DIR / "docker")))
+sys.path.insert(0, str(PROJECT_DIR / "cli"))
+from simulator.client import admin  # noqa: E402
+import acl  # noqa: E402
+import firewall  # noqa: E402
+import forwarding  # noqa: E402
+
+LEASE_FILE = Path("/var/lib/misc/dnsmasq.leases")
+HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
+
+DEFAULT_SCALES = [1, 10, 100, 500]
+AP_INTERFACE = "wlan1"
+BENCH_WAN = "usb0"
+
+
+# --- simulator state seeding ------------------------------------------------
+
+def nat_rule_args(wan: str) -> list[list[str]]:
+    """forwarding.nat_rules() for a WAN as add arguments; the block rule is inserted on top."""
+    block = acl.block_rule(AP_INTERFACE, wan)
+    return [[("-I" if rule == block else "-A") if arg == "-C" else arg for arg in rule]
+            for rule in forwarding.nat_rules(wan, AP_INTERFACE)]
+
+
+def seed_clients(count: int) -> None:
+    admin("generate", kind="stations", count=count, interface=AP_INTERFACE)
+    admin("generate", kind="leases", count=count)
+
+
+def seed_iptables(wans: int = 1, rules: int = 0) -> None:
+    """Forwarding for eth0 plus `wans - 1` extra WANs and `rules` filler rules."""
+    admin("iptables", tables={})
+    for args in acl.set_commands():
+        subprocess.run(["ipset"] + args, capture_output=True)
+    for args in nat_rule_args("eth0"):
+        iptables(args)
+    if wans > 1:
+        admin("generate", kind="wans", count=wans - 1, ap=AP_INTERFACE)
+    if rules:
+        admin("generate", kind="rules", count=rules)
+
+
+def iptables(args: list[str]) -> None:
+    """Run a rule through the iptables stub."""
+    subprocess.run(["iptables"] + args, capture_output=True)
+
+
+def remove_bench_wan() -> None:
+    for args in nat_rule_args(BENCH_WAN):
+        iptables(firewall.with_action(args, "-D"))
+
+
+def add_bench_wan() -> None:
+    remove_bench_wan()
+    for args in nat_rule_args(BENCH_WAN):
+        iptables(args)
+
+
+def start_hostapd() -> None:
+    subprocess.run(["systemctl", "start", "hostapd"], capture_output=True)
+
+
+def set_ap_interface(interface: str) -> None:
+    content = HOSTAPD_CONF.read_text()
+    lines = [f"interface={interface}" if line.startswith("interface=") else line
+             for line in content.splitlines()]
+    HOSTAPD_CONF.write_text("\n".join(lines) + "\n")
+
+
+# --- scenarios ---------------------------------------------------------------
+
+class Scenario:
+    def __init__(self, name: str, argv: list[str], dimension: str | None,
+                 seed=None, prepare=None, stdin: str | None = None, env: dict | None = None):
+        self.name = name
+        self.argv = argv
+        self.dimension = dimension
+        self.seed = seed          # seed(scale): once per scale
+        self.prepare = prepare    # prepare(): before every run, untimed
+        self.stdin = stdin
+        self.env = env or {}
+
+
+SCENARIOS = [
+    Scenario("status", ["status"], "clients", seed=lambda n: (seed_iptables(), seed_clients(n))),
+    Scenario("clients", ["clients"], "clients", seed=lambda n: (seed_iptables(), seed_clients(n))),
+    Scenario("status", ["status"], "wans", seed=lambda n: (seed_clients(0), seed_iptables(wans=n))),
+    Scenario("forwarding list", ["forwarding", "list"], "wans",
+             seed=lambda n: seed_iptables(wans=n)),
+    Scenario("forwarding add", ["forwarding", "add", BENCH_WAN], "wans",
+             seed=lambda n: seed_iptables(wans=n), prepare=remove_bench_wan),
+    Scenario("forwarding remove", ["forwarding", "remove", BENCH_WAN], "wans",
+             seed=lambda n: seed_iptables(wans=n), prepare=add_bench_wan),
+    Scenario("forwarding add", ["forwarding", "add", BENCH_WAN], "rules",
+             seed=lambda n: seed_iptables(rules=n), prepare=remove_bench_wan),
+    Scenario("forwarding remove", ["forwarding", "remove", BENCH_WAN], "rules",
+             seed=lambda n: seed_iptables(rules=n), prepare=add_bench_wan),
+    Scenario("interface switch", ["interface", "switch", "wlan0"], None,
+             seed=lambda n: (seed_clients(0), seed_iptables()),
+             prepare=lambda: set_ap_interface(AP_INTERFACE)),
+    # Wall time includes waiting for every client to reassociate (--measure)
+    Scenario("update-creds", ["update-creds", "--passphrase-stdin", "--measure"], "clients",
+             seed=lambda n: (start_hostapd(), seed_clients(n)), stdin="testpassword\n"),
+    Scenario("update-creds --restart", ["update-creds", "--passphrase-stdin", "--measure", "--restart"],
+             "clients", seed=lambda n: (start_hostapd(), seed_clients(n)), stdin="testpassword\n"),
+    Scenario("setup --use-defaults", ["setup", "--use-defaults"], None,
+             stdin="testpassword\n", env={"PI_BRIDGE_SKIP_PACKAGE_INSTALL": "1"}),
+]
+
+
+# --- measurement -------------------------------------------------------------
+
+def measure(scenario: Scenario, call_log: Path) -> dict:
+    """Run the command once; return wall time, call count and peak RSS."""
+    call_log.unlink(missing_ok=True)
+    env = dict(os.environ, PI_BRIDGE_CALL_LOG=str(call_log), **scenario.env)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [str(LAUNCHER)] + scenario.argv, env=env,
+        stdin=subprocess.PIPE if scenario.stdin else subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True,
+    )
+    if scenario.stdin:
+        process.stdin.write(scenario.stdin)
+        process.stdin.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    calls = len(call_log.read_text().splitlines()) if call_log.exists() else 0
+    return {
+        "wall_ms": wall * 1000,
+        "calls": calls,
+        "peak_rss_kb": usage.ru_maxrss,
+        "returncode": process.returncode,
+    }
+
+
+def run_scenario(scenario: Scenario, scale: int, runs: int, call_log: Path) -> dict:
+    if scenario.seed:
+        scenario.seed(scale)
+    samples = []
+    for _ in range(runs):
+        if scenario.prepare:
+            scenario.prepare()
+        samples.append(measure(scenario, call_log))
+    failed = [s["returncode"] for s in samples if s["returncode"] != 0]
+    return {
+        "command": scenario.name,
+        "dimension": scenario.dimension,
+        "scale": scale,
+        "runs": runs,
+        "wall_ms": round(statistics.median(s["wall_ms"] for s in samples), 1),
+        "wall_ms_min": round(min(s["wall_ms"] for s in samples), 1),
+        "calls": max(s["calls"] for s in samples),
+        "peak_rss_kb": max(s["peak_rss_kb"] for s in samples),
+        "failed_runs": len(failed),
+    }
+
+
+def key(result: dict) -> str:
+    if result["dimension"] is None:
+        return result["command"]
+    return f"{result['command']} [{result['dimension']}={result['scale']}]"
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """Lines describing regressions beyond `threshold` percent in wall time or calls."""
+    previous = {key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        if before["wall_ms"] and result["wall_ms"] > before["wall_ms"] * (1 + threshold / 100):
+            change = (result["wall_ms"] / before["wall_ms"] - 1) * 100
+            regressions.append(f"{key(result)}: wall {before['wall_ms']} -> {result['wall_ms']} ms "
+                               f"(+{change:.0f}%)")
+        if result["calls"] > before["calls"]:
+            regressions.append(f"{key(result)}: calls {before['calls']} -> {result['calls']}")
+    return regressions
+
+
+def check_environment() -> None:
+    iptables = shutil.which("iptables")
+    if iptables is None or not Path(iptables).read_bytes().startswith(b"#!"):
+        raise SystemExit("Refusing to run: `iptables` on PATH is not the docker stub.")
+
+
+def snapshot() -> dict:
+    files = {p: p.read_bytes() if p.exists() else None for p in (LEASE_FILE, HOSTAPD_CONF)}
+    return {"iptables": admin("state")["state"]["iptables"], "files": files}
+
+
+def restore(saved: dict) -> None:
+    admin("iptables", tables=saved["iptables"])
+    admin("stations", stations=[])
+    admin("leases", leases=[])
+    admin("clear", what="latency")
+    for path, content in saved["files"].items():
+        if content is None:
+            path.unlink(missing_ok=True)
+        else:
+            path.write_bytes(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pi-bridge commands against the stubs")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Comma-separated scales (default: %(default)s)")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Runs per measurement (default: 5)")
+    parser.add_argument("--only", action="append", default=[],
+                        help="Only run commands starting with this (repeatable)")
+    parser.add_argument("--latency", action="append", default=[], metavar="CMD=MS",
+                        help="Simulated per-call latency, e.g. iptables=20 or '*=5' (repeatable)")
+    parser.add_argument("--output", help="Write results JSON here ('-' for stdout)")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON")
+    parser.add_argument("--threshold", type=float, default=25.0,
+                        help="Allowed wall-time regression in percent (default: 25)")
+    args = parser.parse_args()
+
+    check_environment()
+    scales = [int(s) for s in args.scales.split(",") if s]
+    scenarios = [s for s in SCENARIOS if not args.only or any(s.name.startswith(o) for o in args.only)]
+
+    saved = snapshot()
+    for spec in args.latency:
+        command, _, ms = spec.partition("=")
+        admin("latency", command=command, ms=float(ms or 0))
+    results = []
+    print(f"{'COMMAND':<36} {'WALL ms':>9} {'CALLS':>6} {'RSS KB':>8}", file=sys.stderr)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            call_log = Path(tmp) / "calls.jsonl"
+            for scenario in scenarios:
+                for scale in (scales if scenario.dimension else [1]):
+                    result = run_scenario(scenario, scale, args.runs, call_log)
+                    results.append(result)
+                    failed = f"  ({result['failed_runs']} failed)" if result["failed_runs"] else ""
+                    print(f"{key(result):<36} {result['wall_ms']:>9.1f} {result['calls']:>6} "
+                          f"{result['peak_rss_kb']:>8}{failed}", file=sys.stderr)
+    finally:
+        restore(saved)
+
+    report = {
+        "python": sys.version.split()[0],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": args.runs,
+        "latency": args.latency,
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        if regressions:
+            print("\nRegressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions against baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Client block and allow lists kept in ipsets.
+
+Entries live in kernel hash sets, so checking a packet costs one hash
+lookup however many clients are listed, and blocking or unblocking a
+client is a single `ipset` call that leaves the iptables ruleset alone.
+
+FORWARD references the sets from two kinds of rule:
+  - per WAN, the block rule drops AP-to-WAN traffic whose source MAC or
+    address is in pi-bridge-block (a list:set of the MAC and network
+    sets). It is one of forwarding.nat_rules(), so it is added and
+    removed with the WAN's forwarding, by setup and by the bench router;
+  - while the allowlist has entries, the allow rule drops clients on the
+    AP interface whose MAC is not in pi-bridge-allow.
+
+netfilter-persistent saves the sets together with the rules when
+ipset-persistent is installed.
+"""
+import ipaddress
+import re
+import subprocess
+
+import firewall
+import runner
+import transaction
+from locks import locked
+
+BLOCK_SET = "pi-bridge-block"
+BLOCK_MAC_SET = "pi-bridge-block-mac"
+BLOCK_NET_SET = "pi-bridge-block-net"
+ALLOW_SET = "pi-bridge-allow"
+
+# Creation order: list:set members must exist before the list
+SET_TYPES = {
+    BLOCK_MAC_SET: "hash:mac",
+    BLOCK_NET_SET: "hash:net",
+    ALLOW_SET: "hash:mac",
+    BLOCK_SET: "list:set",
+}
+
+IPSET_MISSING = "ipset is not installed; run `pi-bridge install-deps` to install it."
+
+MAC_RE = re.compile(r"^[0-9a-f]{2}([:-][0-9a-f]{2}){5}$", re.IGNORECASE)
+
+
+def block_rule(ap_interface: str, wan_interface: str) -> list[str]:
+    return ["-C", "FORWARD", "-i", ap_interface, "-o", wan_interface, "-m", "set", "--match-set", BLOCK_SET,
+            "src", "-j", "DROP"]
+
+
+def allow_rule(ap_interface: str) -> list[str]:
+    return ["-C", "FORWARD", "-i", ap_interface, "-m", "set", "!", "--match-set", ALLOW_SET, "src",
+            "-j", "DROP"]
+
+
+class IpsetMissing(RuntimeError):
+    """The ipset command is missing, as on installs that predate the block lists."""
+
+
+def normalize(entry: str) -> tuple[str, str]:
+    """Classify an entry as ("mac", aa:bb:..) or ("net", a.b.c.d[/n])."""
+    if MAC_RE.match(entry):
+        return "mac", entry.lower().replace("-", ":")
+    try:
+        network = ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        raise RuntimeError(f"Not a MAC address, IP address or network: {entry}") from None
+    if network.version != 4:
+        raise RuntimeError(f"Only IPv4 addresses are supported: {entry}")
+    return "net", str(network.network_address) if network.prefixlen == 32 else str(network)
+
+
+def run_ipset(args: list[str]) -> subprocess.CompletedProcess:
+    result = runner.run(["sudo", "ipset"] + args, capture_output=True, text=True)
+    # sudo's own error when the program isn't on its secure_path
+    if result.returncode != 0 and "command not found" in result.stderr:
+        raise IpsetMissing(IPSET_MISSING)
+    return result
+
+
+def ipset(args: list[str]) -> None:
+    result = run_ipset(args)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ipset {' '.join(args)} failed")
+
+
+def read_sets() -> dict[str, set[str]]:
+    """Members of the pi-bridge sets that exist, from one `ipset save`."""
+    result = run_ipset(["save"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not read ipsets: {result.stderr.strip()}")
+    sets: dict[str, set[str]] = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) < 3 or parts[1] not in SET_TYPES:
+            continue
+        if parts[0] == "create":
+            sets.setdefault(parts[1], set())
+        elif parts[0] == "add":
+            member = parts[2].lower() if SET_TYPES[parts[1]] == "hash:mac" else parts[2]
+            sets.setdefault(parts[1], set()).add(member)
+    return sets
+
+
+def set_commands() -> list[list[str]]:
+    """ipset arguments that create every set, for a namespace without them."""
+    return ([["create", name, kind, "-exist"] for name, kind in SET_TYPES.items()]
+            + [["add", BLOCK_SET, member, "-exist"] for member in (BLOCK_MAC_SET, BLOCK_NET_SET)])
+
+
+def ensure_sets(sets: dict[str, set[str]]) -> None:
+    for name, kind in SET_TYPES.items():
+        if name not in sets:
+            ipset(["create", name, kind, "-exist"])
+            sets[name] = set()
+    for member in (BLOCK_MAC_SET, BLOCK_NET_SET):
+        if member not in sets[BLOCK_SET]:
+            ipset(["add", BLOCK_SET, member, "-exist"])
+            sets[BLOCK_SET].add(member)
+
+
+def add_member(sets: dict[str, set[str]], name: str, entry: str) -> bool:
+    if entry in sets[name]:
+        return False
+    ipset(["add", name, entry, "-exist"])
+    sets[name].add(entry)
+    record(f"ipset add {name} {entry}", lambda: ipset(["del", name, entry, "-exist"]))
+    return True
+
+
+def remove_member(sets: dict[str, set[str]], name: str, entry: str) -> bool:
+    if entry not in sets.get(name, ()):
+        return False
+    ipset(["del", name, entry, "-exist"])
+    sets[name].discard(entry)
+    record(f"ipset del {name} {entry}", lambda: ipset(["add", name, entry, "-exist"]))
+    return True
+
+
+def record(description: str, undo) -> None:
+    tx = transaction.active()
+    if tx is not None:
+        tx.record(description, undo)
+
+
+@locked("firewall")
+def block(entries: list[str], ap_interface: str) -> int:
+    """Block MACs, addresses or networks. Returns entries added."""
+    # forwarding imports this module for block_rule()
+    from forwarding import forwarding_interfaces
+
+    targets = [normalize(entry) for entry in entries]
+    sets = read_sets()
+    ensure_sets(sets)
+    added = sum(add_member(sets, BLOCK_MAC_SET if kind == "mac" else BLOCK_NET_SET, value)
+                for kind, value in targets)
+
+    # nat_rules() adds the block rule with forwarding; this covers forwarding set up before it did
+    fw = firewall.current()
+    for wan in forwarding_interfaces():
+        fw.ensure(block_rule(ap_interface, wan), insert=True)
+    # The single rule for all WANs that the per-WAN rules replace
+    fw.discard(["-C", "FORWARD", "-m", "set", "--match-set", BLOCK_SET, "src", "-j", "DROP"])
+    fw.save()
+    return added
+
+
+@locked("firewall")
+def allow(entries: list[str], ap_interface: str) -> int:
+    """Add MACs to the allowlist, which then admits only listed clients. Returns entries added."""
+    targets = [normalize(entry) for entry in entries]
+    if any(kind != "mac" for kind, _ in targets):
+        raise RuntimeError("The allowlist takes MAC addresses only")
+    sets = read_sets()
+    ensure_sets(sets)
+    added = sum(add_member(sets, ALLOW_SET, value) for _, value in targets)
+
+    fw = firewall.current()
+    fw.ensure(allow_rule(ap_interface), insert=True)
+    fw.save()
+    return added
+
+
+@locked("firewall")
+def unblock(entries: list[str], ap_interface: str) -> int:
+    """Remove entries from the block list and the allowlist. Returns entries removed."""
+    targets = [normalize(entry) for entry in entries]
+    sets = read_sets()
+
+    fw = firewall.current()
+    if not sets.get(ALLOW_SET, set()) - {value for _, value in targets}:
+        # Drop the rule first: behind it, an empty allowlist blocks every client
+        fw.discard(allow_rule(ap_interface))
+
+    removed = 0
+    for kind, value in targets:
+        names = (BLOCK_MAC_SET, ALLOW_SET) if kind == "mac" else (BLOCK_NET_SET,)
+        removed += sum(remove_member(sets, name, value) for name in names)
+    fw.save()
+    return removed
+
+
+def list_entries() -> dict[str, list[str]]:
+    sets = read_sets()
+    return {
+        "blocked": sorted(sets.get(BLOCK_MAC_SET, set()) | sets.get(BLOCK_NET_SET, set())),
+        "allowed": sorted(sets.get(ALLOW_SET, set())),
+    }
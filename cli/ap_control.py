@@ -1,37 +1,51 @@
 #!/usr/bin/env python3
-import subprocess
 import sys
 
+import runner
 from config import logger, DEFAULTS
+from locks import locked
 
 
 def control_service(service: str, action: str) -> bool:
     """Start or stop a service. Returns True if successful."""
     logger.info(f"  {action.capitalize()}ing {service}...")
-    result = subprocess.run(
+    result = runner.run(
         ["sudo", "systemctl", action, service],
         capture_output=True, text=True
     )
     return result.returncode == 0
 
 
-def stop_ap():
-    """Stop all AP services."""
-    logger.info("=== Stopping AP ===\n")
+def ap_services(interface: str | None = None) -> list[str]:
+    """AP services in start order."""
+    interface = interface or DEFAULTS.get("DEFAULT_AP_INTERFACE", "wlan1")
+    return [
+        f"{interface}-static-ip",
+        "hostapd",
+        "dnsmasq",
+    ]
 
-    interface = DEFAULTS.get("DEFAULT_AP_INTERFACE", "wlan1")
 
+@locked("units")
+def stop_services() -> list[str]:
+    """Stop AP services. Returns the services that failed to stop."""
     # Stop in reverse order
-    services = [
-        "dnsmasq",
-        "hostapd",
-        f"{interface}-static-ip",
-    ]
+    return [service for service in reversed(ap_services())
+            if not control_service(service, "stop")]
+
 
-    failed = []
-    for service in services:
-        if not control_service(service, "stop"):
-            failed.append(service)
+@locked("units")
+def start_services() -> list[str]:
+    """Start AP services. Returns the services that failed to start."""
+    return [service for service in ap_services()
+            if not control_service(service, "start")]
+
+
+def stop_ap():
+    """Stop all AP services."""
+    logger.info("=== Stopping AP ===\n")
+
+    failed = stop_services()
 
     logger.info("")
     if failed:
@@ -45,18 +59,7 @@ def start_ap():
     """Start all AP services."""
     logger.info("=== Starting AP ===\n")
 
-    interface = DEFAULTS.get("DEFAULT_AP_INTERFACE", "wlan1")
-
-    services = [
-        f"{interface}-static-ip",
-        "hostapd",
-        "dnsmasq",
-    ]
-
-    failed = []
-    for service in services:
-        if not control_service(service, "start"):
-            failed.append(service)
+    failed = start_services()
 
     logger.info("")
     if failed:
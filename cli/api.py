@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from config import logger, STATE_DIR
+
+import ap_control
+import clients
+import forwarding
+import interface
+import restart
+import status
+import update_creds
+
+DEFAULT_SOCKET = STATE_DIR / "api.sock"
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TTLCache:
+    """Caches one blocking read for a short time; concurrent callers share a single load."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0.0
+        self.generation = -1
+        self.lock = asyncio.Lock()
+
+    async def get(self, loader, generation: int):
+        async with self.lock:
+            if time.monotonic() < self.expires and self.generation == generation:
+                return self.value
+            value = await asyncio.to_thread(loader)
+            self.value = value
+            self.generation = generation
+            self.expires = time.monotonic() + self.ttl
+            return value
+
+
+class ApiServer:
+    """JSON API over HTTP/1.1 backed by the CLI modules."""
+
+    def __init__(self, cache_ttl: float, token: str | None = None):
+        self.token = token
+        self.caches = {
+            "status": TTLCache(cache_ttl),
+            "clients": TTLCache(cache_ttl),
+            "forwarding": TTLCache(cache_ttl),
+            "interface": TTLCache(cache_ttl),
+        }
+        # Bumped after every mutation so reads started before it aren't reused
+        self.generation = 0
+        self.write_lock = asyncio.Lock()
+
+    async def read(self, name: str, loader):
+        return await self.caches[name].get(loader, self.generation)
+
+    async def mutate(self, func, *args):
+        """Run a mutating operation; only one runs at a time."""
+        async with self.write_lock:
+            try:
+                return await asyncio.to_thread(func, *args)
+            finally:
+                self.generation += 1
+
+    async def dispatch(self, method: str, path: str, body: dict) -> dict:
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+        route = parts[0] if parts else ""
+
+        if route == "status" and len(parts) == 1:
+            self.allow(method, "GET")
+            return await self.read("status", status.collect_status)
+
+        if route == "clients" and len(parts) == 1:
+            self.allow(method, "GET")
+            return {"clients": await self.read("clients", clients.list_clients)}
+
+        if route == "forwarding":
+            if len(parts) == 1 and method == "GET":
+                return {"interfaces": await self.read("forwarding", forwarding.forwarding_interfaces)}
+            if len(parts) == 1:
+                self.allow(method, "POST")
+                wan = self.field(body, "interface")
+                return {"interface": wan, "added": await self.mutate(forwarding.add_forwarding, wan)}
+            if len(parts) == 2:
+                self.allow(method, "DELETE")
+                return {"interface": parts[1],
+                        "removed": await self.mutate(forwarding.remove_forwarding, parts[1])}
+
+        if route == "interface" and len(parts) == 1:
+            if method == "GET":
+                return {"interface": await self.read("interface", interface.parse_hostapd_interface)}
+            self.allow(method, "POST")
+            new_interface = self.field(body, "interface")
+            wan = body.get("wan")
+            await self.mutate(interface.switch_interface, new_interface, wan)
+            return {"interface": new_interface}
+
+        if route == "credentials" and len(parts) == 1:
+            self.allow(method, "POST")
+            ssid = body.get("ssid") or None
+            passphrase = body.get("passphrase") or None
+            if not ssid and not passphrase:
+                raise ApiError(400, "ssid and/or passphrase required")
+            if not all(isinstance(v, str) for v in (ssid, passphrase) if v is not None):
+                raise ApiError(400, "ssid and passphrase must be strings")
+            try:
+                if ssid:
+                    update_creds.validate_ssid(ssid)
+                if passphrase:
+                    update_creds.validate_passphrase(passphrase)
+            except RuntimeError as e:
+                raise ApiError(400, str(e)) from None
+            applied = await self.mutate(self.update_credentials, ssid, passphrase)
+            return {
+                "updated": [k for k, v in (("ssid", ssid), ("passphrase", passphrase)) if v],
+                "applied": applied,
+            }
+
+        if route == "services" and len(parts) == 2:
+            self.allow(method, "POST")
+            actions = {
+                "start": ap_control.start_services,
+                "stop": ap_control.stop_services,
+                "restart": restart.restart_services,
+            }
+            if parts[1] not in actions:
+                raise ApiError(404, f"Unknown service action: {parts[1]}")
+            failed = await self.mutate(actions[parts[1]])
+            if failed:
+                raise ApiError(500, f"Failed to {parts[1]}: {', '.join(failed)}")
+            return {"action": parts[1], "failed": []}
+
+        raise ApiError(404, f"No such endpoint: {path}")
+
+    @staticmethod
+    def update_credentials(ssid: str | None, passphrase: str | None):
+        return update_creds.apply_credentials(ssid, passphrase)
+
+    @staticmethod
+    def allow(method: str, expected: str):
+        if method != expected:
+            raise ApiError(405, f"Use {expected}")
+
+    @staticmethod
+    def field(body: dict, name: str) -> str:
+        value = body.get(name)
+        if not isinstance(value, str) or not value:
+            raise ApiError(400, f"'{name}' is required")
+        return value
+
+    def authorized(self, headers: dict) -> bool:
+        if self.token is None:
+            return True
+        scheme, _, credentials = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            return False
+        return hmac.compare_digest(credentials.strip().encode(), self.token.encode())
+
+    async def respond(self, method: str, path: str, raw_body: bytes) -> tuple[int, dict]:
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            return 400, {"error": "Invalid JSON body"}
+        if not isinstance(body, dict):
+            return 400, {"error": "Request body must be a JSON object"}
+        try:
+            return 200, await self.dispatch(method, path, body)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except (RuntimeError, SystemExit) as e:
+            return 500, {"error": str(e) or "Command failed"}
+        except Exception as e:
+            # Anything else is a bug, but the client still gets a response
+            logger.error(f"{method} {path} failed: {e!r}")
+            return 500, {"error": f"Internal error: {e!r}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                raw_body = await reader.readexactly(length) if length else b""
+
+                started = time.monotonic()
+                if self.authorized(headers):
+                    code, payload = await self.respond(method, path, raw_body)
+                else:
+                    code, payload = 401, {"error": "Missing or invalid API token"}
+                logger.debug(f"{method} {path} -> {code} ({time.monotonic() - started:.3f}s)")
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {code} {REASONS.get(code, '')}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def read_token(path: str) -> str:
+    try:
+        token = Path(path).read_text().strip()
+    except OSError as e:
+        raise RuntimeError(f"Could not read token file: {e}") from e
+    if not token:
+        raise RuntimeError(f"Token file {path} is empty")
+    return token
+
+
+async def serve(socket_path: Path | None, host: str, port: int | None, cache_ttl: float,
+                token: str | None = None):
+    api = ApiServer(cache_ttl, token)
+    if port is not None:
+        server = await asyncio.start_server(api.handle, host, port)
+        logger.info(f"API listening on http://{host}:{port}")
+    else:
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        socket_path.unlink(missing_ok=True)
+        # Created 0660 from the start, so there is no window where others can connect
+        umask = os.umask(0o117)
+        try:
+            server = await asyncio.start_unix_server(api.handle, path=str(socket_path))
+        finally:
+            os.umask(umask)
+        logger.info(f"API listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local JSON API for automation")
+    parser.add_argument("--socket", default=str(DEFAULT_SOCKET),
+                        help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--port", type=int, help="Listen on TCP instead of a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP address with --port (default: 127.0.0.1)")
+    parser.add_argument("--token-file",
+                        help="Require 'Authorization: Bearer <token>' with the token in this file "
+                             "(needed for a non-loopback --host)")
+    parser.add_argument("--cache-ttl", type=float, default=2.0,
+                        help="Seconds to reuse read results (default: 2)")
+    args = parser.parse_args()
+
+    if args.port is not None and not is_loopback(args.host) and not args.token_file:
+        logger.error(f"Refusing to serve the API on {args.host} without authentication; "
+                     "pass --token-file or use a loopback address.")
+        sys.exit(1)
+    try:
+        token = read_token(args.token_file) if args.token_file else None
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    try:
+        asyncio.run(serve(Path(args.socket), args.host, args.port, args.cache_ttl, token))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
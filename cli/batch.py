@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import shlex
+import sys
+
+import locks
+import runner
+from config import logger
+from transaction import transaction
+
+# Commands that can run in a batch, mapped to the module providing main()
+COMMANDS = {
+    "forwarding": "forwarding",
+    "interface": "interface",
+    "status": "status",
+    "clients": "clients",
+    "flows": "flows",
+}
+
+# Resources each command may change. A batch locks all of its commands'
+# resources up front, in order, and holds them until it commits or rolls back.
+LOCKS = {
+    "forwarding": ("firewall",),
+    "interface": locks.RESOURCES,
+    "clients": ("firewall",),
+}
+
+
+def parse_batch(text: str) -> list[list[str]]:
+    """Split batch input into command argv lists, skipping blanks and comments."""
+    commands = []
+    for number, line in enumerate(text.splitlines(), 1):
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            continue
+        if argv[0] == "pi-bridge":
+            argv = argv[1:]
+        if not argv or argv[0] not in COMMANDS:
+            raise RuntimeError(
+                f"Line {number}: unsupported command '{' '.join(argv)}' "
+                f"(batch supports: {', '.join(COMMANDS)})"
+            )
+        commands.append(argv)
+    return commands
+
+
+def run_command(argv: list[str]) -> None:
+    """Run one command's main() in this process."""
+    module = importlib.import_module(COMMANDS[argv[0]])
+    saved_argv = sys.argv
+    sys.argv = [f"pi-bridge {argv[0]}"] + argv[1:]
+    try:
+        module.main()
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError(f"exited with status {e.code}") from e
+    finally:
+        sys.argv = saved_argv
+
+
+def run_batch(commands: list[list[str]]) -> None:
+    """Run commands as one transaction: one firewall snapshot, one save, all-or-nothing."""
+    resources = {resource for argv in commands for resource in LOCKS.get(argv[0], ())}
+    with transaction(), locks.hold(*resources):
+        for index, argv in enumerate(commands, 1):
+            logger.info(f"[{index}/{len(commands)}] {' '.join(argv)}")
+            try:
+                with runner.phase(f"[{index}] {' '.join(argv)}"):
+                    run_command(argv)
+            except Exception as e:
+                logger.error(f"Command {index} failed: {e}")
+                raise RuntimeError(f"Batch aborted at command {index}; changes rolled back") from e
+    logger.info(f"\nBatch complete: {len(commands)} command(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several commands in one process")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="File with one command per line (default: stdin)")
+    args = parser.parse_args()
+
+    if args.file == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.file) as f:
+            text = f.read()
+
+    commands = parse_batch(text)
+    if not commands:
+        logger.info("No commands to run.")
+        return
+
+    run_batch(commands)
+
+
+if __name__ == "__main__":
+    main()
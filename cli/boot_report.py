@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Time from kernel start to a usable AP, from one boot's journal.
+
+journald stamps every entry with __MONOTONIC_TIMESTAMP, microseconds
+since the kernel started, so milestones can be read straight off the
+journal of any boot without extra instrumentation.
+"""
+import argparse
+import json
+
+import runner
+from config import logger, DEFAULTS
+from interface import parse_hostapd_interface
+from logs import journal_command
+
+
+def milestones(interface: str) -> list[tuple[str, str, object]]:
+    """(key, label, predicate(unit, message)) in the order they normally happen."""
+    static_ip = f"{interface}-static-ip"
+    return [
+        ("static_ip", f"{static_ip} started",
+         lambda unit, message: unit == static_ip and message.startswith(("Finished", "Started"))),
+        ("hostapd_started", "hostapd started", lambda unit, message: unit == "hostapd"),
+        ("ap_enabled", "AP-ENABLED", lambda unit, message: "AP-ENABLED" in message),
+        ("first_association", "first client associated", lambda unit, message: "AP-STA-CONNECTED" in message),
+        ("dnsmasq_started", "dnsmasq started", lambda unit, message: unit == "dnsmasq"),
+        ("first_dhcpack", "first DHCPACK", lambda unit, message: message.startswith("DHCPACK(")),
+    ]
+
+
+def entry_unit(record: dict) -> str:
+    """The unit an entry is about: systemd's own messages carry it in UNIT."""
+    unit = record.get("UNIT") or record.get("_SYSTEMD_UNIT") or ""
+    return unit[:-8] if unit.endswith(".service") else unit
+
+
+def collect_boot_report(interface: str, boot: str = "0") -> dict:
+    """Seconds since kernel start for each milestone (None if not reached)."""
+    checks = milestones(interface)
+    found: dict[str, float | None] = {key: None for key, _, _ in checks}
+    boot_id = None
+    units = [f"{interface}-static-ip", "hostapd", "dnsmasq"]
+
+    for line in runner.stream_lines(journal_command(units, boot=boot)):
+        try:
+            record = json.loads(line)
+            monotonic = int(record["__MONOTONIC_TIMESTAMP"]) / 1_000_000
+        except (ValueError, KeyError, TypeError):
+            continue
+        boot_id = boot_id or record.get("_BOOT_ID")
+        unit, message = entry_unit(record), record.get("MESSAGE")
+        if not isinstance(message, str):
+            continue
+        for key, _, matches in checks:
+            if found[key] is None and matches(unit, message):
+                found[key] = monotonic
+        if all(value is not None for value in found.values()):
+            break
+
+    return {"boot_id": boot_id, "interface": interface, "milestones": found}
+
+
+def print_boot_report(report: dict):
+    labels = {key: label for key, label, _ in milestones(report["interface"])}
+    found = report["milestones"]
+    if all(value is None for value in found.values()):
+        logger.info("No AP milestones in the journal for this boot.")
+        return
+
+    logger.info(f"Boot-to-AP timeline (boot {report['boot_id'] or 'unknown'}):")
+    for key, label in labels.items():
+        value = found[key]
+        logger.info(f"  {label:<28} {f'{value:.2f}s' if value is not None else 'not reached'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how long the AP took to come up after boot")
+    parser.add_argument("--boot", default="0",
+                        help="Boot to report, as for journalctl -b (default: 0, the current boot; -1 the previous)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    interface = parse_hostapd_interface() or DEFAULTS["DEFAULT_AP_INTERFACE"]
+    report = collect_boot_report(interface, args.boot)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_boot_report(report)
+
+
+if __name__ == "__main__":
+    main()
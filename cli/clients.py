@@ -1,31 +1,51 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
 import re
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
+import output
+import runner
 from config import logger, DEFAULTS
 
 
-def get_wireless_clients(interface: str) -> list[dict]:
-    """Get list of connected wireless clients."""
-    result = subprocess.run(
-        ["iw", "dev", interface, "station", "dump"],
-        capture_output=True, text=True
-    )
-
-    clients = []
-    if result.returncode == 0:
-        current_mac = None
-        for line in result.stdout.splitlines():
-            if line.startswith("Station "):
-                current_mac = line.split()[1]
-                clients.append({"mac": current_mac})
-            elif current_mac and "signal:" in line:
-                match = re.search(r'signal:\s+(-?\d+)', line)
+STATION_FIELDS = {
+    "inactive time": ("inactive_ms", r"(\d+)", int),
+    "tx packets": ("tx_packets", r"(\d+)", int),
+    "tx retries": ("tx_retries", r"(\d+)", int),
+    "tx failed": ("tx_failed", r"(\d+)", int),
+    "tx bitrate": ("tx_bitrate", r"(\d+(?:\.\d+)?) MBit/s", float),
+    "rx bitrate": ("rx_bitrate", r"(\d+(?:\.\d+)?) MBit/s", float),
+}
+
+
+def iter_wireless_clients(interface: str) -> Iterator[dict]:
+    """Yield connected wireless clients as `iw station dump` reports them."""
+    client = None
+    for line in runner.stream_lines(["iw", "dev", interface, "station", "dump"]):
+        if line.startswith("Station "):
+            if client:
+                yield client
+            client = {"mac": line.split()[1]}
+        elif client and "signal:" in line:
+            match = re.search(r'signal:\s+(-?\d+)', line)
+            if match:
+                client["signal"] = f"{match.group(1)} dBm"
+                client["signal_dbm"] = int(match.group(1))
+        elif client and ":" in line:
+            name, value = line.strip().split(":", 1)
+            if name in STATION_FIELDS:
+                key, pattern, cast = STATION_FIELDS[name]
+                match = re.search(pattern, value)
                 if match:
-                    clients[-1]["signal"] = f"{match.group(1)} dBm"
+                    client[key] = cast(match.group(1))
+    if client:
+        yield client
 
-    return clients
+
+def get_wireless_clients(interface: str) -> list[dict]:
+    """Get list of connected wireless clients."""
+    return list(iter_wireless_clients(interface))
 
 
 def get_dhcp_leases() -> dict[str, dict]:
@@ -45,7 +65,7 @@ def get_dhcp_leases() -> dict[str, dict]:
                         "hostname": parts[3] if parts[3] != "*" else ""
                     }
     except PermissionError:
-        result = subprocess.run(
+        result = runner.run(
             ["sudo", "cat", str(lease_file)],
             capture_output=True, text=True
         )
@@ -62,36 +82,119 @@ def get_dhcp_leases() -> dict[str, dict]:
     return leases
 
 
-def main():
-    logger.info("=== Connected Clients ===\n")
-
+def iter_clients() -> Iterator[dict]:
+    """Connected wireless clients merged with their DHCP lease info, one at a time."""
     interface = DEFAULTS.get("DEFAULT_AP_INTERFACE", "wlan1")
 
-    clients = get_wireless_clients(interface)
-    leases = get_dhcp_leases()
-
-    if not clients:
-        logger.info("No clients connected.")
-        return
-
-    # Merge wireless info with DHCP info
-    for client in clients:
+    leases = None
+    for client in iter_wireless_clients(interface):
+        # Leases are only read once there is a client to merge them into
+        if leases is None:
+            leases = get_dhcp_leases()
         mac = client["mac"].lower()
         if mac in leases:
             client["ip"] = leases[mac]["ip"]
             client["hostname"] = leases[mac]["hostname"]
+        yield client
+
+
+def list_clients() -> list[dict]:
+    """Connected wireless clients merged with their DHCP lease info."""
+    return list(iter_clients())
 
-    # Print table
-    logger.info(f"{'MAC Address':<20} {'IP Address':<16} {'Signal':<12} {'Hostname'}")
-    logger.info("-" * 70)
+
+def show_clients(clients: Iterable[dict]):
+    logger.info("=== Connected Clients ===\n")
+
+    total = 0
     for client in clients:
+        if not total:
+            logger.info(f"{'MAC Address':<20} {'IP Address':<16} {'Signal':<12} {'Hostname'}")
+            logger.info("-" * 70)
         mac = client.get("mac", "")
         ip = client.get("ip", "-")
         signal = client.get("signal", "-")
         hostname = client.get("hostname", "-") or "-"
         logger.info(f"{mac:<20} {ip:<16} {signal:<12} {hostname}")
+        total += 1
+
+    if not total:
+        logger.info("No clients connected.")
+        return
+    logger.info(f"\nTotal: {total} client(s)")
+
 
-    logger.info(f"\nTotal: {len(clients)} client(s)")
+def show_acl():
+    from acl import list_entries
+    entries = list_entries()
+    for title, key in (("Blocked", "blocked"), ("Allowlist", "allowed")):
+        logger.info(f"{title} ({len(entries[key])}):")
+        for entry in entries[key]:
+            logger.info(f"  {entry}")
+    if entries["allowed"]:
+        logger.info("Only allowlisted clients can connect.")
+
+
+def manage_acl(action: str, entries: list[str]):
+    import acl
+    from interface import parse_hostapd_interface
+
+    if not entries:
+        show_acl()
+        return
+    ap_interface = parse_hostapd_interface() or DEFAULTS["DEFAULT_AP_INTERFACE"]
+    if action == "block":
+        count = acl.block(entries, ap_interface)
+        logger.info(f"Blocked {count} new entr{'y' if count == 1 else 'ies'}.")
+    elif action == "allow":
+        count = acl.allow(entries, ap_interface)
+        logger.info(f"Allowlisted {count} new client(s); only allowlisted clients can connect.")
+    else:
+        count = acl.unblock(entries, ap_interface)
+        logger.info(f"Removed {count} entr{'y' if count == 1 else 'ies'}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List connected clients")
+    parser.add_argument("--rf", action="store_true",
+                        help="Show per-station RF quality (signal, bitrates, retries)")
+    output.add_options(parser)
+    sub = parser.add_subparsers(dest="action")
+
+    history_parser = sub.add_parser("history", help="Show client connect/disconnect sessions")
+    history_parser.add_argument("--mac", help="Only show sessions for this client MAC")
+    history_parser.add_argument("--hours", type=float, default=24,
+                                help="How far back to look (default: 24)")
+
+    sample_parser = sub.add_parser("rf-sample", help="Continuously sample station RF quality for --rf")
+    sample_parser.add_argument("--interval", type=float, default=5,
+                               help="Seconds between samples (default: 5)")
+
+    block_parser = sub.add_parser("block", help="Block clients by MAC, IP or network (no args: list)")
+    block_parser.add_argument("entries", nargs="*", metavar="MAC|IP[/LEN]")
+    allow_parser = sub.add_parser(
+        "allow", help="Allowlist client MACs; once set, only listed clients can connect (no args: list)")
+    allow_parser.add_argument("entries", nargs="*", metavar="MAC")
+    unblock_parser = sub.add_parser("unblock", help="Remove clients from the block list and allowlist")
+    unblock_parser.add_argument("entries", nargs="+", metavar="MAC|IP[/LEN]")
+
+    args = parser.parse_args()
+
+    if args.action in ("block", "allow", "unblock"):
+        manage_acl(args.action, args.entries)
+    elif args.action is None and args.rf:
+        from rf import show_rf
+        show_rf()
+    elif args.action is None and args.format != "text":
+        output.write(output.selected(iter_clients(), args), args.format)
+    elif args.action is None:
+        show_clients(output.selected(iter_clients(), args))
+    elif args.action == "history":
+        from sessions import show_history
+        show_history(mac=args.mac, hours=args.hours)
+    elif args.action == "rf-sample":
+        from rf import run_sampler
+        run_sampler(args.interval)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,3 @@
-import logging
 import os
 from pathlib import Path
 
@@ -6,14 +5,36 @@ from pathlib import Path
 CLI_DIR = Path(__file__).parent
 PROJECT_DIR = CLI_DIR.parent
 SETUP_DIR = PROJECT_DIR / "setup"
+STATE_DIR = Path(os.environ.get(
+    "PI_BRIDGE_STATE_DIR",
+    Path(os.environ.get("XDG_STATE_HOME", Path.home() / ".local" / "state")) / "pi-bridge",
+))
 
 # Logging configuration
-LOG_LEVEL = logging.DEBUG if os.environ.get("DEBUG", "0") == "1" else logging.INFO
+DEBUG = os.environ.get("DEBUG", "0") == "1"
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
 LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
-logger = logging.getLogger("pi-bridge")
+
+class LazyLogger:
+    """The pi-bridge logger, configured on first use.
+
+    Importing and configuring `logging` is a noticeable part of startup,
+    so commands that never log (help, JSON output) skip it entirely.
+    """
+
+    _logger = None
+
+    def __getattr__(self, name):
+        if LazyLogger._logger is None:
+            import logging
+            logging.basicConfig(level=logging.DEBUG if DEBUG else logging.INFO,
+                                format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+            LazyLogger._logger = logging.getLogger("pi-bridge")
+        return getattr(LazyLogger._logger, name)
+
+
+logger = LazyLogger()
 
 
 def load_defaults() -> dict[str, str]:
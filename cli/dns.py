@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import argparse
+import re
+import time
+from datetime import datetime
+
+import runner
+from config import logger
+
+# Lines dnsmasq writes to syslog when it receives SIGUSR1
+CACHE_LINE = re.compile(
+    r"cache size (\d+), (\d+)/(\d+) cache insertions re-used unexpired cache entries"
+)
+QUERIES_LINE = re.compile(r"queries forwarded (\d+), queries answered locally (\d+)")
+
+
+def request_cache_dump() -> bool:
+    """Ask dnsmasq to dump its cache statistics to the journal."""
+    # dnsmasq's forked helpers (DHCP script, TCP queries) don't handle
+    # SIGUSR1 and would die from it, so only signal the main process
+    result = runner.run(
+        ["sudo", "systemctl", "kill", "--kill-whom=main", "-s", "USR1", "dnsmasq"],
+        capture_output=True, text=True,
+    )
+    return result.returncode == 0
+
+
+def parse_cache_dumps(journal: str) -> list[dict]:
+    """Parse dnsmasq statistics dumps from `journalctl -o short-unix` output."""
+    dumps = []
+    current = None
+    for line in journal.splitlines():
+        stamp = line.split(" ", 1)[0]
+        match = CACHE_LINE.search(line)
+        if match:
+            try:
+                timestamp = float(stamp)
+            except ValueError:
+                timestamp = None
+            current = {
+                "time": timestamp,
+                "cache_size": int(match.group(1)),
+                "evictions": int(match.group(2)),
+                "insertions": int(match.group(3)),
+            }
+            continue
+        match = QUERIES_LINE.search(line)
+        if match and current is not None:
+            current["forwarded"] = int(match.group(1))
+            current["local"] = int(match.group(2))
+            dumps.append(current)
+            current = None
+    return dumps
+
+
+def read_cache_dumps(since: str) -> list[dict]:
+    """Read all dnsmasq statistics dumps logged since the given time."""
+    result = runner.run(
+        ["sudo", "journalctl", "-u", "dnsmasq", "--since", since,
+         "-o", "short-unix", "--no-pager", "-q"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return []
+    return parse_cache_dumps(result.stdout)
+
+
+def hit_rate(local: int, forwarded: int) -> float | None:
+    """Fraction of queries answered without going upstream."""
+    total = local + forwarded
+    if total <= 0:
+        return None
+    return local / total
+
+
+def interval_stats(dumps: list[dict]) -> list[dict]:
+    """Turn cumulative counters into per-interval deltas.
+
+    dnsmasq counters only grow until it restarts, so a counter that goes
+    backwards marks a restart and the new values are taken as-is.
+    """
+    rows = []
+    previous = None
+    for dump in dumps:
+        row = dict(dump)
+        if previous and dump["forwarded"] >= previous["forwarded"] and dump["local"] >= previous["local"]:
+            row["forwarded"] = dump["forwarded"] - previous["forwarded"]
+            row["local"] = dump["local"] - previous["local"]
+            row["evictions"] = max(dump["evictions"] - previous["evictions"], 0)
+        row["queries"] = row["forwarded"] + row["local"]
+        row["hit_rate"] = hit_rate(row["local"], row["forwarded"])
+        rows.append(row)
+        previous = dump
+    return rows
+
+
+def format_rate(rate: float | None) -> str:
+    return f"{rate * 100:.1f}%" if rate is not None else "-"
+
+
+def format_time(timestamp: float | None) -> str:
+    if timestamp is None:
+        return "-"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def show_stats(since: str, dump: bool = True):
+    """Show dnsmasq cache hit rate over time."""
+    logger.info("=== DNS Cache Statistics ===\n")
+
+    dumps = read_cache_dumps(since)
+    if dump and request_cache_dump():
+        # journald picks the dump up asynchronously; wait briefly for it
+        for _ in range(10):
+            time.sleep(0.2)
+            latest = read_cache_dumps(since)
+            if len(latest) > len(dumps):
+                dumps = latest
+                break
+
+    if not dumps:
+        logger.info("No cache statistics found. Is dnsmasq running?")
+        return
+
+    rows = interval_stats(dumps)
+    logger.info(f"{'Time':<20} {'Queries':>8} {'Cached':>8} {'Upstream':>9} {'Hit rate':>9} {'Evictions':>10}")
+    logger.info("-" * 70)
+    for row in rows:
+        logger.info(
+            f"{format_time(row['time']):<20} {row['queries']:>8} {row['local']:>8} "
+            f"{row['forwarded']:>9} {format_rate(row['hit_rate']):>9} {row['evictions']:>10}"
+        )
+
+    latest = dumps[-1]
+    logger.info("")
+    logger.info(f"Cache size:        {latest['cache_size']}")
+    logger.info(f"Insertions:        {latest['insertions']}")
+    logger.info(f"Evictions:         {latest['evictions']}")
+    logger.info(f"Hit rate (total):  {format_rate(hit_rate(latest['local'], latest['forwarded']))}")
+    if latest["cache_size"] == 0:
+        logger.info("\nCaching is disabled; run `pi-bridge setup --dns-cache` to enable it.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the local DNS cache")
+    sub = parser.add_subparsers(dest="action")
+
+    stats_parser = sub.add_parser("stats", help="Show cache hit/miss/eviction counters over time")
+    stats_parser.add_argument("--since", default="24h ago",
+                              help="Journal window to read dumps from (default: 24h ago)")
+    stats_parser.add_argument("--no-dump", action="store_true",
+                              help="Only read existing dumps; don't signal dnsmasq for a fresh one")
+
+    args = parser.parse_args()
+
+    if args.action is None:
+        show_stats("24h ago")
+    elif args.action == "stats":
+        show_stats(args.since, dump=not args.no_dump)
+
+
+if __name__ == "__main__":
+    main()
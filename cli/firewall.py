@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import subprocess
+
+import runner
+import transaction
+
+ACTIONS = ("-C", "-A", "-D", "-I")
+
+
+def split_rule(args: list[str]) -> tuple[str, str, str]:
+    """Split iptables rule args into (table, chain, spec).
+
+    Accepts the -C/-A/-D/-I forms used throughout the CLI, e.g.
+    ["-t", "nat", "-C", "POSTROUTING", "-o", "eth0", "-j", "MASQUERADE"].
+    """
+    table = "filter"
+    rest = list(args)
+    if "-t" in rest:
+        i = rest.index("-t")
+        table = rest[i + 1]
+        del rest[i:i + 2]
+    action = next(i for i, a in enumerate(rest) if a in ACTIONS)
+    chain = rest[action + 1]
+    spec = rest[action + 2:]
+    if rest[action] == "-I" and spec and spec[0].isdigit():
+        spec = spec[1:]
+    return table, chain, " ".join(spec)
+
+
+def with_action(args: list[str], action: str) -> list[str]:
+    """Swap the -C/-A/-D/-I action in rule args."""
+    return [action if a in ACTIONS else a for a in args]
+
+
+class Firewall:
+    """Snapshot of the iptables ruleset with in-memory existence checks.
+
+    Each table is read once with `iptables -t <table> -S`; rule checks are
+    then answered from the snapshot instead of one `iptables -C` fork per
+    rule, and changes made through the snapshot keep it current.
+    """
+
+    def __init__(self, defer_save: bool = False):
+        self.tables: dict[str, dict[str, None]] = {}
+        self.chain_names: dict[str, set[str]] = {}
+        self.defer_save = defer_save
+        self.save_pending = False
+
+    def run(self, args: list[str]) -> subprocess.CompletedProcess:
+        return runner.run(["sudo", "iptables"] + args, capture_output=True, text=True)
+
+    def rules(self, table: str) -> dict[str, None]:
+        """Rules of a table as "CHAIN spec" strings, in `iptables -S` order."""
+        if table not in self.tables:
+            result = self.run(["-t", table, "-S"])
+            if result.returncode != 0:
+                raise RuntimeError(f"Could not read iptables {table} table: {result.stderr.strip()}")
+            lines = result.stdout.splitlines()
+            self.tables[table] = {line[3:]: None for line in lines if line.startswith("-A ")}
+            self.chain_names[table] = {
+                line.split()[1] for line in lines if line.startswith(("-P ", "-N ")) and len(line.split()) > 1
+            }
+        return self.tables[table]
+
+    def chain(self, table: str, chain: str) -> list[str]:
+        """Rule specs in one chain."""
+        prefix = f"{chain} "
+        return [rule[len(prefix):] for rule in self.rules(table) if rule.startswith(prefix)]
+
+    def exists(self, args: list[str]) -> bool:
+        table, chain, spec = split_rule(args)
+        return f"{chain} {spec}" in self.rules(table)
+
+    def add(self, args: list[str], insert: bool = False) -> None:
+        table, chain, spec = split_rule(args)
+        self.apply(with_action(args, "-I" if insert else "-A"))
+        rules = self.rules(table)
+        key = f"{chain} {spec}"
+        if insert:
+            self.tables[table] = {key: None, **rules}
+        else:
+            rules[key] = None
+        self.record(f"iptables {' '.join(with_action(args, '-A'))}", lambda: self.delete(args, record=False))
+
+    def delete(self, args: list[str], record: bool = True) -> None:
+        table, chain, spec = split_rule(args)
+        current = self.chain(table, chain)
+        position = current.index(spec) + 1 if spec in current else len(current) + 1
+        self.apply(with_action(args, "-D"))
+        self.rules(table).pop(f"{chain} {spec}", None)
+        if record:
+            self.record(f"iptables {' '.join(with_action(args, '-D'))}",
+                        lambda: self.restore(table, chain, spec, position))
+
+    def restore(self, table: str, chain: str, spec: str, position: int) -> None:
+        """Put a deleted rule back at its 1-based position in the chain."""
+        self.apply(["-t", table, "-I", chain, str(position)] + spec.split())
+        key = f"{chain} {spec}"
+        prefix = f"{chain} "
+        keys = list(self.rules(table))
+        in_chain = [i for i, rule in enumerate(keys) if rule.startswith(prefix)]
+        if position <= len(in_chain):
+            at = in_chain[position - 1]
+        else:
+            at = in_chain[-1] + 1 if in_chain else len(keys)
+        keys.insert(at, key)
+        self.tables[table] = dict.fromkeys(keys)
+
+    def ensure(self, args: list[str], insert: bool = False) -> bool:
+        """Add a rule unless present. Returns True if it was added."""
+        if self.exists(args):
+            return False
+        self.add(args, insert=insert)
+        return True
+
+    def discard(self, args: list[str]) -> bool:
+        """Delete a rule if present. Returns True if it was removed."""
+        if not self.exists(args):
+            return False
+        self.delete(args)
+        return True
+
+    def has_chain(self, table: str, chain: str) -> bool:
+        self.rules(table)
+        return chain in self.chain_names[table]
+
+    def create_chain(self, table: str, chain: str) -> bool:
+        """Create a user chain unless it exists. Returns True if it was created."""
+        if self.has_chain(table, chain):
+            return False
+        self.apply(["-t", table, "-N", chain])
+        self.chain_names[table].add(chain)
+        self.record(f"iptables -t {table} -N {chain}", lambda: self.delete_chain(table, chain, record=False))
+        return True
+
+    def delete_chain(self, table: str, chain: str, record: bool = True) -> bool:
+        """Delete an empty, unreferenced user chain. Returns True if it existed."""
+        if not self.has_chain(table, chain):
+            return False
+        self.apply(["-t", table, "-X", chain])
+        self.chain_names[table].discard(chain)
+        if record:
+            self.record(f"iptables -t {table} -X {chain}", lambda: self.create_chain(table, chain))
+        return True
+
+    def sync_chain(self, table: str, chain: str, specs: list[str]) -> tuple[int, int]:
+        """Make a chain hold exactly `specs`, touching only the rules that differ.
+
+        The diff is taken against the snapshot, so no rule is checked with
+        its own `iptables -C`. Returns (added, removed).
+        """
+        self.create_chain(table, chain)
+        current = self.chain(table, chain)
+        wanted = set(specs)
+        stale = [spec for spec in current if spec not in wanted]
+        missing = [spec for spec in dict.fromkeys(specs) if spec not in current]
+        for spec in stale:
+            self.delete(["-t", table, "-D", chain] + spec.split())
+        for spec in missing:
+            self.add(["-t", table, "-A", chain] + spec.split())
+        return len(missing), len(stale)
+
+    def apply(self, args: list[str]) -> None:
+        result = self.run(args)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"iptables {' '.join(args)} failed")
+        self.save_pending = True
+
+    def record(self, description: str, undo) -> None:
+        tx = transaction.active()
+        if tx is not None:
+            tx.record(description, undo)
+
+    def save(self) -> None:
+        """Persist rules with netfilter-persistent, or defer to the end of a batch."""
+        if self.defer_save:
+            self.save_pending = True
+            return
+        save_rules()
+        self.save_pending = False
+
+    def flush_save(self) -> None:
+        if self.save_pending:
+            save_rules()
+            self.save_pending = False
+
+
+def save_rules() -> None:
+    """Persist iptables rules with netfilter-persistent."""
+    result = runner.run(
+        ["sudo", "netfilter-persistent", "save"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to save rules: {result.stderr.strip()}")
+
+
+def current() -> Firewall:
+    """The firewall view for the running command.
+
+    Inside a transaction every command shares one snapshot and saving is
+    deferred to commit; otherwise each call gets a fresh snapshot.
+    """
+    tx = transaction.active()
+    if tx is None:
+        return Firewall()
+    if tx.firewall is None:
+        tx.firewall = Firewall(defer_save=True)
+    return tx.firewall
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Run pi-bridge commands on many bridges at once.
+
+Hosts come from an inventory file, one per line:
+
+    # name      address              groups
+    lab-1       pi@10.0.0.21         lab
+    shop-east   pi@shop.local:2222   shops,east
+
+The address defaults to the name. Commands run on up to --jobs hosts at
+a time through a transport: `ssh` (the default) keeps one master
+connection per host open for a minute with ControlMaster, so repeated
+runs and retries skip the handshake; `local` runs the command on this
+machine with the host's name in the environment, for trying out
+inventories and for tests. PI_BRIDGE_SSH replaces the ssh command, e.g.
+with a wrapper that adds a jump host.
+
+Every run's per-host results are saved, and `fleet retry` runs the last
+command again on just the hosts that failed.
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import output
+import runner
+from config import logger, STATE_DIR
+
+INVENTORY = Path(os.environ.get(
+    "PI_BRIDGE_INVENTORY",
+    Path(os.environ.get("XDG_CONFIG_HOME", Path.home() / ".config")) / "pi-bridge" / "fleet",
+))
+LAST_RUN = STATE_DIR / "fleet-last.json"
+CONTROL_DIR = STATE_DIR / "ssh"
+DEFAULT_JOBS = 10
+DEFAULT_TIMEOUT = 600.0
+# ssh's own exit status when it couldn't connect (vs. the remote command's)
+SSH_FAILED = 255
+
+
+class Host:
+    __slots__ = ("name", "address", "groups")
+
+    def __init__(self, name: str, address: str, groups: list[str]):
+        self.name = name
+        self.address = address
+        self.groups = groups
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "address": self.address, "groups": self.groups}
+
+
+def read_inventory(path: Path = INVENTORY) -> list[Host]:
+    """Parse an inventory file into hosts, in file order."""
+    try:
+        text = path.read_text()
+    except FileNotFoundError:
+        raise RuntimeError(f"No inventory at {path}; create it or pass --inventory") from None
+    hosts, seen = [], set()
+    for number, line in enumerate(text.splitlines(), 1):
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        if len(fields) > 3:
+            raise RuntimeError(f"{path}:{number}: expected 'name [address] [groups]'")
+        name = fields[0]
+        if name in seen:
+            raise RuntimeError(f"{path}:{number}: duplicate host '{name}'")
+        seen.add(name)
+        address = fields[1] if len(fields) > 1 else name
+        groups = fields[2].split(",") if len(fields) > 2 else []
+        hosts.append(Host(name, address, groups))
+    return hosts
+
+
+def select_hosts(hosts: list[Host], names: list[str] | None = None,
+                 groups: list[str] | None = None) -> list[Host]:
+    """Hosts named in `names` or belonging to any of `groups`; all hosts if neither is given."""
+    if names:
+        unknown = set(names) - {host.name for host in hosts}
+        if unknown:
+            raise RuntimeError(f"Not in the inventory: {', '.join(sorted(unknown))}")
+    if not names and not groups:
+        return hosts
+    return [host for host in hosts
+            if host.name in (names or ()) or set(host.groups) & set(groups or ())]
+
+
+def stdin_options(stdin: str | None) -> dict:
+    """Feed --input to the command, or nothing: without it every host would read our stdin."""
+    return {"input": stdin} if stdin is not None else {"stdin": subprocess.DEVNULL}
+
+
+class SshTransport:
+    """Runs the command over ssh, reusing one master connection per host."""
+
+    name = "ssh"
+
+    def __init__(self, remote: str = "pi-bridge", persist: int = 60):
+        self.ssh = shlex.split(os.environ.get("PI_BRIDGE_SSH", "ssh"))
+        self.remote = remote
+        self.persist = persist
+
+    def command(self, host: Host, argv: list[str]) -> list[str]:
+        destination, _, port = host.address.partition(":")
+        CONTROL_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+        return [
+            *self.ssh,
+            "-o", "BatchMode=yes",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={CONTROL_DIR}/%C",
+            "-o", f"ControlPersist={self.persist}",
+            *(["-p", port] if port else []),
+            destination,
+            shlex.join([self.remote, *argv]),
+        ]
+
+    def run(self, host: Host, argv: list[str], stdin: str | None, timeout: float):
+        return runner.run(self.command(host, argv), **stdin_options(stdin), capture_output=True,
+                          text=True, timeout=timeout)
+
+    @staticmethod
+    def unreachable(returncode: int | None) -> bool:
+        return returncode == SSH_FAILED
+
+
+class LocalTransport:
+    """Runs the command on this machine, as if it were each host."""
+
+    name = "local"
+
+    def __init__(self, remote: str = "pi-bridge"):
+        self.remote = shlex.split(remote)
+
+    def run(self, host: Host, argv: list[str], stdin: str | None, timeout: float):
+        env = dict(os.environ, PI_BRIDGE_FLEET_HOST=host.name, PI_BRIDGE_FLEET_ADDRESS=host.address)
+        return runner.run([*self.remote, *argv], **stdin_options(stdin), capture_output=True,
+                          text=True, timeout=timeout, env=env)
+
+    @staticmethod
+    def unreachable(returncode: int | None) -> bool:
+        return False
+
+
+TRANSPORTS = {"ssh": SshTransport, "local": LocalTransport}
+
+
+def run_on_host(transport, host: Host, argv: list[str], stdin: str | None,
+                timeout: float, retries: int) -> dict:
+    """Run the command on one host. Only connection failures are retried."""
+    started = time.time()
+    clock = time.perf_counter()
+    for attempt in range(1, retries + 2):
+        try:
+            result = transport.run(host, argv, stdin, timeout)
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        except subprocess.TimeoutExpired:
+            returncode, stdout, stderr = None, "", f"Timed out after {timeout:g}s"
+        except OSError as e:
+            returncode, stdout, stderr = None, "", str(e)
+        if not transport.unreachable(returncode) or attempt > retries:
+            break
+        time.sleep(min(2 ** (attempt - 1), 10))
+    return {
+        "host": host.name,
+        "address": host.address,
+        "ok": returncode == 0,
+        "returncode": returncode,
+        "attempts": attempt,
+        "started": round(started, 3),
+        "duration_s": round(time.perf_counter() - clock, 3),
+        "stdout": stdout,
+        "stderr": stderr,
+    }
+
+
+def run_fleet(transport, hosts: list[Host], argv: list[str], jobs: int = DEFAULT_JOBS,
+              stdin: str | None = None, timeout: float = DEFAULT_TIMEOUT,
+              retries: int = 0) -> Iterator[dict]:
+    """Run `pi-bridge <argv>` on every host, at most `jobs` at a time.
+
+    Yields each host's result as soon as it finishes.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(run_on_host, transport, host, argv, stdin, timeout, retries)
+                   for host in hosts]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def load_last_run() -> dict:
+    try:
+        return json.loads(LAST_RUN.read_text())
+    except FileNotFoundError:
+        raise RuntimeError("No previous fleet run to retry") from None
+
+
+def save_last_run(argv: list[str], results: dict[str, dict], transport: str) -> None:
+    LAST_RUN.parent.mkdir(parents=True, exist_ok=True)
+    LAST_RUN.write_text(json.dumps({"argv": argv, "transport": transport, "results": results}))
+
+
+def report(record: dict) -> None:
+    """Log one host's result as it comes in."""
+    timing = f"{record['duration_s']:.2f}s"
+    if record["attempts"] > 1:
+        timing += f", {record['attempts']} attempts"
+    if record["ok"]:
+        logger.info(f"  ok      {record['host']:<20} ({timing})")
+        return
+    status = "timeout" if record["returncode"] is None else f"exit {record['returncode']}"
+    logger.error(f"  FAILED  {record['host']:<20} ({timing}, {status})")
+    lines = (record["stderr"] or record["stdout"]).strip().splitlines()
+    for line in lines[-3:]:
+        logger.error(f"          {line}")
+
+
+def execute(args, hosts: list[Host], argv: list[str], previous: dict | None = None) -> None:
+    """Run on `hosts`, print results as they arrive, and save them for `fleet retry`."""
+    if args.transport == "local":
+        transport = LocalTransport(args.remote)
+    else:
+        transport = SshTransport(args.remote, args.persist)
+    stdin = Path(args.input).read_text() if args.input else None
+    if args.format == "text":
+        logger.info(f"Running '{shlex.join(argv)}' on {len(hosts)} host(s), {args.jobs} at a time...")
+
+    results = dict(previous or {})
+    started = time.perf_counter()
+
+    def collected() -> Iterator[dict]:
+        for record in run_fleet(transport, hosts, argv, args.jobs, stdin, args.timeout, args.retries):
+            results[record["host"]] = record
+            yield record
+
+    source = collected()
+    if args.format == "text":
+        for record in output.selected(source, args):
+            report(record)
+    else:
+        output.write(output.selected(source, args), args.format)
+    # --limit may stop showing results early; every host still has to finish
+    for _ in source:
+        pass
+    save_last_run(argv, results, transport.name)
+
+    failed = sorted(name for name in (host.name for host in hosts) if not results[name]["ok"])
+    if args.format == "text":
+        logger.info(f"\n{len(hosts) - len(failed)}/{len(hosts)} host(s) succeeded "
+                    f"in {time.perf_counter() - started:.1f}s.")
+    if failed:
+        raise RuntimeError(f"{len(failed)} host(s) failed: {', '.join(failed)} "
+                           "(run 'pi-bridge fleet retry' to try them again)")
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--inventory", type=Path, default=INVENTORY,
+                        help=f"Inventory file (default: {INVENTORY})")
+    common.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Hosts to run on at once (default: {DEFAULT_JOBS})")
+    common.add_argument("--transport", choices=TRANSPORTS,
+                        help="How to reach hosts (default: ssh; retry uses the last run's)")
+    common.add_argument("--remote", default="pi-bridge",
+                        help="pi-bridge command on the hosts (default: pi-bridge)")
+    common.add_argument("--persist", type=int, default=60,
+                        help="Seconds to keep each ssh connection open for reuse (default: 60)")
+    common.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds before a host's command is abandoned (default: {DEFAULT_TIMEOUT:g})")
+    common.add_argument("--retries", type=int, default=0,
+                        help="Times to retry a host that can't be reached (default: 0)")
+    common.add_argument("--input", metavar="FILE",
+                        help="Send FILE to the command's stdin on every host (e.g. --passphrase-stdin)")
+    output.add_options(common)
+
+    parser = argparse.ArgumentParser(description="Run pi-bridge commands on many hosts")
+    sub = parser.add_subparsers(dest="action")
+
+    hosts_parser = sub.add_parser("hosts", help="List hosts in the inventory")
+    hosts_parser.add_argument("--inventory", type=Path, default=INVENTORY)
+    hosts_parser.add_argument("--group", action="append", help="Only hosts in this group; repeatable")
+    output.add_options(hosts_parser)
+
+    run_parser = sub.add_parser("run", parents=[common], help="Run a command on every selected host")
+    run_parser.add_argument("--hosts", type=lambda s: s.split(","), metavar="NAME[,NAME]",
+                            help="Only these hosts")
+    run_parser.add_argument("--group", action="append", help="Only hosts in this group; repeatable")
+    run_parser.add_argument("command", nargs=argparse.REMAINDER,
+                            help="pi-bridge command and its arguments, e.g. forwarding add usb0")
+
+    sub.add_parser("retry", parents=[common], help="Run the last command again on the hosts that failed")
+
+    args = parser.parse_args()
+
+    if args.action == "hosts":
+        records = (host.as_dict() for host in select_hosts(read_inventory(args.inventory), groups=args.group))
+        records = output.selected(records, args)
+        if args.format != "text":
+            output.write(records, args.format)
+            return
+        for record in records:
+            logger.info(f"{record['name']:<20} {record['address']:<28} {','.join(record['groups'])}")
+        return
+
+    if args.action == "run":
+        argv = args.command[1:] if args.command[:1] == ["--"] else args.command
+        if not argv:
+            run_parser.error("a command to run is required")
+        hosts = select_hosts(read_inventory(args.inventory), args.hosts, args.group)
+        if not hosts:
+            raise RuntimeError("No hosts selected")
+        execute(args, hosts, argv)
+        return
+
+    if args.action == "retry":
+        last = load_last_run()
+        args.transport = args.transport or last["transport"]
+        failed = {name for name, record in last["results"].items() if not record["ok"]}
+        hosts = [host for host in read_inventory(args.inventory) if host.name in failed]
+        if not hosts:
+            logger.info("No failed hosts to retry.")
+            return
+        execute(args, hosts, last["argv"], last["results"])
+        return
+
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import argparse
+import heapq
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import runner
+from clients import get_dhcp_leases
+from config import logger
+
+# Point PI_BRIDGE_CONNTRACK_FILE at a saved copy of the table to analyse it offline
+CONNTRACK_FILE = Path(os.environ.get("PI_BRIDGE_CONNTRACK_FILE", "/proc/net/nf_conntrack"))
+CONNTRACK_COUNT = Path("/proc/sys/net/netfilter/nf_conntrack_count")
+CONNTRACK_MAX = Path("/proc/sys/net/netfilter/nf_conntrack_max")
+
+# Table usage above this fraction is reported as a warning
+PRESSURE_WARNING = 0.8
+
+
+def table_usage() -> tuple[int, int] | None:
+    """Return (entries, nf_conntrack_max), or None if conntrack isn't loaded."""
+    try:
+        return int(CONNTRACK_COUNT.read_text()), int(CONNTRACK_MAX.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def conntrack_lines() -> Iterator[str]:
+    """Yield raw conntrack entries one at a time, never the whole table."""
+    try:
+        with CONNTRACK_FILE.open() as f:
+            yield from f
+        return
+    except PermissionError:
+        yield from runner.stream_lines(["sudo", "cat", str(CONNTRACK_FILE)])
+    except FileNotFoundError:
+        yield from runner.stream_lines(["sudo", "conntrack", "-L", "-o", "extended"])
+
+
+def parse_entry(line: str) -> tuple[str, str, str, int, int] | None:
+    """Parse one entry into (proto, src, dst, dport, bytes).
+
+    Addresses and port come from the original direction; bytes are summed
+    over both directions (0 unless nf_conntrack_acct is on).
+
+    Handles both /proc/net/nf_conntrack and `conntrack -L -o extended`
+    lines, which share a layout after the leading "ipv4 2".
+    """
+    tokens = line.split()
+    if len(tokens) < 4:
+        return None
+    proto = tokens[2]
+    src = dst = None
+    dport = 0
+    total_bytes = 0
+    for token in tokens[3:]:
+        key, sep, value = token.partition("=")
+        if not sep:
+            continue
+        if key == "src" and src is None:
+            src = value
+        elif key == "dst" and dst is None:
+            dst = value
+        elif key == "dport" and not dport:
+            dport = int(value) if value.isdigit() else 0
+        elif key == "bytes" and value.isdigit():
+            total_bytes += int(value)
+    if src is None or dst is None:
+        return None
+    return proto, src, dst, dport, total_bytes
+
+
+def aggregate(lines: Iterator[str], by: str, client: str | None = None) -> tuple[dict, int]:
+    """Fold entries into {key: [connections, bytes]} without keeping the entries."""
+    totals: dict[tuple, list[int]] = {}
+    seen = 0
+    for line in lines:
+        entry = parse_entry(line)
+        if entry is None:
+            continue
+        proto, src, dst, dport, total_bytes = entry
+        if client and src != client:
+            continue
+        seen += 1
+        if by == "client":
+            key = (src,)
+        elif by == "destination":
+            key = (proto, f"{dst}:{dport}" if dport else dst)
+        else:
+            key = (src, proto, f"{dst}:{dport}" if dport else dst)
+        bucket = totals.get(key)
+        if bucket is None:
+            totals[key] = [1, total_bytes]
+        else:
+            bucket[0] += 1
+            bucket[1] += total_bytes
+    return totals, seen
+
+
+def format_bytes(count: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+def show_usage():
+    usage = table_usage()
+    if usage is None:
+        logger.info("Conntrack table: unavailable")
+        return
+    count, maximum = usage
+    fraction = count / maximum if maximum else 0
+    logger.info(f"Conntrack table: {count}/{maximum} ({fraction:.1%})")
+    if fraction >= PRESSURE_WARNING:
+        logger.warning("  Conntrack table nearly full; new client connections will be dropped.")
+
+
+def show_flows(top: int = 20, by: str = "flow", client: str | None = None):
+    """Show the busiest conntrack flows aggregated by client, protocol and destination."""
+    logger.info("=== Top Flows ===\n")
+    show_usage()
+    logger.info("")
+
+    totals, seen = aggregate(conntrack_lines(), by, client)
+    if not totals:
+        logger.info("No tracked connections.")
+        return
+
+    names = {lease["ip"]: lease["hostname"] for lease in get_dhcp_leases().values() if lease["hostname"]}
+
+    def label(ip: str) -> str:
+        return f"{names[ip]} ({ip})" if ip in names else ip
+
+    rows = heapq.nlargest(top, totals.items(), key=lambda item: (item[1][0], item[1][1]))
+
+    if by == "client":
+        logger.info(f"{'Client':<36} {'Conns':>7} {'Bytes':>10}")
+        logger.info("-" * 56)
+        for (src,), (conns, total_bytes) in rows:
+            logger.info(f"{label(src):<36} {conns:>7} {format_bytes(total_bytes):>10}")
+    elif by == "destination":
+        logger.info(f"{'Proto':<6} {'Destination':<40} {'Conns':>7} {'Bytes':>10}")
+        logger.info("-" * 66)
+        for (proto, dst), (conns, total_bytes) in rows:
+            logger.info(f"{proto:<6} {dst:<40} {conns:>7} {format_bytes(total_bytes):>10}")
+    else:
+        logger.info(f"{'Client':<36} {'Proto':<6} {'Destination':<28} {'Conns':>7} {'Bytes':>10}")
+        logger.info("-" * 92)
+        for (src, proto, dst), (conns, total_bytes) in rows:
+            logger.info(f"{label(src):<36} {proto:<6} {dst:<28} {conns:>7} {format_bytes(total_bytes):>10}")
+
+    logger.info(f"\nShowing {len(rows)} of {len(totals)} group(s) across {seen} connection(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show top NAT flows from the conntrack table")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to show (default: 20)")
+    parser.add_argument("--by", choices=["flow", "client", "destination"], default="flow",
+                        help="Group connections by flow, client or destination (default: flow)")
+    parser.add_argument("--client", help="Only count connections from this client IP")
+    args = parser.parse_args()
+
+    show_flows(top=args.top, by=args.by, client=args.client)
+
+
+if __name__ == "__main__":
+    main()
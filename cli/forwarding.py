@@ -1,114 +1,259 @@
 #!/usr/bin/env python3
 import argparse
 import re
-import subprocess
-import sys
+from collections.abc import Iterable, Iterator
+from pathlib import Path
 
+import acl
+import firewall
+import output
+import runner
+from locks import locked
 from config import logger, DEFAULTS
 
 AP_INTERFACE = DEFAULTS["DEFAULT_AP_INTERFACE"]
+MASQUERADE_RULE = re.compile(r"-o (\S+) -j MASQUERADE")
+MSS_RULE = re.compile(r"-[io] (\S+) -p tcp -m tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss (\d+)")
+SYS_CLASS_NET = Path("/sys/class/net")
 
+# Ethernet MTU; links at or above it need no clamp
+STANDARD_MTU = 1500
+# IPv4 + TCP headers (MSS = MTU - 40) and IPv4 + ICMP headers (ping payload = MTU - 28)
+TCP_OVERHEAD = 40
+ICMP_OVERHEAD = 28
+# Smallest path MTU the probe will search down to
+MIN_PATH_MTU = 576
+PROBE_HOST = DEFAULTS["DEFAULT_DNS_SERVERS"].split(",")[0]
 
-def run_iptables(args: list[str]) -> subprocess.CompletedProcess:
-    """Run an iptables command with sudo."""
-    return subprocess.run(
-        ["sudo", "iptables"] + args,
-        capture_output=True, text=True,
-    )
 
+def forwarding_interfaces() -> list[str]:
+    """Return WAN interfaces that have a MASQUERADE rule."""
+    return [
+        match.group(1)
+        for match in map(MASQUERADE_RULE.fullmatch, firewall.current().chain("nat", "POSTROUTING"))
+        if match
+    ]
 
-def rule_exists(args: list[str]) -> bool:
-    """Check if an iptables rule exists using -C."""
-    return run_iptables(args).returncode == 0
 
+def iter_forwarding() -> Iterator[dict]:
+    """Yield a record per WAN interface with NAT forwarding."""
+    for iface in forwarding_interfaces():
+        yield {"interface": iface, "ap_interface": AP_INTERFACE}
 
-def list_forwarding():
-    """List interfaces with NAT forwarding rules."""
-    result = subprocess.run(
-        ["sudo", "iptables", "-t", "nat", "-S", "POSTROUTING"],
-        capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        logger.error("Could not read iptables rules")
-        sys.exit(1)
 
-    interfaces = re.findall(r'-A POSTROUTING -o (\S+) -j MASQUERADE', result.stdout)
-    if not interfaces:
+def list_forwarding(records: Iterable[dict]):
+    """List interfaces with NAT forwarding rules."""
+    shown = False
+    for record in records:
+        if not shown:
+            logger.info(f"Forwarding interfaces (AP: {AP_INTERFACE}):")
+            shown = True
+        logger.info(f"  {record['interface']}")
+    if not shown:
         logger.info("No forwarding interfaces configured.")
-        return
 
-    logger.info(f"Forwarding interfaces (AP: {AP_INTERFACE}):")
-    for iface in interfaces:
-        logger.info(f"  {iface}")
 
+def nat_rules(wan_interface: str, ap_interface: str = AP_INTERFACE) -> list[list[str]]:
+    """Return the NAT rule arg lists for a WAN interface, in the order they apply.
 
-def nat_rules(wan_interface: str) -> list[list[str]]:
-    """Return the three NAT rule arg lists for a WAN interface."""
+    The block rule drops AP clients in the block list (see acl) before the
+    AP-to-WAN ACCEPT; it needs the ipsets to exist.
+    """
     return [
         ["-t", "nat", "-C", "POSTROUTING", "-o", wan_interface, "-j", "MASQUERADE"],
-        ["-C", "FORWARD", "-i", wan_interface, "-o", AP_INTERFACE,
+        ["-C", "FORWARD", "-i", wan_interface, "-o", ap_interface,
          "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"],
-        ["-C", "FORWARD", "-i", AP_INTERFACE, "-o", wan_interface, "-j", "ACCEPT"],
+        acl.block_rule(ap_interface, wan_interface),
+        ["-C", "FORWARD", "-i", ap_interface, "-o", wan_interface, "-j", "ACCEPT"],
+    ]
+
+
+def ensure_nat_rules(fw: firewall.Firewall, wan_interface: str, ap_interface: str = AP_INTERFACE) -> int:
+    """Add a WAN's missing NAT rules. Returns rules added.
+
+    The block rule is inserted at the top of FORWARD, so it stays ahead of an
+    ACCEPT that already exists. Without ipset it is left out; `clients block`
+    adds it once the sets exist.
+    """
+    block = acl.block_rule(ap_interface, wan_interface)
+    rules = nat_rules(wan_interface, ap_interface)
+    try:
+        acl.ensure_sets(acl.read_sets())
+    except acl.IpsetMissing:
+        logger.warning(f"ipset is not installed, so blocked clients can still reach {wan_interface}. "
+                       "Run `pi-bridge install-deps` to install it.")
+        rules.remove(block)
+    return sum(fw.ensure(rule, insert=rule == block) for rule in rules)
+
+
+def link_mtu(interface: str) -> int | None:
+    """The interface's MTU, or None if it doesn't exist."""
+    try:
+        return int((SYS_CLASS_NET / interface / "mtu").read_text())
+    except (OSError, ValueError):
+        pass
+    # No sysfs entry (e.g. a container): ask iproute2 instead
+    result = runner.run(["ip", "-o", "link", "show", interface], capture_output=True, text=True)
+    fields = result.stdout.split()
+    if result.returncode != 0 or "mtu" not in fields:
+        return None
+    return int(fields[fields.index("mtu") + 1])
+
+
+def ping_fits(interface: str, host: str, mtu: int) -> bool:
+    """Whether a `mtu`-sized packet with DF set reaches `host` through `interface`."""
+    result = runner.run(
+        ["ping", "-M", "do", "-c", "1", "-W", "1", "-s", str(mtu - ICMP_OVERHEAD), "-I", interface, host],
+        capture_output=True, text=True,
+    )
+    return result.returncode == 0
+
+
+def probe_path_mtu(interface: str, host: str, ceiling: int) -> int | None:
+    """Largest packet that reaches `host` unfragmented, by binary search.
+
+    Returns None if even the smallest probe gets no answer (host down or
+    ICMP filtered), in which case the link MTU is all we know.
+    """
+    if ping_fits(interface, host, ceiling):
+        return ceiling
+    if not ping_fits(interface, host, MIN_PATH_MTU):
+        return None
+    low, high = MIN_PATH_MTU, ceiling - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if ping_fits(interface, host, middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def mss_rules(wan_interface: str, mss: int) -> list[list[str]]:
+    """TCPMSS clamp rule arg lists for SYNs leaving and SYN-ACKs arriving on a WAN."""
+    return [
+        ["-t", "mangle", "-C", "FORWARD", direction, wan_interface, "-p", "tcp", "-m", "tcp",
+         "--tcp-flags", "SYN,RST", "SYN", "-j", "TCPMSS", "--set-mss", str(mss)]
+        for direction in ("-o", "-i")
     ]
 
 
-def add_forwarding(wan_interface: str):
-    """Add NAT forwarding rules for a WAN interface."""
-    rules = nat_rules(wan_interface)
-    added = 0
+def mss_clamps(fw: firewall.Firewall | None = None) -> dict[str, int]:
+    """Clamped WAN interfaces and their MSS."""
+    fw = fw or firewall.current()
+    return {
+        match.group(1): int(match.group(2))
+        for match in map(MSS_RULE.fullmatch, fw.chain("mangle", "FORWARD"))
+        if match
+    }
+
+
+def clamp_mss(wan_interface: str, probe_host: str | None = None) -> int:
+    """Clamp TCP MSS to the WAN's MTU (or probed path MTU). Returns rules changed.
+
+    Links with a standard MTU get no clamp; any left from an earlier,
+    smaller MTU is removed.
+    """
+    mtu = link_mtu(wan_interface)
+    if mtu is None:
+        logger.warning(f"Could not read the MTU of {wan_interface}; not clamping MSS.")
+        return 0
+    if probe_host:
+        path_mtu = probe_path_mtu(wan_interface, probe_host, mtu)
+        if path_mtu is None:
+            logger.warning(f"No reply from {probe_host} through {wan_interface}; using the link MTU.")
+        elif path_mtu < mtu:
+            logger.info(f"Path MTU to {probe_host} via {wan_interface}: {path_mtu} (link: {mtu}).")
+            mtu = path_mtu
+
+    fw = firewall.current()
+    wanted = mss_rules(wan_interface, mtu - TCP_OVERHEAD) if mtu < STANDARD_MTU else []
+    current = mss_clamps(fw).get(wan_interface)
+    stale = [rule for rule in mss_rules(wan_interface, current) if rule not in wanted] if current else []
+    changed = sum(fw.discard(rule) for rule in stale)
+    changed += sum(fw.ensure(rule) for rule in wanted)
+    if wanted and changed:
+        logger.info(f"Clamping TCP MSS on {wan_interface} to {mtu - TCP_OVERHEAD} (MTU {mtu}).")
+    return changed
+
+
+def unclamp_mss(wan_interface: str) -> int:
+    """Remove a WAN's TCPMSS clamp rules. Returns rules removed."""
+    fw = firewall.current()
+    mss = mss_clamps(fw).get(wan_interface)
+    if mss is None:
+        return 0
+    return sum(fw.discard(rule) for rule in mss_rules(wan_interface, mss))
+
 
-    for check_args in rules:
-        # -C checks existence; swap to -A to append
-        add_args = [a if a != "-C" else "-A" for a in check_args]
-        if rule_exists(check_args):
-            continue
-        result = run_iptables(add_args)
-        if result.returncode != 0:
-            logger.error(f"Failed to add rule: {result.stderr.strip()}")
-            sys.exit(1)
-        added += 1
+@locked("firewall")
+def add_forwarding(wan_interface: str, probe_host: str | None = None) -> int:
+    """Add NAT forwarding and MSS clamp rules for a WAN interface. Returns rules added."""
+    fw = firewall.current()
+    added = ensure_nat_rules(fw, wan_interface)
+    added += clamp_mss(wan_interface, probe_host)
 
     if added == 0:
         logger.info(f"Forwarding rules for {wan_interface} already exist.")
     else:
         logger.info(f"Added {added} forwarding rule(s) for {wan_interface}.")
 
-    save_rules()
+    fw.save()
+    return added
 
 
-def remove_forwarding(wan_interface: str):
-    """Remove NAT forwarding rules for a WAN interface."""
-    rules = nat_rules(wan_interface)
-    removed = 0
-
-    for check_args in rules:
-        if not rule_exists(check_args):
-            continue
-        # -C checks existence; swap to -D to delete
-        del_args = [a if a != "-C" else "-D" for a in check_args]
-        result = run_iptables(del_args)
-        if result.returncode != 0:
-            logger.error(f"Failed to remove rule: {result.stderr.strip()}")
-            sys.exit(1)
-        removed += 1
+@locked("firewall")
+def remove_forwarding(wan_interface: str) -> int:
+    """Remove NAT forwarding and MSS clamp rules for a WAN interface. Returns rules removed."""
+    fw = firewall.current()
+    removed = sum(fw.discard(rule) for rule in nat_rules(wan_interface))
+    removed += unclamp_mss(wan_interface)
 
     if removed == 0:
         logger.info(f"No forwarding rules found for {wan_interface}.")
     else:
         logger.info(f"Removed {removed} forwarding rule(s) for {wan_interface}.")
 
-    save_rules()
+    fw.save()
+    return removed
 
 
-def save_rules():
-    """Persist iptables rules with netfilter-persistent."""
-    result = subprocess.run(
-        ["sudo", "netfilter-persistent", "save"],
-        capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        logger.error(f"Failed to save rules: {result.stderr.strip()}")
-        sys.exit(1)
+def manage_ports(args):
+    """forwarding port add/remove/list."""
+    import ipaddress
+
+    import port_forward
+    from interface import DNSMASQ_CONF, parse_ap_gateway, parse_hostapd_interface, read_file_with_sudo
+
+    if args.port_action in (None, "list"):
+        mappings = port_forward.list_mappings()
+        if not mappings:
+            logger.info("No port forwards configured.")
+            return
+        logger.info("Port forwards:")
+        for m in mappings:
+            target = f"{m['address']}:{m['to_ports']}" if m["to_ports"] else m["address"]
+            logger.info(f"  {m['wan']:<8} {m['protocol']} {m['ports']:<11} -> {target}")
+        return
+
+    ap_interface = parse_hostapd_interface() or AP_INTERFACE
+    subnet = ipaddress.ip_network(f"{parse_ap_gateway(ap_interface)}/24", strict=False)
+    protocols = list(port_forward.PROTOCOLS) if args.proto == "both" else [args.proto]
+
+    if args.port_action == "add":
+        target, to_port = port_forward.split_target(args.target)
+        added = port_forward.add_port(args.wan, args.ports, target, to_port, protocols,
+                                      ap_interface, subnet, read_file_with_sudo(DNSMASQ_CONF))
+        if added:
+            logger.info(f"Forwarding {args.wan} {args.proto} {args.ports} -> {args.target}.")
+        else:
+            logger.info(f"Port forward for {args.wan} {args.ports} already exists.")
+    else:
+        removed = port_forward.remove_port(args.wan, args.ports, protocols, ap_interface, subnet)
+        if removed:
+            logger.info(f"Removed {removed} port forward rule(s) for {args.wan} {args.ports}.")
+        else:
+            logger.info(f"No port forward found for {args.wan} {args.ports}.")
 
 
 def main():
@@ -117,20 +262,43 @@ def main():
     )
     sub = parser.add_subparsers(dest="action")
 
-    sub.add_parser("list", help="List forwarding interfaces")
+    list_parser = sub.add_parser("list", help="List forwarding interfaces")
+    output.add_options(list_parser)
     add_parser = sub.add_parser("add", help="Add forwarding for an interface")
     add_parser.add_argument("interface", help="WAN interface to forward through")
+    add_parser.add_argument("--probe-mtu", nargs="?", const=PROBE_HOST, metavar="HOST",
+                            help=f"Probe the path MTU to HOST (default: {PROBE_HOST}) and clamp MSS to it")
     rm_parser = sub.add_parser("remove", help="Remove forwarding for an interface")
     rm_parser.add_argument("interface", help="WAN interface to stop forwarding through")
 
+    port_parser = sub.add_parser("port", help="Forward WAN ports to AP clients (DNAT)")
+    port_sub = port_parser.add_subparsers(dest="port_action")
+    port_sub.add_parser("list", help="List port forwards")
+    port_add = port_sub.add_parser("add", help="Forward a WAN port or range to a client")
+    port_add.add_argument("wan", help="WAN interface the traffic arrives on")
+    port_add.add_argument("ports", help="Port or range, e.g. 8080 or 8000-8010")
+    port_add.add_argument("target", help="Client IP, or MAC/hostname with a DHCP reservation, "
+                                         "optionally with :port (e.g. 192.168.31.50:80)")
+    port_add.add_argument("--proto", choices=["tcp", "udp", "both"], default="tcp")
+    port_rm = port_sub.add_parser("remove", help="Stop forwarding a WAN port or range")
+    port_rm.add_argument("wan", help="WAN interface")
+    port_rm.add_argument("ports", help="Port or range as given to add")
+    port_rm.add_argument("--proto", choices=["tcp", "udp", "both"], default="tcp")
+
     args = parser.parse_args()
 
-    if args.action is None or args.action == "list":
-        list_forwarding()
+    if args.action is None:
+        list_forwarding(iter_forwarding())
+    elif args.action == "list" and args.format != "text":
+        output.write(output.selected(iter_forwarding(), args), args.format)
+    elif args.action == "list":
+        list_forwarding(output.selected(iter_forwarding(), args))
     elif args.action == "add":
-        add_forwarding(args.interface)
+        add_forwarding(args.interface, args.probe_mtu)
     elif args.action == "remove":
         remove_forwarding(args.interface)
+    elif args.action == "port":
+        manage_ports(args)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 import argparse
 import os
-import subprocess
+import re
+import tarfile
+import tempfile
+from pathlib import Path
+from urllib.parse import unquote
 
+import runner
 from config import DEFAULTS, SETUP_DIR, logger
 
+BUNDLE_MANIFEST = "manifest"
+BUNDLE_HEADER = re.compile(r"# pi-bridge bundle chipset=(\S+) arch=(\S+)")
+
 
 def run_script(script_name: str, env: dict | None = None):
     script_path = SETUP_DIR / script_name
-    result = subprocess.run(
+    result = runner.run(
         ["bash", str(script_path)],
         env=env,
         text=True,
@@ -30,22 +38,118 @@ def prompt_choice(message: str, choices: list[str], default: str | None = None)
         logger.warning(f"Please enter one of: {choice_str}")
 
 
-def install_packages(chipset: str):
+def install_packages(chipset: str, bundle: Path | None = None):
     env = os.environ.copy()
     env["WIFI_CHIPSET"] = chipset
+    if bundle is not None:
+        env["PACKAGE_BUNDLE"] = str(bundle.resolve())
     run_script("01-install-packages.sh", env=env)
 
 
+def required_packages(chipset: str) -> list[str]:
+    """The packages 01-install-packages.sh installs for a chipset."""
+    env = os.environ.copy()
+    env["WIFI_CHIPSET"] = chipset
+    result = runner.run(["bash", str(SETUP_DIR / "01-install-packages.sh"), "--list"],
+                        env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "Could not list required packages")
+    return result.stdout.split()
+
+
+def download_closure(packages: list[str], archives: Path) -> None:
+    """Download the packages and everything they need on a system with nothing installed.
+
+    apt's own solver picks the set, against an empty dpkg status file: one
+    alternative per OR dependency and one provider per virtual package, as
+    on a fresh install, where `apt-cache depends --recurse` lists them all.
+    """
+    (archives / "partial").mkdir(parents=True, exist_ok=True)
+    status = archives / "status"
+    status.write_text("")
+    result = runner.run(
+        ["apt-get", "install", "--download-only", "-y", "--no-install-recommends",
+         "-o", f"Dir::State::status={status}", "-o", f"Dir::Cache::archives={archives}",
+         "-o", "Debug::NoLocking=1"] + packages,
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"apt-get download failed: {result.stderr.strip()}")
+
+
+def bundle_chipset(bundle: Path) -> str:
+    """The chipset a bundle was made for, read from its manifest header."""
+    try:
+        with tarfile.open(bundle, "r:gz") as tar:
+            member = tar.next()
+            if member is None or member.name != BUNDLE_MANIFEST:
+                raise RuntimeError(f"{bundle} is not a pi-bridge bundle")
+            header = tar.extractfile(member).readline().decode()
+    except (OSError, tarfile.TarError) as e:
+        raise RuntimeError(f"Could not read bundle {bundle}: {e}")
+    match = BUNDLE_HEADER.match(header)
+    if match is None:
+        raise RuntimeError(f"{bundle} is not a pi-bridge bundle")
+    return match.group(1)
+
+
+def create_bundle(chipset: str, output: Path) -> None:
+    """Download the full .deb set for a chipset into a tar.gz for offline installs.
+
+    Every dependency is included, even ones installed here, so the bundle
+    can complete an install on a freshly flashed Pi of the same release and
+    architecture.
+    """
+    packages = required_packages(chipset)
+    result = runner.run(["sudo", "apt-get", "update"], text=True, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"apt-get update failed: {result.stderr.strip()}")
+    arch = runner.run(["dpkg", "--print-architecture"], capture_output=True, text=True).stdout.strip()
+
+    logger.info(f"Downloading {' '.join(packages)} and their dependencies for {chipset} ({arch})...")
+    with tempfile.TemporaryDirectory() as tmp:
+        download_closure(packages, Path(tmp))
+
+        # apt names files <package>_<version, %-encoded>_<arch>.deb
+        debs = sorted(Path(tmp).glob("*.deb"))
+        manifest = [f"# pi-bridge bundle chipset={chipset} arch={arch}"]
+        for deb in debs:
+            name, version, _ = deb.name.split("_", 2)
+            manifest.append(f"{name} {unquote(version)} {deb.name}")
+        (Path(tmp) / BUNDLE_MANIFEST).write_text("\n".join(manifest) + "\n")
+
+        with tarfile.open(output, "w:gz") as tar:
+            # Manifest first so bundle_chipset() can stop after one member
+            tar.add(Path(tmp) / BUNDLE_MANIFEST, arcname=BUNDLE_MANIFEST)
+            for deb in debs:
+                tar.add(deb, arcname=deb.name)
+
+    size = output.stat().st_size / (1024 * 1024)
+    logger.info(f"Wrote {output} ({len(debs)} packages, {size:.1f} MiB).")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Install Pi Bridge dependencies and firmware")
     parser.add_argument("--use-defaults", action="store_true", help="Use default chipset")
     parser.add_argument("--chipset", choices=["intel", "realtek"], help="WiFi chipset")
+    bundle = parser.add_mutually_exclusive_group()
+    bundle.add_argument("--bundle-create", metavar="FILE", type=Path,
+                        help="Download every package for the chipset into FILE (tar.gz) instead of installing")
+    bundle.add_argument("--bundle", metavar="FILE", type=Path,
+                        help="Install from a bundle made with --bundle-create, without network access")
     args = parser.parse_args()
 
+    if args.bundle_create:
+        chipset = args.chipset or DEFAULTS["DEFAULT_WIFI_CHIPSET"]
+        create_bundle(chipset, args.bundle_create)
+        return
+
     logger.info("=== Pi Bridge Dependency Install ===")
 
     if args.chipset:
         chipset = args.chipset
+    elif args.bundle:
+        chipset = bundle_chipset(args.bundle)
     elif args.use_defaults:
         chipset = DEFAULTS["DEFAULT_WIFI_CHIPSET"]
     else:
@@ -58,7 +162,7 @@ def main():
     logger.info(f"\nChipset: {chipset}")
     logger.info("")
 
-    install_packages(chipset)
+    install_packages(chipset, args.bundle)
 
     logger.info("\n=== Dependency install complete ===")
     logger.info("Reboot recommended before running `pi-bridge setup`.")
@@ -4,17 +4,25 @@ import os
 import re
 import subprocess
 import sys
+import time
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
+import output
+import runner
+import transaction
 from config import DEFAULTS, SETUP_DIR, logger
 
 HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
 DNSMASQ_CONF = Path("/etc/dnsmasq.conf")
 NM_CONF = Path("/etc/NetworkManager/NetworkManager.conf")
 
+# Seconds hostapd gets to come up on the new interface before rolling back
+HOSTAPD_DEADLINE = 15.0
+
 
 def run(cmd: list[str], check: bool = True, capture: bool = False) -> subprocess.CompletedProcess:
-    result = subprocess.run(
+    result = runner.run(
         cmd,
         capture_output=capture,
         text=True,
@@ -27,7 +35,7 @@ def run(cmd: list[str], check: bool = True, capture: bool = False) -> subprocess
 
 def run_script(script_name: str, env: dict) -> None:
     script_path = SETUP_DIR / script_name
-    result = subprocess.run(
+    result = runner.run(
         ["bash", str(script_path)],
         env=env,
         text=True,
@@ -38,7 +46,7 @@ def run_script(script_name: str, env: dict) -> None:
 
 
 def interface_exists(interface: str) -> bool:
-    result = subprocess.run(
+    result = runner.run(
         ["ip", "link", "show", interface],
         capture_output=True,
         text=True,
@@ -46,16 +54,32 @@ def interface_exists(interface: str) -> bool:
     return result.returncode == 0
 
 
+def is_wireless(interface: str) -> bool:
+    result = runner.run(["iw", "dev"], capture_output=True, text=True)
+    return re.search(rf"^\s*Interface {re.escape(interface)}$", result.stdout, re.MULTILINE) is not None
+
+
 def read_file_with_sudo(path: Path) -> str:
+    tx = transaction.active()
+    if tx is not None and path in tx.files:
+        return tx.files[path]
     try:
-        return path.read_text()
+        content = path.read_text()
     except (PermissionError, FileNotFoundError):
         result = run(["sudo", "cat", str(path)], capture=True)
-        return result.stdout
+        content = result.stdout
+    if tx is not None:
+        tx.files[path] = content
+    return content
 
 
 def write_file_with_sudo(path: Path, content: str) -> None:
-    process = subprocess.run(
+    tx = transaction.active()
+    if tx is not None:
+        previous = read_file_with_sudo(path)
+        tx.record(f"write {path}", lambda: write_file_with_sudo(path, previous))
+        tx.files[path] = content
+    process = runner.run(
         ["sudo", "tee", str(path)],
         input=content,
         text=True,
@@ -84,10 +108,11 @@ def parse_ap_gateway(ap_interface: str) -> str:
 
 
 def parse_wan_interface() -> str:
-    result = run(["sudo", "iptables", "-t", "nat", "-S", "POSTROUTING"], capture=True)
-    match = re.search(r"-A POSTROUTING -o (\S+) -j MASQUERADE", result.stdout)
-    if match:
-        return match.group(1)
+    from forwarding import forwarding_interfaces
+
+    interfaces = forwarding_interfaces()
+    if interfaces:
+        return interfaces[0]
     return DEFAULTS["DEFAULT_WAN_INTERFACE"]
 
 
@@ -100,73 +125,92 @@ def replace_line(content: str, pattern: str, replacement: str) -> str:
     return updated
 
 
-def update_interface_configs(new_interface: str) -> None:
+def render_interface_configs(new_interface: str) -> dict[Path, str]:
+    """hostapd, dnsmasq and NetworkManager configs pointed at the new interface."""
     hostapd = read_file_with_sudo(HOSTAPD_CONF)
-    hostapd = replace_line(hostapd, r"^interface=.*$", f"interface={new_interface}")
-    write_file_with_sudo(HOSTAPD_CONF, hostapd)
-
     dnsmasq = read_file_with_sudo(DNSMASQ_CONF)
-    dnsmasq = replace_line(dnsmasq, r"^interface=.*$", f"interface={new_interface}")
-    write_file_with_sudo(DNSMASQ_CONF, dnsmasq)
-
     nm = read_file_with_sudo(NM_CONF)
-    nm = replace_line(nm, r"^unmanaged-devices=.*$", f"unmanaged-devices=interface-name:{new_interface}")
-    write_file_with_sudo(NM_CONF, nm)
+    return {
+        HOSTAPD_CONF: replace_line(hostapd, r"^interface=.*$", f"interface={new_interface}"),
+        DNSMASQ_CONF: replace_line(dnsmasq, r"^interface=.*$", f"interface={new_interface}"),
+        NM_CONF: replace_line(nm, r"^unmanaged-devices=.*$", f"unmanaged-devices=interface-name:{new_interface}"),
+    }
 
 
-def nat_rule_checks(ap_interface: str, wan_interface: str) -> list[list[str]]:
-    return [
-        ["-t", "nat", "-C", "POSTROUTING", "-o", wan_interface, "-j", "MASQUERADE"],
-        ["-C", "FORWARD", "-i", wan_interface, "-o", ap_interface,
-         "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"],
-        ["-C", "FORWARD", "-i", ap_interface, "-o", wan_interface, "-j", "ACCEPT"],
-    ]
-
-
-def iptables_rule_exists(check_args: list[str]) -> bool:
-    result = subprocess.run(
-        ["sudo", "iptables"] + check_args,
-        capture_output=True,
-        text=True,
-    )
+def reconcile_wan_change(ap_interface: str, old_wan: str, new_wan: str) -> None:
+    import firewall
+    from forwarding import clamp_mss, ensure_nat_rules, nat_rules, unclamp_mss
+
+    fw = firewall.current()
+    for rule in nat_rules(old_wan, ap_interface):
+        fw.discard(rule)
+    unclamp_mss(old_wan)
+
+    ensure_nat_rules(fw, new_wan, ap_interface)
+    clamp_mss(new_wan)
+
+    fw.save()
+
+
+def systemctl(action: str, unit: str, undo: list[str] | None = None, check: bool = True) -> None:
+    """Run a systemctl action, recording its inverse when inside a transaction."""
+    run(["sudo", "systemctl"] + action.split() + [unit], check=check, capture=True)
+    tx = transaction.active()
+    if tx is not None and undo:
+        for inverse in undo:
+            tx.record(f"systemctl {action} {unit}",
+                      lambda inverse=inverse: run(["sudo", "systemctl"] + inverse.split() + [unit],
+                                                  check=False, capture=True))
+
+
+def hostapd_up(interface: str, control_socket: bool) -> bool:
+    """Whether hostapd is serving on `interface` (BSS enabled, if we can ask it)."""
+    if control_socket:
+        result = runner.run(
+            ["sudo", "hostapd_cli", "-i", interface, "status"],
+            capture_output=True, text=True,
+        )
+        return result.returncode == 0 and "state=ENABLED" in result.stdout
+    result = runner.run(["systemctl", "is-active", "--quiet", "hostapd"])
     return result.returncode == 0
 
 
-def iptables_rule_add(check_args: list[str]) -> None:
-    add_args = [a if a != "-C" else "-A" for a in check_args]
-    run(["sudo", "iptables"] + add_args, check=True, capture=True)
-
+def wait_for_hostapd(interface: str, control_socket: bool, deadline: float,
+                     interval: float = 0.1) -> bool:
+    end = time.monotonic() + deadline
+    while not hostapd_up(interface, control_socket):
+        if time.monotonic() >= end:
+            return False
+        time.sleep(interval)
+    return True
 
-def iptables_rule_del(check_args: list[str]) -> None:
-    del_args = [a if a != "-C" else "-D" for a in check_args]
-    run(["sudo", "iptables"] + del_args, check=True, capture=True)
 
+def switch_interface(new_interface: str, wan_interface: str | None = None,
+                     deadline: float = HOSTAPD_DEADLINE) -> None:
+    """Move the AP to another interface, rolling back if it doesn't come up.
 
-def reconcile_nat_rules(old_ap: str, new_ap: str, wan: str) -> None:
-    for check_args in nat_rule_checks(old_ap, wan):
-        if iptables_rule_exists(check_args):
-            iptables_rule_del(check_args)
+    Runs in the active transaction (e.g. a batch) or in one of its own.
+    """
+    import locks
 
-    for check_args in nat_rule_checks(new_ap, wan):
-        if not iptables_rule_exists(check_args):
-            iptables_rule_add(check_args)
-
-    run(["sudo", "netfilter-persistent", "save"], check=True, capture=True)
-
-
-def reconcile_wan_change(ap_interface: str, old_wan: str, new_wan: str) -> None:
-    for check_args in nat_rule_checks(ap_interface, old_wan):
-        if iptables_rule_exists(check_args):
-            iptables_rule_del(check_args)
+    if transaction.active() is not None:
+        with locks.hold(*locks.RESOURCES):
+            _switch_interface(new_interface, wan_interface, deadline)
+        return
+    with transaction.transaction(), locks.hold(*locks.RESOURCES):
+        _switch_interface(new_interface, wan_interface, deadline)
 
-    for check_args in nat_rule_checks(ap_interface, new_wan):
-        if not iptables_rule_exists(check_args):
-            iptables_rule_add(check_args)
 
-    run(["sudo", "netfilter-persistent", "save"], check=True, capture=True)
+def _switch_interface(new_interface: str, wan_interface: str | None, deadline: float) -> None:
+    # Only a switch needs the firewall modules; `interface show` and the
+    # commands that just look up the AP interface don't pay for them
+    import ipaddress
 
+    import acl
+    import firewall
+    import port_forward
+    from forwarding import clamp_mss, ensure_nat_rules, nat_rules
 
-def switch_interface(new_interface: str, wan_interface: str | None = None) -> None:
     if not interface_exists(new_interface):
         raise RuntimeError(f"Interface '{new_interface}' not found")
 
@@ -186,55 +230,106 @@ def switch_interface(new_interface: str, wan_interface: str | None = None) -> No
         logger.info(f"WAN interface switched to {wan}.")
         return
 
+    if not is_wireless(new_interface):
+        raise RuntimeError(f"Interface '{new_interface}' is not a wireless interface")
+    if new_interface == wan:
+        raise RuntimeError(f"Interface '{new_interface}' is the WAN interface")
+
     gateway = parse_ap_gateway(old_interface)
 
     logger.info(f"Switching AP interface: {old_interface} -> {new_interface}")
     logger.info(f"WAN interface: {wan}")
     logger.info("")
 
-    update_interface_configs(new_interface)
+    # Prepare everything the old AP can keep running through
+    configs = render_interface_configs(new_interface)
+    control_socket = re.search(r"^ctrl_interface=", configs[HOSTAPD_CONF], re.MULTILINE) is not None
 
     env = dict(os.environ)
     env["AP_INTERFACE"] = new_interface
     env["AP_GATEWAY"] = gateway
     run_script("06-setup-service.sh", env=env)
-
-    run(["sudo", "systemctl", "disable", "--now", f"{old_interface}-static-ip.service"], check=False, capture=True)
-    run(["sudo", "systemctl", "enable", f"{new_interface}-static-ip.service"], check=True, capture=True)
-    run(["sudo", "systemctl", "start", f"{new_interface}-static-ip.service"], check=True, capture=True)
-
-    reconcile_nat_rules(old_interface, new_interface, wan)
-
-    run(["sudo", "systemctl", "restart", "NetworkManager"], check=True, capture=True)
-    run(["sudo", "systemctl", "restart", "hostapd"], check=True, capture=True)
-    run(["sudo", "systemctl", "restart", "dnsmasq"], check=True, capture=True)
-
-    logger.info(f"AP interface switched to {new_interface}.")
-
-
-def show_interface() -> None:
-    iface = parse_hostapd_interface() or "unknown"
-    logger.info(f"Configured AP interface: {iface}")
+    systemctl("enable", f"{new_interface}-static-ip.service", undo=["disable"])
+
+    fw = firewall.current()
+    new_rules = nat_rules(wan, new_interface)
+    ensure_nat_rules(fw, wan, new_interface)
+    clamp_mss(wan)
+    stale_rules = [rule for rule in nat_rules(wan, old_interface) if rule not in new_rules and fw.exists(rule)]
+    if fw.exists(acl.allow_rule(old_interface)):
+        fw.ensure(acl.allow_rule(new_interface), insert=True)
+        stale_rules.append(acl.allow_rule(old_interface))
+    subnet = ipaddress.ip_network(f"{gateway}/24", strict=False)
+    for rule in port_forward.ap_rules(fw, new_interface, subnet):
+        fw.ensure(rule)
+    stale_rules += [rule for rule in port_forward.ap_rules(fw, old_interface, subnet) if fw.exists(rule)]
+
+    transaction.active().needs_restart("NetworkManager", "hostapd", "dnsmasq")
+
+    # Cutover: the AP is down from here until hostapd answers on the new interface
+    logger.info("Cutting over...")
+    started = time.monotonic()
+    with runner.phase("cutover"):
+        for path, content in configs.items():
+            write_file_with_sudo(path, content)
+        systemctl("reload-or-restart", "NetworkManager")
+        systemctl("disable --now", f"{old_interface}-static-ip.service", undo=["enable", "start"], check=False)
+        systemctl("start", f"{new_interface}-static-ip.service", undo=["stop"])
+        run(["sudo", "systemctl", "restart", "hostapd", "dnsmasq"], capture=True)
+        if not wait_for_hostapd(new_interface, control_socket, deadline):
+            raise RuntimeError(f"hostapd did not come up on {new_interface} within {deadline:g}s")
+    downtime = time.monotonic() - started
+
+    for rule in stale_rules:
+        fw.discard(rule)
+    fw.save()
+
+    logger.info(f"AP interface switched to {new_interface} (down for {downtime:.2f}s).")
+
+
+def iter_interface() -> Iterator[dict]:
+    """Yield the configured AP interface as a record."""
+    yield {"interface": parse_hostapd_interface()}
+
+
+def show_interface(records: Iterable[dict]) -> None:
+    for record in records:
+        logger.info(f"Configured AP interface: {record['interface'] or 'unknown'}")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Manage AP interface")
     sub = parser.add_subparsers(dest="action")
 
-    sub.add_parser("show", help="Show current AP interface")
+    show_parser = sub.add_parser("show", help="Show current AP interface")
+    output.add_options(show_parser)
 
     sw = sub.add_parser("switch", help="Switch AP to a different wireless interface")
     sw.add_argument("interface", help="Interface to use as AP (e.g., wlan1)")
     sw.add_argument("--wan", help="WAN interface for NAT rules (default: current detected)")
+    sw.add_argument(
+        "--deadline",
+        type=float,
+        default=HOSTAPD_DEADLINE,
+        help=f"Seconds to wait for hostapd before rolling back (default: {HOSTAPD_DEADLINE:g})",
+    )
 
     args = parser.parse_args()
 
-    if args.action is None or args.action == "show":
-        show_interface()
+    if args.action is None:
+        show_interface(iter_interface())
+        return
+
+    if args.action == "show":
+        records = output.selected(iter_interface(), args)
+        if args.format == "text":
+            show_interface(records)
+        else:
+            output.write(records, args.format)
         return
 
     if args.action == "switch":
-        switch_interface(args.interface, args.wan)
+        switch_interface(args.interface, args.wan, args.deadline)
         return
 
     parser.print_help()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Per-resource locks that let concurrent pi-bridge commands run safely.
+
+Each resource a command can change has its own lock file, taken with
+flock(2), so commands that touch different resources run in parallel
+and conflicting ones wait for each other. Read-only commands take no
+locks and never wait.
+
+Locks are reentrant within a thread. Several locks needed at once are
+taken in sorted order, so two commands can't deadlock each other. A
+command that can't get a lock within PI_BRIDGE_LOCK_TIMEOUT seconds
+fails instead of waiting forever. Inside a transaction (a batch), locks
+are kept until it commits or rolls back.
+"""
+import fcntl
+import functools
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import transaction
+from config import logger
+
+# hostapd.conf, dnsmasq.conf, NetworkManager.conf, iptables/ipset, systemd units
+RESOURCES = ("dnsmasq", "firewall", "hostapd", "network", "units")
+LOCK_DIR = Path(os.environ.get("PI_BRIDGE_LOCK_DIR", "/run/lock/pi-bridge"))
+LOCK_TIMEOUT = float(os.environ.get("PI_BRIDGE_LOCK_TIMEOUT", "60"))
+POLL_INTERVAL = 0.05
+
+_local = threading.local()
+
+
+def _held() -> dict[str, list]:
+    """This thread's locks: resource -> [fd, depth]."""
+    if not hasattr(_local, "held"):
+        _local.held = {}
+    return _local.held
+
+
+def lock_path(resource: str) -> Path:
+    return LOCK_DIR / f"{resource}.lock"
+
+
+def _open(resource: str) -> int:
+    if not LOCK_DIR.exists():
+        LOCK_DIR.mkdir(parents=True, exist_ok=True)
+        # Shared by every user that runs pi-bridge, like /run/lock itself
+        os.chmod(LOCK_DIR, 0o1777)
+    fd = os.open(lock_path(resource), os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        os.fchmod(fd, 0o666)
+    except PermissionError:
+        pass
+    return fd
+
+
+def holder(resource: str) -> str | None:
+    """The PID recorded by the last process to take a lock, if any."""
+    try:
+        return lock_path(resource).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def _acquire(resource: str, deadline: float) -> int:
+    fd = _open(resource)
+    waiting = False
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                pid = holder(resource)
+                raise RuntimeError(
+                    f"Timed out waiting for the {resource} lock"
+                    + (f" (held by pid {pid})" if pid else "")
+                    + "; another pi-bridge command is changing it"
+                )
+            if not waiting:
+                logger.info(f"Waiting for the {resource} lock...")
+                waiting = True
+            time.sleep(POLL_INTERVAL)
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    return fd
+
+
+def _release(resource: str) -> None:
+    held = _held()
+    entry = held[resource]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del held[resource]
+        fcntl.flock(entry[0], fcntl.LOCK_UN)
+        os.close(entry[0])
+
+
+def release_all() -> None:
+    """Drop every lock this thread holds (end of a transaction)."""
+    for resource in list(_held()):
+        _held()[resource][1] = 1
+        _release(resource)
+
+
+@contextmanager
+def hold(*resources: str, timeout: float | None = None) -> Iterator[None]:
+    """Hold the locks for `resources` for the duration of the block.
+
+    Already-held locks are re-entered. New ones are taken in sorted order;
+    a nested block that adds a lock sorting before one already held can't
+    keep that order, and relies on the timeout instead.
+    """
+    unknown = set(resources) - set(RESOURCES)
+    if unknown:
+        raise ValueError(f"Unknown lock resource(s): {', '.join(sorted(unknown))}")
+    deadline = time.monotonic() + (LOCK_TIMEOUT if timeout is None else timeout)
+    held = _held()
+    taken = []
+    try:
+        for resource in sorted(set(resources)):
+            if resource in held:
+                held[resource][1] += 1
+            else:
+                held[resource] = [_acquire(resource, deadline), 1]
+            taken.append(resource)
+        yield
+    finally:
+        # A transaction keeps its locks until it ends, so rollback is covered too
+        if transaction.active() is None:
+            for resource in reversed(taken):
+                _release(resource)
+
+
+def locked(*resources: str):
+    """Decorator form of hold()."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with hold(*resources):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
@@ -1,43 +1,166 @@
 #!/usr/bin/env python3
-import subprocess
-import sys
 import argparse
+import json
+from collections.abc import Iterator
+from datetime import datetime
 
-from config import logger
+import runner
+from config import logger, DEFAULTS, STATE_DIR
 
+CURSOR_FILE = STATE_DIR / "logs.cursor"
 
-def show_logs(service: str, follow: bool = False, lines: int = 50):
-    """Show logs for a service using journalctl."""
-    cmd = ["sudo", "journalctl", "-u", service, "-n", str(lines)]
+
+def service_units(service: str) -> list[str]:
+    """Map a logs service choice to the systemd units it covers."""
+    units = {
+        "hostapd": ["hostapd"],
+        "dnsmasq": ["dnsmasq"],
+    }
+    if service in ("static-ip", "all"):
+        # The static IP unit is named after the AP interface, which `interface switch` can change
+        from interface import parse_hostapd_interface
+        interface = parse_hostapd_interface() or DEFAULTS["DEFAULT_AP_INTERFACE"]
+        units["static-ip"] = [f"{interface}-static-ip"]
+    if service == "all":
+        return [unit for group in units.values() for unit in group]
+    return units[service]
+
+
+def journal_command(units: list[str], lines: int | None = None, cursor: str | None = None,
+                    follow: bool = False, since: str | None = None, boot: str | None = None) -> list[str]:
+    """Build a single journalctl invocation covering all units."""
+    cmd = ["sudo", "journalctl", "-o", "json", "--no-pager", "-q"]
+    for unit in units:
+        cmd += ["-u", unit]
+    if boot is not None:
+        cmd += ["-b", boot]
+    if cursor:
+        cmd += ["--after-cursor", cursor]
+    elif since:
+        cmd += ["--since", since]
+    elif lines is not None:
+        cmd += ["-n", str(lines)]
     if follow:
         cmd.append("-f")
+    return cmd
+
+
+def parse_entry(line: str) -> dict | None:
+    """Normalize one `journalctl -o json` record. Returns None for non-JSON lines."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+
+    message = record.get("MESSAGE", "")
+    if isinstance(message, list):
+        # journald encodes non-UTF-8 messages as byte arrays
+        message = bytes(message).decode("utf-8", "replace")
+
+    try:
+        timestamp = int(record.get("__REALTIME_TIMESTAMP", 0)) / 1_000_000
+    except (TypeError, ValueError):
+        timestamp = 0.0
+
+    unit = record.get("_SYSTEMD_UNIT") or record.get("UNIT") or record.get("SYSLOG_IDENTIFIER", "")
+    if unit.endswith(".service"):
+        unit = unit[:-8]
+
+    return {
+        "time": timestamp,
+        "unit": unit,
+        "message": message or "",
+        "pid": record.get("_PID"),
+        "cursor": record.get("__CURSOR"),
+    }
+
+
+def iter_entries(units: list[str], lines: int | None = None, cursor: str | None = None,
+                 follow: bool = False, since: str | None = None) -> Iterator[dict]:
+    """Stream entries for all units as one time-ordered sequence.
+
+    journald interleaves the units itself, so a single process serves every
+    unit, including in follow mode.
+    """
+    command = journal_command(units, lines=lines, cursor=cursor, follow=follow, since=since)
+    for line in runner.stream_lines(command):
+        entry = parse_entry(line)
+        if entry is not None:
+            yield entry
+
+
+def normalize_mac(mac: str) -> str:
+    return mac.lower().replace("-", ":")
+
+
+def matches_mac(entry: dict, mac: str) -> bool:
+    """True if the entry mentions the given client MAC."""
+    return normalize_mac(mac) in entry["message"].lower()
+
+
+def load_cursor() -> str | None:
+    try:
+        return CURSOR_FILE.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_cursor(cursor: str) -> None:
+    CURSOR_FILE.parent.mkdir(parents=True, exist_ok=True)
+    CURSOR_FILE.write_text(cursor + "\n")
+
+
+def format_entry(entry: dict) -> str:
+    stamp = datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{stamp} {entry['unit']}: {entry['message']}"
+
+
+def show_logs(service: str, follow: bool = False, lines: int = 50, mac: str | None = None,
+              as_json: bool = False, resume: bool = False):
+    """Print a merged, time-ordered log stream for one or more services."""
+    cursor = load_cursor() if resume else None
+    last_cursor = None
 
     try:
-        subprocess.run(cmd)
+        for entry in iter_entries(service_units(service), lines=lines, cursor=cursor, follow=follow):
+            if entry["cursor"]:
+                last_cursor = entry["cursor"]
+            if mac and not matches_mac(entry, mac):
+                continue
+            if as_json:
+                print(json.dumps(entry), flush=follow)
+            else:
+                print(format_entry(entry), flush=follow)
     except KeyboardInterrupt:
         pass
+    finally:
+        if resume and last_cursor:
+            save_cursor(last_cursor)
 
 
 def main():
     parser = argparse.ArgumentParser(description="View AP service logs")
     parser.add_argument("service", nargs="?", default="hostapd",
-                        choices=["hostapd", "dnsmasq", "all"],
+                        choices=["hostapd", "dnsmasq", "static-ip", "all"],
                         help="Service to view logs for (default: hostapd)")
     parser.add_argument("-f", "--follow", action="store_true",
                         help="Follow log output")
     parser.add_argument("-n", "--lines", type=int, default=50,
                         help="Number of lines to show (default: 50)")
+    parser.add_argument("--mac", help="Only show entries mentioning this client MAC")
+    parser.add_argument("--json", action="store_true",
+                        help="Print one JSON object per entry")
+    parser.add_argument("--since-last", action="store_true",
+                        help="Resume after the last entry shown by a previous --since-last call")
     args = parser.parse_args()
 
-    logger.info(f"=== {args.service.title()} Logs ===\n")
+    if not args.json:
+        logger.info(f"=== {args.service.title()} Logs ===\n")
 
-    if args.service == "all":
-        for svc in ["hostapd", "dnsmasq"]:
-            logger.info(f"--- {svc} ---")
-            show_logs(svc, follow=False, lines=args.lines // 2)
-            logger.info("")
-    else:
-        show_logs(args.service, follow=args.follow, lines=args.lines)
+    show_logs(args.service, follow=args.follow, lines=args.lines, mac=args.mac,
+              as_json=args.json, resume=args.since_last)
 
 
 if __name__ == "__main__":
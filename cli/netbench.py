@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""NAT forwarding self-test in network namespaces.
+
+`pi-bridge bench forward` builds three namespaces joined by veth pairs:
+
+    client (10.201.1.2) -- [pib-ap0] router [pib-wan0] -- (10.201.2.2) server
+
+The router namespace stands in for the Pi: it forwards with the rules
+forwarding.nat_rules() generates for its AP and WAN veths, behind a
+FORWARD policy of DROP. The server has no route back to the client
+subnet, so traffic only flows if the NAT rules work. Extra iptables
+rules (--rule) go into the router as well, to measure their cost.
+
+Small agents (this module run with `agent ...`) then push traffic
+through it:
+  tcp      one bulk TCP stream for --duration seconds   -> Mbit/s
+  udp      a flood of small datagrams                    -> packets/s, loss
+  latency  UDP ping-pongs, one at a time                 -> RTT percentiles
+
+Each phase also records per-core CPU use (busy and softirq) from
+/proc/stat. The agents run on the same cores, so compare runs made on
+the same machine rather than reading the numbers as absolute. Nothing
+touches the real interfaces, radio or uplink, and the namespaces are
+removed afterwards.
+"""
+import argparse
+import json
+import math
+import os
+import shlex
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import acl
+import runner
+from config import logger
+from forwarding import nat_rules
+
+CLIENT_NS = "pib-bench-client"
+ROUTER_NS = "pib-bench-router"
+SERVER_NS = "pib-bench-server"
+NAMESPACES = (CLIENT_NS, ROUTER_NS, SERVER_NS)
+# (router side, far side, router address, far address)
+AP_LINK = ("pib-ap0", "pib-cl0", "10.201.1.1/24", "10.201.1.2/24")
+WAN_LINK = ("pib-wan0", "pib-srv0", "10.201.2.1/24", "10.201.2.2/24")
+SERVER_ADDRESS = WAN_LINK[3].split("/")[0]
+TCP_PORT = 5201
+UDP_PORT = 5202
+UDP_PAYLOAD = 64
+TCP_CHUNK = 128 * 1024
+
+DEFAULT_DURATION = 5.0
+DEFAULT_PINGS = 1000
+
+
+# --- agents (run inside the namespaces) ----------------------------------------
+
+def cpu_times() -> dict[str, list[int]]:
+    """Per-core jiffies from /proc/stat: user nice system idle iowait irq softirq steal."""
+    times = {}
+    for line in Path("/proc/stat").read_text().splitlines():
+        name, *fields = line.split()
+        if name.startswith("cpu") and name != "cpu":
+            times[name] = [int(f) for f in fields[:8]]
+    return times
+
+
+def cpu_usage(before: dict[str, list[int]], after: dict[str, list[int]]) -> list[dict]:
+    """Busy and softirq percentages per core between two cpu_times() samples."""
+    usage = []
+    for name, now in after.items():
+        delta = [b - a for a, b in zip(before.get(name, now), now)]
+        total = sum(delta) or 1
+        idle = delta[3] + delta[4]
+        usage.append({
+            "cpu": int(name[3:]),
+            "busy": round(100 * (total - idle) / total, 1),
+            "softirq": round(100 * delta[6] / total, 1),
+        })
+    return sorted(usage, key=lambda u: u["cpu"])
+
+
+def run_sink() -> None:
+    """Count TCP bytes and UDP datagrams, and echo UDP pings, until killed."""
+    tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    tcp.bind(("", TCP_PORT))
+    tcp.listen()
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    udp.bind(("", UDP_PORT))
+
+    def drain(conn: socket.socket) -> None:
+        received = 0
+        with conn:
+            while chunk := conn.recv(TCP_CHUNK):
+                received += len(chunk)
+            conn.sendall(f"{received}\n".encode())
+
+    def accept() -> None:
+        while True:
+            conn, _ = tcp.accept()
+            threading.Thread(target=drain, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    print("ready", flush=True)
+
+    flood = 0
+    while True:
+        data, peer = udp.recvfrom(2048)
+        kind = data[:1]
+        if kind == b"F":
+            flood += 1
+        elif kind == b"P":
+            udp.sendto(data, peer)
+        elif kind == b"Q":
+            # Report and reset the flood count
+            udp.sendto(f"{flood}".encode(), peer)
+            flood = 0
+
+
+def tcp_phase(host: str, duration: float) -> dict:
+    buffer = b"\0" * TCP_CHUNK
+    with socket.create_connection((host, TCP_PORT), timeout=5) as conn:
+        before = cpu_times()
+        started = time.perf_counter()
+        deadline = started + duration
+        while time.perf_counter() < deadline:
+            conn.sendall(buffer)
+        conn.shutdown(socket.SHUT_WR)
+        received = int(conn.makefile().readline() or 0)
+        elapsed = time.perf_counter() - started
+        after = cpu_times()
+    return {
+        "bytes": received,
+        "seconds": round(elapsed, 3),
+        "mbit_s": round(received * 8 / elapsed / 1e6, 1),
+        "cpu": cpu_usage(before, after),
+    }
+
+
+def udp_query(sock: socket.socket, host: str) -> int | None:
+    """Ask the sink for (and reset) its flood count."""
+    for _ in range(5):
+        sock.sendto(b"Q", (host, UDP_PORT))
+        try:
+            while True:
+                data = sock.recv(2048)
+                if data[:1] not in (b"P", b"F"):
+                    return int(data)
+        except socket.timeout:
+            continue
+    return None
+
+
+def udp_phase(host: str, duration: float) -> dict:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    udp_query(sock, host)
+    payload = b"F" + b"\0" * (UDP_PAYLOAD - 1)
+    target = (host, UDP_PORT)
+    sent = 0
+    before = cpu_times()
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        for _ in range(64):
+            try:
+                sock.sendto(payload, target)
+                sent += 1
+            except BlockingIOError:
+                pass
+    elapsed = time.perf_counter() - started
+    after = cpu_times()
+    # Let the last datagrams land before asking
+    time.sleep(0.1)
+    received = udp_query(sock, host) or 0
+    sock.close()
+    return {
+        "payload_bytes": UDP_PAYLOAD,
+        "sent": sent,
+        "received": received,
+        "seconds": round(elapsed, 3),
+        "pps": round(received / elapsed),
+        "loss": round(1 - received / sent, 4) if sent else 0.0,
+        "cpu": cpu_usage(before, after),
+    }
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def latency_phase(host: str, count: int) -> dict:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    rtts, lost = [], 0
+    for seq in range(count):
+        probe = b"P" + seq.to_bytes(4, "big")
+        started = time.perf_counter_ns()
+        sock.sendto(probe, (host, UDP_PORT))
+        try:
+            while sock.recv(2048) != probe:
+                pass
+            rtts.append((time.perf_counter_ns() - started) / 1000)
+        except socket.timeout:
+            lost += 1
+    sock.close()
+    rtts.sort()
+    if not rtts:
+        return {"count": count, "lost": lost}
+    return {
+        "count": count,
+        "lost": lost,
+        **{f"p{p}_us": round(percentile(rtts, p / 100), 1) for p in (50, 90, 99)},
+        "max_us": round(rtts[-1], 1),
+    }
+
+
+def run_client(host: str, duration: float, pings: int) -> None:
+    print(json.dumps({
+        "tcp": tcp_phase(host, duration),
+        "udp": udp_phase(host, duration),
+        "latency": latency_phase(host, pings),
+    }), flush=True)
+
+
+# --- topology ------------------------------------------------------------------
+
+def sudo(*cmd: str) -> str:
+    result = runner.run(["sudo", *cmd], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{shlex.join(cmd)}' failed: {result.stderr.strip() or result.returncode}")
+    return result.stdout
+
+
+def in_ns(namespace: str, *cmd: str) -> str:
+    return sudo("ip", "netns", "exec", namespace, *cmd)
+
+
+def router_rules(extra: list[str]) -> list[list[str]]:
+    """iptables argument lists for the router: forwarding.nat_rules() appended, then any extras."""
+    ap, wan = AP_LINK[0], WAN_LINK[0]
+    rules = [["-P", "FORWARD", "DROP"]]
+    for rule in nat_rules(wan, ap):
+        rules.append([("-A" if arg == "-C" else arg) for arg in rule])
+    rules.extend(shlex.split(rule) for rule in extra)
+    return rules
+
+
+def teardown() -> None:
+    """Remove the bench namespaces; their veths go with them."""
+    for namespace in NAMESPACES:
+        runner.run(["sudo", "ip", "netns", "del", namespace], capture_output=True, text=True)
+
+
+def build_topology(rules: list[list[str]]) -> None:
+    teardown()
+    for namespace in NAMESPACES:
+        try:
+            sudo("ip", "netns", "add", namespace)
+        except RuntimeError as e:
+            raise RuntimeError(f"{e} (bench forward needs root and network namespace support)") from None
+        in_ns(namespace, "ip", "link", "set", "lo", "up")
+
+    for (router_if, far_if, router_cidr, far_cidr), far_ns in ((AP_LINK, CLIENT_NS), (WAN_LINK, SERVER_NS)):
+        sudo("ip", "link", "add", router_if, "netns", ROUTER_NS, "type", "veth",
+             "peer", "name", far_if, "netns", far_ns)
+        in_ns(ROUTER_NS, "ip", "addr", "add", router_cidr, "dev", router_if)
+        in_ns(ROUTER_NS, "ip", "link", "set", router_if, "up")
+        in_ns(far_ns, "ip", "addr", "add", far_cidr, "dev", far_if)
+        in_ns(far_ns, "ip", "link", "set", far_if, "up")
+
+    # Only the client gets a route through the router; replies rely on NAT
+    in_ns(CLIENT_NS, "ip", "route", "add", "default", "via", AP_LINK[2].split("/")[0])
+    in_ns(ROUTER_NS, "sysctl", "-qw", "net.ipv4.ip_forward=1")
+    # nat_rules() includes the client block rule, which needs the ipsets
+    for args in acl.set_commands():
+        in_ns(ROUTER_NS, "ipset", *args)
+    for rule in rules:
+        in_ns(ROUTER_NS, "iptables", *rule)
+
+
+def agent(namespace: str, *args: str) -> list[str]:
+    return ["sudo", "ip", "netns", "exec", namespace, sys.executable, os.path.abspath(__file__), "agent", *args]
+
+
+def bench_forward(duration: float = DEFAULT_DURATION, pings: int = DEFAULT_PINGS,
+                  extra_rules: list[str] | None = None) -> dict:
+    """Build the namespaces, run the traffic phases and return the results."""
+    rules = router_rules(extra_rules or [])
+    started = time.time()
+    try:
+        with runner.phase("build topology"):
+            build_topology(rules)
+        sink = runner.stream_lines(agent(SERVER_NS, "sink"))
+        try:
+            if next(sink, "").strip() != "ready":
+                raise RuntimeError("The traffic sink didn't start in the server namespace")
+            with runner.phase("traffic"):
+                result = runner.run(agent(CLIENT_NS, "client", SERVER_ADDRESS, str(duration), str(pings)),
+                                    capture_output=True, text=True, timeout=3 * duration + pings + 30)
+        finally:
+            sink.close()
+        if result.returncode != 0:
+            raise RuntimeError(f"Traffic through the bench router failed: {result.stderr.strip()}")
+        phases = json.loads(result.stdout)
+    finally:
+        teardown()
+    return {
+        "started": round(started, 3),
+        "duration_s": duration,
+        "cpus": os.cpu_count(),
+        "rules": [shlex.join(rule) for rule in rules],
+        **phases,
+    }
+
+
+def busiest(cpu: list[dict]) -> str:
+    core = max(cpu, key=lambda u: u["busy"])
+    return f"busiest core cpu{core['cpu']} {core['busy']:.0f}% ({core['softirq']:.0f}% softirq)"
+
+
+def show_results(results: dict, baseline: dict | None = None) -> None:
+    tcp, udp, latency = results["tcp"], results["udp"], results["latency"]
+    metrics = [
+        ("TCP throughput", tcp["mbit_s"], "Mbit/s", ("tcp", "mbit_s"), busiest(tcp["cpu"])),
+        ("UDP rate", udp["pps"], "pps", ("udp", "pps"), f"{udp['loss']:.1%} loss, {busiest(udp['cpu'])}"),
+    ]
+    for p in ("p50", "p90", "p99"):
+        if f"{p}_us" in latency:
+            metrics.append((f"Latency {p}", latency[f"{p}_us"], "us", ("latency", f"{p}_us"), ""))
+
+    logger.info("=== NAT Forwarding Bench ===\n")
+    for label, value, unit, (section, key), detail in metrics:
+        line = f"{label + ':':<17} {value:>10,} {unit:<7}"
+        old = (baseline or {}).get(section, {}).get(key)
+        if old:
+            line += f" {(value - old) / old:+7.1%} vs baseline"
+        logger.info(f"{line}  {detail}".rstrip())
+    if latency["lost"]:
+        logger.warning(f"{latency['lost']}/{latency['count']} latency probes were lost")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AP's packet forwarding")
+    sub = parser.add_subparsers(dest="action")
+
+    forward = sub.add_parser("forward", help="Measure NAT forwarding between network namespaces")
+    forward.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                         help=f"Seconds of TCP and of UDP traffic (default: {DEFAULT_DURATION:g})")
+    forward.add_argument("--pings", type=int, default=DEFAULT_PINGS,
+                         help=f"Latency probes to send (default: {DEFAULT_PINGS})")
+    forward.add_argument("--rule", action="append", default=[], metavar="IPTABLES-ARGS",
+                         help="Extra iptables rule for the router, e.g. '-t mangle -A FORWARD ...'; repeatable")
+    forward.add_argument("--output", metavar="FILE", help="Also write the results to FILE as JSON")
+    forward.add_argument("--baseline", metavar="FILE", help="Compare with results saved by --output")
+    forward.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    agent_parser = sub.add_parser("agent", help=argparse.SUPPRESS)
+    agent_parser.add_argument("role", choices=["sink", "client"])
+    agent_parser.add_argument("options", nargs="*")
+
+    args = parser.parse_args()
+
+    if args.action == "agent":
+        if args.role == "sink":
+            run_sink()
+        else:
+            host, duration, pings = args.options
+            run_client(host, float(duration), int(pings))
+        return
+
+    if args.action != "forward":
+        parser.print_help()
+        sys.exit(1)
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    results = bench_forward(args.duration, args.pings, args.rule)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(results))
+    else:
+        show_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Port forwarding (DNAT) from WAN ports to AP clients.
+
+Mappings are grouped per WAN in a nat chain, PIB-DNAT-<wan>, reached from
+PREROUTING by one jump rule, so a packet arriving on one WAN is never
+tested against another WAN's mappings. The nat table only sees the first
+packet of each connection.
+
+The live ruleset is the only record of the mappings: changes rebuild the
+WAN's desired chain and apply the diff against the firewall snapshot.
+
+Hairpin NAT lets clients reach a forwarded service through the Pi's WAN
+address. Per WAN, a second jump sends AP traffic addressed to that WAN's
+address into the same chain, so the Pi's other addresses (the AP gateway
+included) and other WANs' mappings are left alone. One POSTROUTING rule
+masquerades DNATed connections from the AP subnet so replies come back
+through the Pi.
+"""
+import ipaddress
+import re
+
+import firewall
+from locks import locked
+from status import get_interface_ip
+
+CHAIN_PREFIX = "PIB-DNAT-"
+PROTOCOLS = ("tcp", "udp")
+
+DNAT_SPEC = re.compile(
+    r"-p (tcp|udp) -m \1 --dport (\d+(?::\d+)?) -j DNAT --to-destination ([\d.]+)(?::(\d+(?:-\d+)?))?"
+)
+
+
+def chain_name(wan: str) -> str:
+    return f"{CHAIN_PREFIX}{wan}"
+
+
+def split_target(target: str) -> tuple[str, str | None]:
+    """"192.168.31.50:80" -> ("192.168.31.50", "80"); a bare MAC keeps its colons."""
+    head, sep, tail = target.rpartition(":")
+    if sep and tail.isdigit() and (":" not in head or head.count(":") == 5):
+        return head, tail
+    return target, None
+
+
+def parse_ports(ports: str) -> tuple[int, int]:
+    """"8080" or "8000-8010" -> (first, last)."""
+    try:
+        first, _, last = ports.partition("-")
+        low, high = int(first), int(last or first)
+    except ValueError:
+        raise RuntimeError(f"Invalid port or range: {ports}") from None
+    if not 1 <= low <= high <= 65535:
+        raise RuntimeError(f"Invalid port or range: {ports}")
+    return low, high
+
+
+def dnat_spec(protocol: str, ports: tuple[int, int], address: str, to_port: int | None) -> str:
+    """One mapping as `iptables -S` prints it."""
+    low, high = ports
+    dport = str(low) if low == high else f"{low}:{high}"
+    destination = address
+    if to_port is not None:
+        last = to_port + (high - low)
+        destination += f":{to_port}" if last == to_port else f":{to_port}-{last}"
+    return f"-p {protocol} -m {protocol} --dport {dport} -j DNAT --to-destination {destination}"
+
+
+def parse_mapping(wan: str, spec: str) -> dict | None:
+    match = DNAT_SPEC.fullmatch(spec)
+    if not match:
+        return None
+    protocol, dport, address, to_ports = match.groups()
+    return {
+        "wan": wan,
+        "protocol": protocol,
+        "ports": dport.replace(":", "-"),
+        "address": address,
+        "to_ports": to_ports,
+        "spec": spec,
+    }
+
+
+def wan_chains(fw: firewall.Firewall) -> list[str]:
+    fw.rules("nat")
+    return sorted(name[len(CHAIN_PREFIX):] for name in fw.chain_names["nat"] if name.startswith(CHAIN_PREFIX))
+
+
+def list_mappings(fw: firewall.Firewall | None = None) -> list[dict]:
+    fw = fw or firewall.current()
+    mappings = []
+    for wan in wan_chains(fw):
+        mappings += filter(None, (parse_mapping(wan, spec) for spec in fw.chain("nat", chain_name(wan))))
+    return mappings
+
+
+def reservations(dnsmasq_conf: str) -> dict[str, str]:
+    """dhcp-host reservations: MAC and hostname (lowercase) -> IP."""
+    reserved = {}
+    for line in dnsmasq_conf.splitlines():
+        if not line.startswith("dhcp-host="):
+            continue
+        fields = line.split("=", 1)[1].split(",")
+        address = next((f for f in fields if re.fullmatch(r"\d+\.\d+\.\d+\.\d+", f)), None)
+        if address is None:
+            continue
+        for field in fields:
+            if field != address and not re.fullmatch(r"\d+[smhdw]?|infinite", field):
+                reserved[field.lower()] = address
+    return reserved
+
+
+def resolve_target(target: str, dnsmasq_conf: str, subnet: ipaddress.IPv4Network) -> str:
+    """A client IP, or the IP reserved for a MAC or hostname."""
+    try:
+        address = ipaddress.ip_address(target)
+    except ValueError:
+        address = reservations(dnsmasq_conf).get(target.lower())
+        if address is None:
+            raise RuntimeError(f"No DHCP reservation (dhcp-host) for '{target}'; use a client IP") from None
+        address = ipaddress.ip_address(address)
+    if address not in subnet:
+        raise RuntimeError(f"{address} is not on the AP subnet {subnet}")
+    return str(address)
+
+
+def hairpin_jump(ap_interface: str, wan: str, address: str) -> list[str]:
+    # Matches in `iptables -S` order, so the rule compares equal to the snapshot
+    return ["-t", "nat", "-C", "PREROUTING", "-d", f"{address}/32", "-i", ap_interface, "-j", chain_name(wan)]
+
+
+def ap_rules(fw: firewall.Firewall, ap_interface: str, subnet: ipaddress.IPv4Network,
+             wans: list[str] | None = None) -> list[list[str]]:
+    """Rules outside the DNAT chains that depend on the AP interface.
+
+    A WAN without an address gets no hairpin jump; it is added by the next
+    change to that WAN's mappings once the address is back.
+    """
+    wans = wan_chains(fw) if wans is None else wans
+    rules = []
+    for wan in wans:
+        address = get_interface_ip(wan)
+        if address:
+            rules.append(hairpin_jump(ap_interface, wan, address))
+        rules.append(["-C", "FORWARD", "-i", wan, "-o", ap_interface, "-m", "conntrack", "--ctstate", "DNAT",
+                      "-j", "ACCEPT"])
+    if wans:
+        rules.append(["-t", "nat", "-C", "POSTROUTING", "-s", str(subnet), "-o", ap_interface,
+                      "-m", "conntrack", "--ctstate", "DNAT", "-j", "MASQUERADE"])
+    return rules
+
+
+def wan_jump(wan: str) -> list[str]:
+    return ["-t", "nat", "-C", "PREROUTING", "-i", wan, "-j", chain_name(wan)]
+
+
+def hairpin_jumps(fw: firewall.Firewall, wan: str) -> list[list[str]]:
+    """PREROUTING jumps into the WAN's chain other than its own, e.g. for an old WAN address."""
+    rules = []
+    for spec in fw.chain("nat", "PREROUTING"):
+        rule = ["-t", "nat", "-C", "PREROUTING"] + spec.split()
+        if spec.endswith(f"-j {chain_name(wan)}") and rule != wan_jump(wan):
+            rules.append(rule)
+    return rules
+
+
+def apply_wan(fw: firewall.Firewall, wan: str, specs: list[str], ap_interface: str,
+              subnet: ipaddress.IPv4Network) -> tuple[int, int]:
+    """Set one WAN's mappings to `specs` and keep the jumps and hairpin rules in step."""
+    others = [w for w in wan_chains(fw) if w != wan]
+    if specs:
+        added, removed = fw.sync_chain("nat", chain_name(wan), specs)
+        fw.ensure(wan_jump(wan))
+        wanted = ap_rules(fw, ap_interface, subnet, others + [wan])
+        for rule in hairpin_jumps(fw, wan):
+            if rule not in wanted:
+                fw.discard(rule)
+        for rule in wanted:
+            fw.ensure(rule)
+        return added, removed
+
+    if not fw.has_chain("nat", chain_name(wan)):
+        return 0, 0
+    wanted = ap_rules(fw, ap_interface, subnet, others)
+    for rule in [wan_jump(wan)] + hairpin_jumps(fw, wan) + ap_rules(fw, ap_interface, subnet, [wan]):
+        if rule not in wanted:
+            fw.discard(rule)
+    added, removed = fw.sync_chain("nat", chain_name(wan), [])
+    fw.delete_chain("nat", chain_name(wan))
+    return added, removed
+
+
+@locked("firewall")
+def add_port(wan: str, ports: str, target: str, to_port: str | None, protocols: list[str],
+             ap_interface: str, subnet: ipaddress.IPv4Network, dnsmasq_conf: str) -> int:
+    """Forward WAN ports to a client. Returns rules added."""
+    port_range = parse_ports(ports)
+    destination = parse_ports(to_port)[0] if to_port else None
+    address = resolve_target(target, dnsmasq_conf, subnet)
+
+    fw = firewall.current()
+    current = [m for m in list_mappings(fw) if m["wan"] == wan]
+    for mapping in current:
+        low, high = parse_ports(mapping["ports"])
+        if mapping["protocol"] in protocols and low <= port_range[1] and port_range[0] <= high:
+            if mapping["spec"] not in [dnat_spec(p, port_range, address, destination) for p in protocols]:
+                raise RuntimeError(f"{mapping['protocol']} port(s) {mapping['ports']} on {wan} "
+                                   f"already forward to {mapping['address']}")
+
+    specs = [m["spec"] for m in current] + [dnat_spec(p, port_range, address, destination) for p in protocols]
+    added, _ = apply_wan(fw, wan, specs, ap_interface, subnet)
+    fw.save()
+    return added
+
+
+@locked("firewall")
+def remove_port(wan: str, ports: str, protocols: list[str], ap_interface: str,
+                subnet: ipaddress.IPv4Network) -> int:
+    """Stop forwarding WAN ports. Returns rules removed."""
+    port_range = parse_ports(ports)
+    fw = firewall.current()
+    current = [m for m in list_mappings(fw) if m["wan"] == wan]
+    keep = [m["spec"] for m in current
+            if m["protocol"] not in protocols or parse_ports(m["ports"]) != port_range]
+    if len(keep) == len(current):
+        return 0
+    _, removed = apply_wan(fw, wan, keep, ap_interface, subnet)
+    fw.save()
+    return removed
@@ -1,23 +1,24 @@
 #!/usr/bin/env python3
-import subprocess
 import sys
 
+import runner
 from config import logger, DEFAULTS
+from locks import locked
 
 
 def restart_service(service: str) -> bool:
     """Restart a service. Returns True if successful."""
     logger.info(f"  Restarting {service}...")
-    result = subprocess.run(
+    result = runner.run(
         ["sudo", "systemctl", "restart", service],
         capture_output=True, text=True
     )
     return result.returncode == 0
 
 
-def main():
-    logger.info("=== Restarting AP Services ===\n")
-
+@locked("units")
+def restart_services() -> list[str]:
+    """Restart all AP services. Returns the services that failed to restart."""
     interface = DEFAULTS.get("DEFAULT_AP_INTERFACE", "wlan1")
 
     services = [
@@ -27,10 +28,13 @@ def main():
         "dnsmasq",
     ]
 
-    failed = []
-    for service in services:
-        if not restart_service(service):
-            failed.append(service)
+    return [service for service in services if not restart_service(service)]
+
+
+def main():
+    logger.info("=== Restarting AP Services ===\n")
+
+    failed = restart_services()
 
     logger.info("")
     if failed:
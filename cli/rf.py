@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import json
+import math
+import os
+import time
+from array import array
+
+from clients import get_dhcp_leases, get_wireless_clients
+from config import logger, DEFAULTS, STATE_DIR
+
+RF_STATE_FILE = STATE_DIR / "rf.json"
+
+# (samples folded into one bucket of the next tier, buckets kept per tier).
+# At the default 5 s interval: 30 min of raw samples, 6 h of 1-min
+# buckets and 4 days of 15-min buckets.
+TIERS = [(12, 360), (15, 360), (None, 384)]
+
+METRICS = ["signal", "tx_bitrate", "rx_bitrate", "retry_pct", "inactive_ms"]
+
+# Stations below this average TX rate hold the channel far longer per byte
+LOW_BITRATE_MBPS = 24.0
+# Forget stations that haven't been seen for this long
+STATION_EXPIRY = 24 * 3600
+MAX_STATIONS = 256
+
+
+class Ring:
+    """Fixed-capacity float ring buffer backed by an array."""
+
+    def __init__(self, capacity: int):
+        self.data = array("d", [math.nan]) * capacity
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+    def push(self, value: float) -> None:
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def values(self) -> list[float]:
+        """Values oldest first, skipping missing samples."""
+        start = (self.head - self.count) % self.capacity
+        ordered = [self.data[(start + i) % self.capacity] for i in range(self.count)]
+        return [v for v in ordered if not math.isnan(v)]
+
+
+class Tier:
+    """One resolution level: min/avg/max rings plus the bucket being filled."""
+
+    def __init__(self, fold: int | None, capacity: int):
+        self.fold = fold
+        self.low = Ring(capacity)
+        self.avg = Ring(capacity)
+        self.high = Ring(capacity)
+        self.pending: list[tuple[float, float, float]] = []
+
+    def push(self, low: float, avg: float, high: float) -> tuple[float, float, float] | None:
+        """Store a bucket; returns a folded bucket for the next tier when one completes."""
+        self.low.push(low)
+        self.avg.push(avg)
+        self.high.push(high)
+        if self.fold is None:
+            return None
+        self.pending.append((low, avg, high))
+        if len(self.pending) < self.fold:
+            return None
+        present = [p for p in self.pending if not math.isnan(p[1])]
+        self.pending = []
+        if not present:
+            return math.nan, math.nan, math.nan
+        return (
+            min(p[0] for p in present),
+            sum(p[1] for p in present) / len(present),
+            max(p[2] for p in present),
+        )
+
+
+class Series:
+    """Downsampling time series for one metric of one station."""
+
+    def __init__(self):
+        self.tiers = [Tier(fold, capacity) for fold, capacity in TIERS]
+
+    def push(self, value: float | None) -> None:
+        value = math.nan if value is None else float(value)
+        bucket = (value, value, value)
+        for tier in self.tiers:
+            bucket = tier.push(*bucket)
+            if bucket is None:
+                break
+
+    def summary(self, tier: int = 0) -> dict | None:
+        """min/avg/max and trend over one tier; trend compares its last and first thirds."""
+        level = self.tiers[tier]
+        avgs = level.avg.values()
+        if not avgs:
+            return None
+        third = max(len(avgs) // 3, 1)
+        trend = sum(avgs[-third:]) / third - sum(avgs[:third]) / third
+        return {
+            "min": min(level.low.values()),
+            "avg": sum(avgs) / len(avgs),
+            "max": max(level.high.values()),
+            "trend": trend,
+            "samples": len(avgs),
+        }
+
+
+class Station:
+    def __init__(self):
+        self.series = {metric: Series() for metric in METRICS}
+        self.last_seen = 0.0
+        self.last_counters: tuple[int, int] | None = None
+
+    def record(self, client: dict, now: float) -> None:
+        retry_pct = None
+        counters = (client.get("tx_packets"), client.get("tx_retries"))
+        if None not in counters:
+            if self.last_counters is not None:
+                packets = counters[0] - self.last_counters[0]
+                retries = counters[1] - self.last_counters[1]
+                if packets > 0 and retries >= 0:
+                    retry_pct = 100.0 * retries / (packets + retries)
+            self.last_counters = counters
+
+        self.series["signal"].push(client.get("signal_dbm"))
+        self.series["tx_bitrate"].push(client.get("tx_bitrate"))
+        self.series["rx_bitrate"].push(client.get("rx_bitrate"))
+        self.series["retry_pct"].push(retry_pct)
+        self.series["inactive_ms"].push(client.get("inactive_ms"))
+        self.last_seen = now
+
+
+class Sampler:
+    """Samples `iw station dump` into per-station downsampling series."""
+
+    def __init__(self, interface: str):
+        self.interface = interface
+        self.stations: dict[str, Station] = {}
+
+    def sample(self, now: float | None = None) -> None:
+        now = now or time.time()
+        for client in get_wireless_clients(self.interface):
+            mac = client["mac"].lower()
+            station = self.stations.get(mac)
+            if station is None:
+                if len(self.stations) >= MAX_STATIONS:
+                    self.expire(now, force=True)
+                station = self.stations[mac] = Station()
+            station.record(client, now)
+        self.expire(now)
+
+    def expire(self, now: float, force: bool = False) -> None:
+        for mac in [m for m, s in self.stations.items() if now - s.last_seen > STATION_EXPIRY]:
+            del self.stations[mac]
+        if force and len(self.stations) >= MAX_STATIONS:
+            oldest = min(self.stations, key=lambda m: self.stations[m].last_seen)
+            del self.stations[oldest]
+
+    def summary(self) -> dict:
+        return {
+            "interface": self.interface,
+            "updated": time.time(),
+            "stations": {
+                mac: {
+                    "last_seen": station.last_seen,
+                    "tiers": [
+                        {metric: series.summary(tier) for metric, series in station.series.items()}
+                        for tier in range(len(TIERS))
+                    ],
+                }
+                for mac, station in self.stations.items()
+            },
+        }
+
+
+def save_summary(summary: dict) -> None:
+    RF_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = RF_STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(summary))
+    os.replace(tmp, RF_STATE_FILE)
+
+
+def load_summary(max_age: float) -> dict | None:
+    """Return the sampler's last summary if it is recent enough."""
+    try:
+        summary = json.loads(RF_STATE_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if time.time() - summary.get("updated", 0) > max_age:
+        return None
+    return summary
+
+
+def ap_interface() -> str:
+    """The interface hostapd serves, which `interface switch` can change."""
+    from interface import parse_hostapd_interface
+    return parse_hostapd_interface() or DEFAULTS["DEFAULT_AP_INTERFACE"]
+
+
+def run_sampler(interval: float):
+    """Sample forever, publishing a summary after each sample."""
+    interface = ap_interface()
+    sampler = Sampler(interface)
+    logger.info(f"Sampling {interface} stations every {interval:g}s (Ctrl-C to stop)...")
+    try:
+        while True:
+            started = time.monotonic()
+            sampler.sample()
+            save_summary(sampler.summary())
+            time.sleep(max(interval - (time.monotonic() - started), 0))
+    except KeyboardInterrupt:
+        pass
+
+
+def quick_summary(samples: int, interval: float) -> dict:
+    """Take a short burst of samples in-process when no sampler is running."""
+    sampler = Sampler(ap_interface())
+    for i in range(samples):
+        if i:
+            time.sleep(interval)
+        sampler.sample()
+    return sampler.summary()
+
+
+def format_range(stats: dict | None, fmt: str) -> str:
+    if not stats:
+        return "-"
+    return f"{stats['min']:{fmt}}/{stats['avg']:{fmt}}/{stats['max']:{fmt}}"
+
+
+def format_trend(stats: dict | None) -> str:
+    if not stats or stats["samples"] < 3:
+        return "-"
+    return f"{stats['trend']:+.1f}"
+
+
+def show_rf(tier: int = 0, samples: int = 3, interval: float = 1.0):
+    """Show per-station RF quality: min/avg/max, trends and slow stations."""
+    logger.info("=== Client RF Quality ===\n")
+
+    summary = load_summary(max_age=300)
+    if summary is None:
+        logger.info(f"No running sampler; taking {samples} samples {interval:g}s apart.")
+        logger.info("Run `pi-bridge clients rf-sample` for long-term history.\n")
+        summary = quick_summary(samples, interval)
+
+    stations = summary["stations"]
+    if not stations:
+        logger.info("No clients connected.")
+        return
+
+    leases = get_dhcp_leases()
+
+    logger.info(f"{'MAC Address':<20} {'Signal dBm':<16} {'Trend':<7} {'TX Mbit/s':<18} "
+                f"{'RX avg':<8} {'Retry%':<7} {'Flag':<6} {'Hostname'}")
+    logger.info("-" * 100)
+    slow = 0
+    for mac, station in sorted(stations.items()):
+        metrics = station["tiers"][tier]
+        tx = metrics["tx_bitrate"]
+        rx = metrics["rx_bitrate"]
+        retry = metrics["retry_pct"]
+        flag = "SLOW" if tx and tx["avg"] < LOW_BITRATE_MBPS else ""
+        slow += bool(flag)
+        rx_avg = f"{rx['avg']:.0f}" if rx else "-"
+        retry_avg = f"{retry['avg']:.1f}" if retry else "-"
+        hostname = leases.get(mac, {}).get("hostname") or "-"
+        logger.info(
+            f"{mac:<20} {format_range(metrics['signal'], '.0f'):<16} {format_trend(metrics['signal']):<7} "
+            f"{format_range(tx, '.0f'):<18} {rx_avg:<8} {retry_avg:<7} {flag:<6} {hostname}"
+        )
+
+    logger.info(f"\nTotal: {len(stations)} station(s)")
+    if slow:
+        logger.info(
+            f"{slow} station(s) average below {LOW_BITRATE_MBPS:g} Mbit/s and use a "
+            "disproportionate share of airtime."
+        )
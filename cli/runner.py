@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Runs every external command the CLI needs, and records it.
+
+All modules go through run() or stream_lines() instead of calling
+subprocess directly, so one place knows how many processes a command
+forked, how long each took and whether it needed sudo.
+
+Recording is off unless enabled:
+  - `pi-bridge --profile` prints a summary table when the command ends,
+    and `--profile-trace FILE` also writes a Chrome trace (chrome://tracing,
+    Perfetto) covering the command's phases and external calls.
+  - PI_BRIDGE_CALL_LOG=<file> appends one JSON line per call, so tests can
+    count forks across processes.
+"""
+import os
+import subprocess
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+CALL_LOG = os.environ.get("PI_BRIDGE_CALL_LOG")
+
+
+class Call:
+    __slots__ = ("argv", "start", "duration", "returncode")
+
+    def __init__(self, argv: list[str], start: float, duration: float, returncode: int | None):
+        self.argv = argv
+        self.start = start
+        self.duration = duration
+        self.returncode = returncode
+
+    @property
+    def sudo(self) -> bool:
+        return self.argv[0] == "sudo"
+
+    @property
+    def program(self) -> str:
+        argv = self.argv[1:] if self.sudo and len(self.argv) > 1 else self.argv
+        return os.path.basename(argv[0])
+
+
+class Profile:
+    """Calls and named phases recorded while a command runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls: list[Call] = []
+        self.phases: list[tuple[str, float, float]] = []
+
+
+_profile: Profile | None = None
+
+
+def enable() -> Profile:
+    """Start recording calls and phases in this process."""
+    global _profile
+    if _profile is None:
+        _profile = Profile()
+    return _profile
+
+
+def profile() -> Profile | None:
+    return _profile
+
+
+def record(argv: list[str], started: float, returncode: int | None) -> None:
+    duration = time.perf_counter() - started
+    if _profile is not None:
+        _profile.calls.append(Call(list(argv), started, duration, returncode))
+    if CALL_LOG:
+        import json
+        line = json.dumps({
+            "pid": os.getpid(),
+            "argv": list(argv),
+            "duration_ms": round(duration * 1000, 3),
+            "returncode": returncode,
+            "sudo": argv[0] == "sudo",
+        })
+        with open(CALL_LOG, "a") as f:
+            f.write(line + "\n")
+
+
+def run(cmd: list[str], **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run() that records the call. Takes the same keyword arguments."""
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(cmd, **kwargs)
+    except OSError:
+        record(cmd, started, None)
+        raise
+    record(cmd, started, result.returncode)
+    return result
+
+
+def stream_lines(cmd: list[str]) -> Iterator[str]:
+    """Yield a command's stdout line by line; the process is reaped when the caller stops."""
+    started = time.perf_counter()
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        record(cmd, started, None)
+        raise
+    try:
+        yield from process.stdout
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+        record(cmd, started, process.returncode)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Mark a named span of work in the trace (no-op unless profiling)."""
+    if _profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile.phases.append((name, started, time.perf_counter() - started))
+
+
+def summary(prof: Profile) -> list[str]:
+    """Summary table lines: calls grouped by program, slowest first."""
+    total = time.perf_counter() - prof.started
+    in_calls = sum(c.duration for c in prof.calls)
+    sudo = sum(1 for c in prof.calls if c.sudo)
+
+    groups: dict[str, list[Call]] = {}
+    for call in prof.calls:
+        groups.setdefault(call.program, []).append(call)
+
+    lines = [
+        f"Profile: {total * 1000:.1f} ms total, {len(prof.calls)} external call(s) "
+        f"({sudo} via sudo) taking {in_calls * 1000:.1f} ms",
+    ]
+    for name, _, duration in prof.phases:
+        lines.append(f"  phase {name:<28} {duration * 1000:>8.1f} ms")
+    if groups:
+        lines.append(f"  {'PROGRAM':<20} {'CALLS':>5} {'TOTAL ms':>9} {'MAX ms':>8} {'FAILED':>6}")
+        ordered = sorted(groups.items(), key=lambda kv: -sum(c.duration for c in kv[1]))
+        for program, calls in ordered:
+            failed = sum(1 for c in calls if c.returncode != 0)
+            lines.append(
+                f"  {program:<20} {len(calls):>5} {sum(c.duration for c in calls) * 1000:>9.1f} "
+                f"{max(c.duration for c in calls) * 1000:>8.1f} {failed:>6}"
+            )
+    return lines
+
+
+def write_trace(prof: Profile, path: str) -> None:
+    """Write phases and calls as Chrome trace events (microseconds since start)."""
+    import json
+
+    def us(t: float) -> float:
+        return round((t - prof.started) * 1_000_000, 1)
+
+    pid = os.getpid()
+    events = [
+        {"name": name, "cat": "phase", "ph": "X", "pid": pid, "tid": 0,
+         "ts": us(started), "dur": round(duration * 1_000_000, 1)}
+        for name, started, duration in prof.phases
+    ]
+    events += [
+        {"name": " ".join(call.argv), "cat": "sudo" if call.sudo else "exec", "ph": "X",
+         "pid": pid, "tid": 1, "ts": us(call.start), "dur": round(call.duration * 1_000_000, 1),
+         "args": {"argv": call.argv, "returncode": call.returncode, "sudo": call.sudo}}
+        for call in prof.calls
+    ]
+    events += [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "pi-bridge"}},
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": 1, "args": {"name": "external calls"}},
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
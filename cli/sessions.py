@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+from clients import get_dhcp_leases
+from config import logger, STATE_DIR
+from logs import iter_entries
+
+SESSIONS_DB = STATE_DIR / "sessions.db"
+RETENTION_DAYS = 30
+MAX_SESSIONS = 50_000
+# hostapd logs several connect lines for one association (associated,
+# AP-STA-CONNECTED); a connect this soon after the open session started is
+# the same connection, a later one means its disconnect was never logged.
+SAME_CONNECTION_SECONDS = 30
+NO_DISCONNECT_REASON = "unknown/no disconnect logged"
+
+MAC = r"([0-9a-f]{2}(?::[0-9a-f]{2}){5})"
+CONNECT_RE = re.compile(rf"(?:AP-STA-CONNECTED {MAC}|STA {MAC} IEEE 802\.11: associated)", re.I)
+AUTH_RE = re.compile(rf"STA {MAC} (?:WPA: pairwise key handshake completed|IEEE 802\.11: authenticated)", re.I)
+AUTH_FAIL_RE = re.compile(rf"(?:STA {MAC} WPA: 4-Way Handshake failed|AP-STA-POSSIBLE-PSK-MISMATCH {MAC})", re.I)
+DISCONNECT_RE = re.compile(
+    rf"(?:STA {MAC} IEEE 802\.11: (disassociated|deauthenticated(?: due to [^(]+)?)|AP-STA-DISCONNECTED {MAC})",
+    re.I,
+)
+DHCPACK_RE = re.compile(rf"DHCPACK\(\S+\) (\S+) {MAC}(?: (\S+))?", re.I)
+# hostapd (re)started or reloaded its config: every station was dropped
+AP_RESET_RE = re.compile(r"\bAP-(?:ENABLED|DISABLED)\b|reloading configuration")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    mac TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL,
+    authenticated REAL,
+    ip TEXT,
+    hostname TEXT,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_mac_start ON sessions (mac, start);
+CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def open_store() -> sqlite3.Connection:
+    """Open (creating if needed) the on-disk session store."""
+    SESSIONS_DB.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(SESSIONS_DB)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    return db
+
+
+def parse_event(message: str) -> tuple[str, str, dict] | None:
+    """Classify a hostapd/dnsmasq journal message.
+
+    Returns (kind, mac, details) where kind is one of connect, auth,
+    auth_failed, disconnect, dhcpack or ap_reset (with an empty mac), or
+    None if the message isn't a client event.
+    """
+    if AP_RESET_RE.search(message):
+        return "ap_reset", "", {}
+    match = CONNECT_RE.search(message)
+    if match:
+        return "connect", (match.group(1) or match.group(2)).lower(), {}
+    match = AUTH_RE.search(message)
+    if match:
+        return "auth", match.group(1).lower(), {}
+    match = AUTH_FAIL_RE.search(message)
+    if match:
+        return "auth_failed", (match.group(1) or match.group(2)).lower(), {}
+    match = DISCONNECT_RE.search(message)
+    if match:
+        mac = (match.group(1) or match.group(3)).lower()
+        reason = match.group(2).strip() if match.group(2) else "disconnected"
+        return "disconnect", mac, {"reason": reason}
+    match = DHCPACK_RE.search(message)
+    if match:
+        return "dhcpack", match.group(2).lower(), {"ip": match.group(1), "hostname": match.group(3) or ""}
+    return None
+
+
+def open_session(db: sqlite3.Connection, mac: str) -> sqlite3.Row | None:
+    return db.execute(
+        "SELECT * FROM sessions WHERE mac = ? AND end IS NULL ORDER BY start DESC LIMIT 1",
+        (mac,),
+    ).fetchone()
+
+
+def apply_event(db: sqlite3.Connection, when: float, kind: str, mac: str, details: dict) -> None:
+    """Fold one client event into the session table."""
+    if kind == "ap_reset":
+        db.execute("UPDATE sessions SET end = ?, reason = ? WHERE end IS NULL", (when, "hostapd restarted"))
+        return
+
+    current = open_session(db, mac)
+
+    if kind == "connect":
+        if current is not None and when - current["start"] > SAME_CONNECTION_SECONDS:
+            db.execute("UPDATE sessions SET end = ?, reason = ? WHERE id = ?",
+                       (when, NO_DISCONNECT_REASON, current["id"]))
+            current = None
+        if current is None:
+            db.execute("INSERT INTO sessions (mac, start) VALUES (?, ?)", (mac, when))
+    elif kind == "auth":
+        if current is None:
+            db.execute("INSERT INTO sessions (mac, start, authenticated) VALUES (?, ?, ?)", (mac, when, when))
+        elif current["authenticated"] is None:
+            db.execute("UPDATE sessions SET authenticated = ? WHERE id = ?", (when, current["id"]))
+    elif kind == "auth_failed":
+        if current is not None:
+            db.execute("UPDATE sessions SET end = ?, reason = ? WHERE id = ?",
+                       (when, "authentication failed", current["id"]))
+    elif kind == "disconnect":
+        # hostapd logs the 802.11 reason first, then AP-STA-DISCONNECTED;
+        # the first one closes the session and keeps the more specific reason.
+        if current is not None:
+            db.execute("UPDATE sessions SET end = ?, reason = ? WHERE id = ?",
+                       (when, details["reason"], current["id"]))
+    elif kind == "dhcpack":
+        target = current or db.execute(
+            "SELECT * FROM sessions WHERE mac = ? ORDER BY start DESC LIMIT 1", (mac,)
+        ).fetchone()
+        if target is not None:
+            db.execute("UPDATE sessions SET ip = ?, hostname = COALESCE(NULLIF(?, '*'), hostname) WHERE id = ?",
+                       (details["ip"], details["hostname"] or None, target["id"]))
+
+
+def prune(db: sqlite3.Connection, now: float, retention_days: int = RETENTION_DAYS,
+          max_sessions: int = MAX_SESSIONS) -> None:
+    """Enforce the age and size limits on the store.
+
+    Sessions still open after the retention window lost their disconnect
+    and are dropped along with the closed ones.
+    """
+    db.execute("DELETE FROM sessions WHERE start < ?",
+               (now - retention_days * 86400,))
+    db.execute(
+        "DELETE FROM sessions WHERE id IN ("
+        "SELECT id FROM sessions ORDER BY start DESC LIMIT -1 OFFSET ?)",
+        (max_sessions,),
+    )
+
+
+def ingest(db: sqlite3.Connection) -> int:
+    """Fold journal entries logged since the last ingest into the store."""
+    row = db.execute("SELECT value FROM meta WHERE key = 'cursor'").fetchone()
+    cursor = row["value"] if row else None
+
+    count = 0
+    last_cursor = cursor
+    entries = iter_entries(["hostapd", "dnsmasq"], cursor=cursor,
+                           since=None if cursor else f"-{RETENTION_DAYS}d")
+    with db:
+        for entry in entries:
+            last_cursor = entry["cursor"] or last_cursor
+            event = parse_event(entry["message"])
+            if event is None:
+                continue
+            kind, mac, details = event
+            apply_event(db, entry["time"], kind, mac, details)
+            count += 1
+        if last_cursor:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', ?)", (last_cursor,))
+        prune(db, time.time())
+    return count
+
+
+def query_sessions(db: sqlite3.Connection, mac: str | None, start: float, end: float) -> list[dict]:
+    """Sessions overlapping [start, end], served from the (mac, start) index."""
+    sql = "SELECT * FROM sessions WHERE start <= ? AND (end IS NULL OR end >= ?)"
+    params: list = [end, start]
+    if mac:
+        sql += " AND mac = ?"
+        params.append(mac.lower())
+    sql += " ORDER BY start"
+    return [dict(row) for row in db.execute(sql, params)]
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+def show_history(mac: str | None = None, hours: float = 24):
+    """Show per-client connect/disconnect sessions."""
+    logger.info("=== Client Sessions ===\n")
+
+    db = open_store()
+    try:
+        ingest(db)
+        now = time.time()
+        sessions = query_sessions(db, mac, now - hours * 3600, now)
+    finally:
+        db.close()
+
+    if not sessions:
+        logger.info("No client sessions recorded.")
+        return
+
+    leases = get_dhcp_leases()
+
+    logger.info(f"{'MAC Address':<20} {'IP Address':<16} {'Connected':<20} {'Duration':<10} {'Reason':<24} {'Hostname'}")
+    logger.info("-" * 100)
+    for session in sessions:
+        # The current lease only describes a session that is still open
+        lease = leases.get(session["mac"], {}) if session["end"] is None else {}
+        ip = session["ip"] or lease.get("ip") or "-"
+        hostname = session["hostname"] or lease.get("hostname") or "-"
+        end = session["end"] if session["end"] is not None else now
+        reason = session["reason"] or ("connected" if session["end"] is None else "-")
+        started = datetime.fromtimestamp(session["start"]).strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(
+            f"{session['mac']:<20} {ip:<16} {started:<20} "
+            f"{format_duration(end - session['start']):<10} {reason:<24} {hostname}"
+        )
+
+    logger.info(f"\nTotal: {len(sessions)} session(s)")
@@ -3,16 +3,18 @@ import argparse
 import getpass
 import os
 import re
-import subprocess
 import sys
 
+import locks
+import runner
+import tuning
 from config import DEFAULTS, SETUP_DIR, logger
 
 
 def run_script(script_name: str, env: dict | None = None, stdin: str | None = None):
     """Run a setup script with optional env vars and stdin."""
     script_path = SETUP_DIR / script_name
-    result = subprocess.run(
+    result = runner.run(
         ["bash", str(script_path)],
         env=env,
         input=stdin,
@@ -45,7 +47,7 @@ def list_wireless_interfaces() -> list[str]:
     interfaces: list[str] = []
 
     try:
-        result = subprocess.run(
+        result = runner.run(
             ["iw", "dev"],
             capture_output=True,
             text=True,
@@ -62,7 +64,7 @@ def list_wireless_interfaces() -> list[str]:
         return sorted(set(interfaces))
 
     try:
-        result = subprocess.run(
+        result = runner.run(
             ["ip", "-o", "link", "show"],
             capture_output=True,
             text=True,
@@ -83,7 +85,7 @@ def list_wireless_interfaces() -> list[str]:
 def interface_exists(interface: str) -> bool:
     """Check whether a network interface exists."""
     try:
-        result = subprocess.run(
+        result = runner.run(
             ["ip", "link", "show", interface],
             capture_output=True,
             text=True,
@@ -105,20 +107,29 @@ def choose_default_ap_interface(config_default: str) -> str:
     return detected[0]
 
 
-def configure_hostapd(interface: str, ssid: str, country: str, passphrase: str):
+def configure_hostapd(interface: str, ssid: str, country: str, passphrase: str, profile: str):
     """Run 02-configure-hostapd.sh"""
     env = os.environ.copy()
     env["AP_INTERFACE"] = interface
     env["AP_SSID"] = ssid
     env["AP_COUNTRY"] = country
+    airtime = tuning.airtime_supported()
+    if not airtime:
+        logger.info("hostapd was built without CONFIG_AIRTIME_POLICY; airtime fairness stays off.")
+    env["HOSTAPD_TUNING"] = tuning.render_block(profile, airtime).rstrip("\n")
     run_script("02-configure-hostapd.sh", env=env, stdin=passphrase + "\n")
 
 
-def configure_dnsmasq(interface: str, gateway: str):
+def configure_dnsmasq(interface: str, gateway: str, dns_servers: str,
+                      dns_cache: bool, cache_size: str, neg_cache: bool):
     """Run 03-configure-dnsmasq.sh"""
     env = os.environ.copy()
     env["AP_INTERFACE"] = interface
     env["AP_GATEWAY"] = gateway
+    env["DNS_SERVERS"] = dns_servers
+    env["DNS_CACHE"] = "yes" if dns_cache else "no"
+    env["DNS_CACHE_SIZE"] = cache_size
+    env["DNS_NEG_CACHE"] = "yes" if neg_cache else "no"
     run_script("03-configure-dnsmasq.sh", env=env)
 
 
@@ -172,6 +183,16 @@ def main():
         action="store_true",
         help="Use all defaults, read passphrase from stdin",
     )
+    parser.add_argument(
+        "--dns-cache",
+        action="store_true",
+        help="Serve client DNS from a local dnsmasq cache on the Pi",
+    )
+    parser.add_argument(
+        "--tuning",
+        choices=tuning.PROFILES,
+        help=f"hostapd tuning profile (default: {tuning.DEFAULT_PROFILE})",
+    )
     args = parser.parse_args()
 
     logger.info("=== Pi Bridge Setup ===")
@@ -183,6 +204,11 @@ def main():
         gateway = DEFAULTS["DEFAULT_AP_GATEWAY"]
         wan_interface = DEFAULTS["DEFAULT_WAN_INTERFACE"]
         enable_mdns = False
+        dns_servers = DEFAULTS["DEFAULT_DNS_SERVERS"]
+        dns_cache = args.dns_cache or DEFAULTS["DEFAULT_DNS_CACHE"] == "yes"
+        cache_size = DEFAULTS["DEFAULT_DNS_CACHE_SIZE"]
+        neg_cache = DEFAULTS["DEFAULT_DNS_NEG_CACHE"] == "yes"
+        profile = args.tuning or tuning.DEFAULT_PROFILE
         passphrase = read_passphrase_from_stdin()
     else:
         logger.info("(Press Enter to accept defaults shown in brackets)\n")
@@ -202,6 +228,18 @@ def main():
         gateway = prompt("AP gateway IP", default=DEFAULTS["DEFAULT_AP_GATEWAY"])
         wan_interface = prompt("WAN interface (internet uplink)", default=DEFAULTS["DEFAULT_WAN_INTERFACE"])
         enable_mdns = prompt_yes_no("Enable mDNS reflection (device discovery across networks)?", default=False)
+        dns_servers = prompt("Upstream DNS servers (comma-separated)", default=DEFAULTS["DEFAULT_DNS_SERVERS"])
+        dns_cache = prompt_yes_no(
+            "Serve client DNS from a local cache on the Pi?",
+            default=args.dns_cache or DEFAULTS["DEFAULT_DNS_CACHE"] == "yes",
+        )
+        cache_size = DEFAULTS["DEFAULT_DNS_CACHE_SIZE"]
+        neg_cache = DEFAULTS["DEFAULT_DNS_NEG_CACHE"] == "yes"
+        if dns_cache:
+            cache_size = prompt("DNS cache size (entries)", default=cache_size)
+            neg_cache = prompt_yes_no("Cache negative (NXDOMAIN) replies?", default=neg_cache)
+        profile = prompt(f"hostapd tuning profile ({'/'.join(tuning.PROFILES)})",
+                         default=args.tuning or tuning.DEFAULT_PROFILE)
 
     logger.info(f"\nAP interface: {interface}")
     logger.info(f"WAN interface: {wan_interface}")
@@ -209,8 +247,19 @@ def main():
     logger.info(f"Country:      {country}")
     logger.info(f"Gateway:      {gateway}")
     logger.info(f"mDNS:         {'enabled' if enable_mdns else 'disabled'}")
+    dns_mode = f"local cache, {cache_size} entries" if dns_cache else "direct"
+    logger.info(f"DNS:          {dns_servers} ({dns_mode})")
+    logger.info(f"Tuning:       {profile}")
     logger.info("")
 
+    if profile not in tuning.PROFILES:
+        logger.error(f"Unknown tuning profile '{profile}': choose from {', '.join(tuning.PROFILES)}")
+        sys.exit(1)
+
+    if dns_cache and not cache_size.isdigit():
+        logger.error(f"Invalid DNS cache size '{cache_size}': expected a number of entries")
+        sys.exit(1)
+
     if not interface_exists(interface):
         available = list_wireless_interfaces()
         if available:
@@ -229,14 +278,15 @@ def main():
         return
 
     logger.info("")
-    configure_hostapd(interface, ssid, country, passphrase)
-    configure_dnsmasq(interface, gateway)
-    configure_network_manager(interface)
-    setup_nat(interface, wan_interface)
-    setup_service(interface, gateway)
-    enable_services(interface)
-    if enable_mdns:
-        configure_mdns()
+    with locks.hold(*locks.RESOURCES):
+        configure_hostapd(interface, ssid, country, passphrase, profile)
+        configure_dnsmasq(interface, gateway, dns_servers, dns_cache, cache_size, neg_cache)
+        configure_network_manager(interface)
+        setup_nat(interface, wan_interface)
+        setup_service(interface, gateway)
+        enable_services(interface)
+        if enable_mdns:
+            configure_mdns()
 
     logger.info("\n=== Setup complete ===")
 
@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
 import re
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
+import output
+import runner
 from config import logger
+from flows import PRESSURE_WARNING, table_usage
 
 HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
 
 
 def get_service_status(service: str) -> tuple[bool, str]:
     """Check if a service is active. Returns (is_active, status_text)."""
-    result = subprocess.run(
+    result = runner.run(
         ["systemctl", "is-active", service],
         capture_output=True, text=True
     )
@@ -18,25 +22,34 @@ def get_service_status(service: str) -> tuple[bool, str]:
     return is_active, result.stdout.strip()
 
 
-def get_config_value(key: str) -> str | None:
-    """Read a value from hostapd.conf."""
+def read_hostapd_config() -> str | None:
+    """Read hostapd.conf once so several values can be looked up from it."""
     try:
-        result = subprocess.run(
+        result = runner.run(
             ["sudo", "cat", str(HOSTAPD_CONF)],
             capture_output=True, text=True
         )
         if result.returncode == 0:
-            match = re.search(rf'^{key}=(.+)$', result.stdout, re.MULTILINE)
-            if match:
-                return match.group(1)
+            return result.stdout
     except Exception:
         pass
     return None
 
 
+def get_config_value(key: str, content: str | None = None) -> str | None:
+    """Read a value from hostapd.conf (or from already-read content)."""
+    if content is None:
+        content = read_hostapd_config()
+    if content:
+        match = re.search(rf'^{key}=(.+)$', content, re.MULTILINE)
+        if match:
+            return match.group(1)
+    return None
+
+
 def get_interface_ip(interface: str) -> str | None:
     """Get IP address of an interface."""
-    result = subprocess.run(
+    result = runner.run(
         ["ip", "-4", "addr", "show", interface],
         capture_output=True, text=True
     )
@@ -49,7 +62,7 @@ def get_interface_ip(interface: str) -> str | None:
 
 def get_connected_clients(interface: str) -> int:
     """Get count of connected clients."""
-    result = subprocess.run(
+    result = runner.run(
         ["iw", "dev", interface, "station", "dump"],
         capture_output=True, text=True
     )
@@ -59,62 +72,136 @@ def get_connected_clients(interface: str) -> int:
     return 0
 
 
-def main():
-    logger.info("=== Pi Bridge Status ===\n")
-
-    # Services
-    logger.info("Services:")
-    services = ["hostapd", "dnsmasq", "NetworkManager"]
-    for service in services:
-        active, status = get_service_status(service)
-        icon = "●" if active else "○"
-        logger.info(f"  {icon} {service}: {status}")
-
-    # Check for interface-specific static IP service
-    interface = get_config_value("interface") or "wlan1"
-    static_service = f"{interface}-static-ip"
-    active, status = get_service_status(static_service)
-    icon = "●" if active else "○"
-    logger.info(f"  {icon} {static_service}: {status}")
-
-    logger.info("")
-
-    # AP Config
-    logger.info("AP Configuration:")
-    ssid = get_config_value("ssid")
-    country = get_config_value("country_code")
-    logger.info(f"  SSID:     {ssid or 'unknown'}")
-    logger.info(f"  Country:  {country or 'unknown'}")
-
-    ip = get_interface_ip(interface)
-    logger.info(f"  Interface: {interface}")
-    logger.info(f"  IP:        {ip or 'not assigned'}")
-
-    logger.info("")
-
-    # NAT Forwarding
-    logger.info("NAT Forwarding:")
-    result = subprocess.run(
-        ["sudo", "iptables", "-t", "nat", "-S", "POSTROUTING"],
+def read_nat_rules() -> str | None:
+    """`iptables -t nat -S` output, or None if it can't be read."""
+    result = runner.run(
+        ["sudo", "iptables", "-t", "nat", "-S"],
         capture_output=True, text=True
     )
-    if result.returncode == 0:
-        wan_match = re.search(r'-o (\S+) -j MASQUERADE', result.stdout)
-        if wan_match:
-            wan_iface = wan_match.group(1)
-            wan_ip = get_interface_ip(wan_iface)
-            logger.info(f"  WAN interface: {wan_iface}")
-            logger.info(f"  WAN IP:        {wan_ip or 'not assigned'}")
+    return result.stdout if result.returncode == 0 else None
+
+
+def get_wan_interface(nat_rules: str | None) -> tuple[bool, str | None]:
+    """Return (iptables readable, WAN interface with a MASQUERADE rule)."""
+    if nat_rules is None:
+        return False, None
+    wan_match = re.search(r'^-A POSTROUTING -o (\S+) -j MASQUERADE$', nat_rules, re.MULTILINE)
+    return True, wan_match.group(1) if wan_match else None
+
+
+def count_port_forwards(nat_rules: str | None) -> int:
+    """DNAT mappings in the per-WAN port forwarding chains."""
+    if nat_rules is None:
+        return 0
+    return len(re.findall(r'^-A PIB-DNAT-\S+ .* -j DNAT ', nat_rules, re.MULTILINE))
+
+
+def iter_status() -> Iterator[dict]:
+    """AP status as flat records, each yielded as soon as its data has been read."""
+    content = read_hostapd_config()
+    interface = get_config_value("interface", content) or "wlan1"
+
+    for service in ["hostapd", "dnsmasq", "NetworkManager", f"{interface}-static-ip"]:
+        _, state = get_service_status(service)
+        yield {"section": "service", "name": service, "state": state}
+
+    yield {
+        "section": "ap",
+        "ssid": get_config_value("ssid", content),
+        "country": get_config_value("country_code", content),
+        "interface": interface,
+        "ip": get_interface_ip(interface),
+    }
+
+    nat_rules = read_nat_rules()
+    readable, wan_iface = get_wan_interface(nat_rules)
+    yield {
+        "section": "nat",
+        "readable": readable,
+        "wan_interface": wan_iface,
+        "wan_ip": get_interface_ip(wan_iface) if wan_iface else None,
+        "port_forwards": count_port_forwards(nat_rules),
+    }
+
+    usage = table_usage()
+    if usage:
+        yield {"section": "conntrack", "count": usage[0], "max": usage[1]}
+
+    yield {"section": "clients", "count": get_connected_clients(interface)}
+
+
+def collect_status() -> dict:
+    """Gather AP status as plain data."""
+    status = {"services": {}, "conntrack": None}
+    for record in iter_status():
+        record = dict(record)
+        section = record.pop("section")
+        if section == "service":
+            status["services"][record["name"]] = record["state"]
+        elif section == "clients":
+            status["clients"] = record["count"]
         else:
-            logger.info("  No MASQUERADE rule found")
-    else:
-        logger.info("  Could not read iptables rules")
+            status[section] = record
+    return status
+
+
+def show_status(records: Iterable[dict]):
+    logger.info("=== Pi Bridge Status ===\n")
 
-    logger.info("")
+    previous = None
+    for record in records:
+        section = record["section"]
+        # Conntrack usage is part of the NAT block
+        if previous not in (None, section) and section != "conntrack":
+            logger.info("")
+
+        if section == "service":
+            if previous != section:
+                logger.info("Services:")
+            icon = "●" if record["state"] == "active" else "○"
+            logger.info(f"  {icon} {record['name']}: {record['state']}")
+
+        elif section == "ap":
+            logger.info("AP Configuration:")
+            logger.info(f"  SSID:     {record['ssid'] or 'unknown'}")
+            logger.info(f"  Country:  {record['country'] or 'unknown'}")
+            logger.info(f"  Interface: {record['interface']}")
+            logger.info(f"  IP:        {record['ip'] or 'not assigned'}")
+
+        elif section == "nat":
+            logger.info("NAT Forwarding:")
+            if not record["readable"]:
+                logger.info("  Could not read iptables rules")
+            elif record["wan_interface"]:
+                logger.info(f"  WAN interface: {record['wan_interface']}")
+                logger.info(f"  WAN IP:        {record['wan_ip'] or 'not assigned'}")
+            else:
+                logger.info("  No MASQUERADE rule found")
+            if record["port_forwards"]:
+                logger.info(f"  Port forwards: {record['port_forwards']}")
+
+        elif section == "conntrack":
+            fraction = record["count"] / record["max"] if record["max"] else 0
+            logger.info(f"  Conntrack:     {record['count']}/{record['max']} ({fraction:.0%})")
+            if fraction >= PRESSURE_WARNING:
+                logger.warning("  Conntrack table nearly full; new client connections will be dropped.")
+
+        elif section == "clients":
+            logger.info(f"Connected Clients: {record['count']}")
+
+        previous = section
 
-    # Clients
-    client_count = get_connected_clients(interface)
-    logger.info(f"Connected Clients: {client_count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show AP status and connected clients")
+    output.add_options(parser)
+    args = parser.parse_args()
+
+    records = output.selected(iter_status(), args)
+    if args.format == "text":
+        show_status(records)
+    else:
+        output.write(records, args.format)
 
 
 if __name__ == "__main__":
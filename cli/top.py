@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""Live dashboard: services, clients, uplink throughput and lease usage.
+
+Every panel has its own data source and refresh interval, and sources
+keep their inputs open instead of re-running commands: stations come
+from hostapd's control socket, uplink counters from an open
+/proc/net/dev, leases are re-read only when the lease file changes, and
+services are re-checked when the journal reports activity for one of
+their units. Only rows whose text changed are redrawn.
+"""
+import argparse
+import ipaddress
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+from clients import get_dhcp_leases, get_wireless_clients
+from config import logger, DEFAULTS
+from flows import table_usage
+from status import get_config_value, get_wan_interface, read_hostapd_config, read_nat_rules
+from watchdog import follow_journal, unit_states
+
+PROC_NET_DEV = Path("/proc/net/dev")
+LEASE_FILE = Path("/var/lib/misc/dnsmasq.leases")
+DNSMASQ_CONF = Path("/etc/dnsmasq.conf")
+
+# Seconds between refreshes of each source
+INTERVALS = {"services": 1.0, "stations": 2.0, "uplink": 1.0, "leases": 5.0}
+# Re-check services this often even without journal activity
+SERVICES_BACKSTOP = 30.0
+
+
+def format_rate(bits_per_second: float) -> str:
+    for unit, scale in (("Gbit/s", 1e9), ("Mbit/s", 1e6), ("kbit/s", 1e3)):
+        if bits_per_second >= scale:
+            return f"{bits_per_second / scale:.1f} {unit}"
+    return f"{bits_per_second:.0f} bit/s"
+
+
+def control_directory(ctrl_interface: str | None) -> str | None:
+    """The socket directory from hostapd's ctrl_interface, plain or DIR=... GROUP=... form."""
+    if not ctrl_interface:
+        return None
+    match = re.search(r"(?:^|\s)DIR=(\S+)", ctrl_interface)
+    return match.group(1) if match else ctrl_interface.strip()
+
+
+def lease_pool_size(dnsmasq_conf: str) -> int | None:
+    """Addresses in the dhcp-range, or None if there isn't one."""
+    match = re.search(r"^dhcp-range=([\d.]+),([\d.]+)", dnsmasq_conf, re.MULTILINE)
+    if match is None:
+        return None
+    first, last = (ipaddress.ip_address(address) for address in match.groups())
+    return int(last) - int(first) + 1
+
+
+class HostapdControl:
+    """A connection to hostapd's control socket, the one hostapd_cli talks to."""
+
+    def __init__(self, directory: str, interface: str):
+        self.local = f"/tmp/pi-bridge-top-{os.getpid()}"
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if os.path.exists(self.local):
+                os.unlink(self.local)
+            self.sock.bind(self.local)
+            self.sock.connect(os.path.join(directory, interface))
+        except OSError:
+            self.close()
+            raise
+        self.sock.settimeout(1.0)
+
+    def request(self, command: str) -> str:
+        self.sock.send(command.encode())
+        return self.sock.recv(65536).decode(errors="replace")
+
+    def stations(self) -> list[dict]:
+        """Every station, walked with STA-FIRST/STA-NEXT like `hostapd_cli all_sta`."""
+        stations = []
+        reply = self.request("STA-FIRST")
+        while reply and not reply.startswith(("FAIL", "UNKNOWN")):
+            mac, _, body = reply.partition("\n")
+            fields = dict(line.split("=", 1) for line in body.splitlines() if "=" in line)
+            station = {"mac": mac.strip()}
+            if "signal" in fields:
+                station["signal_dbm"] = int(fields["signal"])
+            # Rates are reported in 100 kbit/s units, followed by MCS details
+            for key, name in (("tx_bitrate", "tx_rate_info"), ("rx_bitrate", "rx_rate_info")):
+                if name in fields:
+                    station[key] = int(fields[name].split()[0]) / 10
+            for key, name in (("rx_bytes", "rx_bytes"), ("tx_bytes", "tx_bytes"), ("inactive_ms", "inactive_msec")):
+                if name in fields:
+                    station[key] = int(fields[name])
+            stations.append(station)
+            reply = self.request(f"STA-NEXT {station['mac']}")
+        return stations
+
+    def close(self) -> None:
+        self.sock.close()
+        if os.path.exists(self.local):
+            os.unlink(self.local)
+
+
+class Source:
+    """A data source refreshed on its own interval."""
+
+    name = ""
+
+    def __init__(self):
+        self.interval = INTERVALS[self.name]
+        self.due = 0.0
+
+    def refresh(self, now: float) -> None:
+        """Update the source's data; subclasses override this."""
+
+    def close(self) -> None:
+        pass
+
+
+class Services(Source):
+    """Unit states, re-checked (one systemctl call) only after journal activity."""
+
+    name = "services"
+
+    def __init__(self, units: list[str]):
+        super().__init__()
+        self.units = units
+        self.states: dict[str, bool] = {}
+        self.events: queue.Queue = queue.Queue()
+        self.checked = float("-inf")
+        threading.Thread(target=follow_journal, args=(units, self.events), daemon=True).start()
+
+    def refresh(self, now: float) -> None:
+        activity = not self.events.empty()
+        while not self.events.empty():
+            self.events.get_nowait()
+        if activity or now - self.checked >= SERVICES_BACKSTOP:
+            self.states = unit_states(self.units)
+            self.checked = now
+
+
+class Stations(Source):
+    """Associated stations with signal, link rates and throughput.
+
+    Read from hostapd's control socket; falls back to `iw station dump`
+    when the socket isn't available (e.g. no ctrl_interface, or the user
+    isn't in the socket's group), which forks on every refresh.
+    """
+
+    name = "stations"
+
+    def __init__(self, interface: str, ctrl_directory: str | None):
+        super().__init__()
+        self.interface = interface
+        self.control = None
+        self.fallback = None
+        if not ctrl_directory:
+            self.fallback = "no ctrl_interface in hostapd.conf"
+        else:
+            try:
+                self.control = HostapdControl(ctrl_directory, interface)
+            except OSError as e:
+                self.fallback = f"{os.path.join(ctrl_directory, interface)}: {e.strerror or e}"
+        if self.fallback:
+            logger.warning(f"hostapd control socket unavailable ({self.fallback}); running `iw station dump` "
+                           f"every {self.interval:g}s instead. Add yourself to the socket's group (see "
+                           f"ctrl_interface in hostapd.conf) or run as root.")
+        self.stations: list[dict] = []
+        self.previous: dict[str, tuple[float, int, int]] = {}
+
+    def refresh(self, now: float) -> None:
+        stations = None
+        if self.control is not None:
+            try:
+                stations = self.control.stations()
+            except OSError as e:
+                self.control.close()
+                self.control = None
+                self.fallback = f"control socket: {e.strerror or e}"
+        if stations is None:
+            stations = get_wireless_clients(self.interface)
+
+        previous, self.previous = self.previous, {}
+        for station in stations:
+            rx, tx = station.get("rx_bytes"), station.get("tx_bytes")
+            if rx is None or tx is None:
+                continue
+            self.previous[station["mac"]] = (now, rx, tx)
+            if station["mac"] in previous:
+                then, last_rx, last_tx = previous[station["mac"]]
+                elapsed = now - then
+                # The station's rx is our upload direction, tx our download
+                station["down_bps"] = max(0, tx - last_tx) * 8 / elapsed
+                station["up_bps"] = max(0, rx - last_rx) * 8 / elapsed
+        self.stations = stations
+
+    def close(self) -> None:
+        if self.control is not None:
+            self.control.close()
+
+
+class Uplink(Source):
+    """WAN throughput from /proc/net/dev, kept open and re-read in place."""
+
+    name = "uplink"
+
+    def __init__(self, interface: str | None):
+        super().__init__()
+        self.interface = interface
+        self.file = None
+        try:
+            self.file = PROC_NET_DEV.open()
+        except OSError:
+            pass
+        self.last: tuple[float, int, int] | None = None
+        self.rx_bps = self.tx_bps = None
+
+    def counters(self) -> tuple[int, int] | None:
+        if self.file is None or self.interface is None:
+            return None
+        self.file.seek(0)
+        prefix = f"{self.interface}:"
+        for line in self.file.read().splitlines():
+            line = line.strip()
+            if line.startswith(prefix):
+                fields = line[len(prefix):].split()
+                return int(fields[0]), int(fields[8])
+        return None
+
+    def refresh(self, now: float) -> None:
+        counters = self.counters()
+        if counters is None:
+            self.rx_bps = self.tx_bps = None
+            return
+        if self.last is not None:
+            then, rx, tx = self.last
+            self.rx_bps = max(0, counters[0] - rx) * 8 / (now - then)
+            self.tx_bps = max(0, counters[1] - tx) * 8 / (now - then)
+        self.last = (now, *counters)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class Leases(Source):
+    """DHCP leases, re-read only when the lease file changes, plus conntrack usage."""
+
+    name = "leases"
+
+    def __init__(self, pool: int | None):
+        super().__init__()
+        self.pool = pool
+        self.leases: dict[str, dict] = {}
+        self.stamp = None
+        self.conntrack: tuple[int, int] | None = None
+
+    def refresh(self, now: float) -> None:
+        try:
+            stat = LEASE_FILE.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp != self.stamp:
+            self.leases = get_dhcp_leases() if stamp else {}
+            self.stamp = stamp
+        self.conntrack = table_usage()
+
+
+class Dashboard:
+    def __init__(self, interface: str, ssid: str | None, wan: str | None,
+                 ctrl_directory: str | None, pool: int | None):
+        self.interface = interface
+        self.ssid = ssid
+        self.wan = wan
+        self.services = Services([f"{interface}-static-ip", "hostapd", "dnsmasq", "NetworkManager"])
+        self.stations = Stations(interface, ctrl_directory)
+        self.uplink = Uplink(wan)
+        self.leases = Leases(pool)
+        self.sources = [self.services, self.stations, self.uplink, self.leases]
+        self.cpu_mark = (time.monotonic(), self.cpu_seconds())
+        self.cpu_percent = 0.0
+
+    @staticmethod
+    def cpu_seconds() -> float:
+        """CPU time used by the dashboard and the commands it ran."""
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def refresh_due(self) -> bool:
+        """Refresh every source that is due. Returns True if any was."""
+        now = time.monotonic()
+        due = [source for source in self.sources if source.due <= now]
+        for source in due:
+            source.refresh(now)
+            source.due = now + source.interval
+        if due:
+            wall, cpu = time.monotonic(), self.cpu_seconds()
+            if wall - self.cpu_mark[0] >= 1.0:
+                self.cpu_percent = 100 * (cpu - self.cpu_mark[1]) / (wall - self.cpu_mark[0])
+                self.cpu_mark = (wall, cpu)
+        return bool(due)
+
+    def next_due(self) -> float:
+        return min(source.due for source in self.sources)
+
+    def rows(self, width: int = 100) -> list[str]:
+        title = f"pi-bridge top: {self.interface}" + (f' "{self.ssid}"' if self.ssid else "")
+        rows = [f"{title:<{max(0, width - 12)}}{self.cpu_percent:5.1f}% CPU"]
+
+        states = self.services.states
+        rows.append("Services: " + "  ".join(
+            f"{'●' if states.get(unit) else '○'} {unit}" for unit in self.services.units
+        ))
+
+        uplink = self.uplink
+        if self.wan is None:
+            rows.append("Uplink:   no MASQUERADE rule")
+        elif uplink.rx_bps is None:
+            rows.append(f"Uplink:   {self.wan}")
+        else:
+            rows.append(f"Uplink:   {self.wan}  down {format_rate(uplink.rx_bps)}  up {format_rate(uplink.tx_bps)}")
+
+        leases = self.leases
+        used = f"{len(leases.leases)}/{leases.pool}" if leases.pool else str(len(leases.leases))
+        line = f"Leases:   {used}"
+        if leases.conntrack:
+            count, maximum = leases.conntrack
+            line += f"   Conntrack: {count}/{maximum}"
+        rows.append(line)
+        rows.append("")
+
+        stations = sorted(self.stations.stations, key=lambda s: s.get("signal_dbm", -100), reverse=True)
+        rows.append(f"Clients: {len(stations)}" + (f"   (via iw: {self.stations.fallback})"
+                                                     if self.stations.fallback else ""))
+        rows.append(f"{'MAC':<18} {'IP':<15} {'HOSTNAME':<16} {'SIGNAL':>7} {'TX RATE':>9} {'RX RATE':>9} "
+                    f"{'DOWN':>12} {'UP':>12}")
+        for station in stations:
+            lease = leases.leases.get(station["mac"].lower(), {})
+            signal = f"{station['signal_dbm']} dBm" if "signal_dbm" in station else "-"
+            tx_rate = f"{station['tx_bitrate']:g} M" if "tx_bitrate" in station else "-"
+            rx_rate = f"{station['rx_bitrate']:g} M" if "rx_bitrate" in station else "-"
+            down = format_rate(station["down_bps"]) if "down_bps" in station else "-"
+            up = format_rate(station["up_bps"]) if "up_bps" in station else "-"
+            rows.append(f"{station['mac']:<18} {lease.get('ip', '-'):<15} {(lease.get('hostname') or '-')[:16]:<16} "
+                        f"{signal:>7} {tx_rate:>9} {rx_rate:>9} {down:>12} {up:>12}")
+        return rows
+
+    def close(self) -> None:
+        for source in self.sources:
+            source.close()
+
+
+class Screen:
+    """Curses output that rewrites only the rows whose text changed."""
+
+    def __init__(self, window):
+        import curses
+        self.curses = curses
+        self.window = window
+        self.shown: list[str] = []
+        curses.curs_set(0)
+        window.nodelay(False)
+
+    def draw(self, rows: list[str]) -> None:
+        height, width = self.window.getmaxyx()
+        rows = rows[:height]
+        for y, row in enumerate(rows):
+            if y < len(self.shown) and self.shown[y] == row:
+                continue
+            self.window.move(y, 0)
+            self.window.clrtoeol()
+            self.window.addnstr(y, 0, row, width - 1)
+        if len(rows) < len(self.shown):
+            self.window.move(len(rows), 0)
+            self.window.clrtobot()
+        self.shown = rows
+        self.window.refresh()
+
+    def wait(self, seconds: float) -> bool:
+        """Wait for a key or the timeout. Returns False when the user quits."""
+        self.window.timeout(max(0, int(seconds * 1000)))
+        key = self.window.getch()
+        if key == self.curses.KEY_RESIZE:
+            self.window.clear()
+            self.shown = []
+        return key not in (ord("q"), ord("Q"))
+
+
+def open_dashboard() -> Dashboard:
+    content = read_hostapd_config()
+    interface = get_config_value("interface", content) or DEFAULTS["DEFAULT_AP_INTERFACE"]
+    _, wan = get_wan_interface(read_nat_rules())
+    try:
+        dnsmasq_conf = DNSMASQ_CONF.read_text()
+    except OSError:
+        dnsmasq_conf = ""
+    return Dashboard(interface, get_config_value("ssid", content), wan,
+                     control_directory(get_config_value("ctrl_interface", content)),
+                     lease_pool_size(dnsmasq_conf))
+
+
+def run_batch(dashboard: Dashboard, iterations: int | None) -> None:
+    """Print a frame whenever a refresh changed something (for logs and pipes)."""
+    shown = None
+    printed = 0
+    while iterations is None or printed < iterations:
+        dashboard.refresh_due()
+        rows = dashboard.rows()
+        if rows != shown:
+            if printed:
+                print()
+            print("\n".join(rows), flush=True)
+            shown = rows
+            printed += 1
+        time.sleep(max(0.0, dashboard.next_due() - time.monotonic()))
+
+
+def run_curses(dashboard: Dashboard) -> None:
+    import curses
+
+    def loop(window):
+        screen = Screen(window)
+        while True:
+            if dashboard.refresh_due():
+                width = window.getmaxyx()[1]
+                screen.draw(dashboard.rows(width))
+            if not screen.wait(dashboard.next_due() - time.monotonic()):
+                return
+
+    curses.wrapper(loop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live dashboard of the AP, its clients and uplink")
+    parser.add_argument("-b", "--batch", action="store_true",
+                        help="Print frames to stdout instead of using the terminal (implied when not a TTY)")
+    parser.add_argument("-n", "--iterations", type=int,
+                        help="Exit after printing this many frames (batch mode)")
+    args = parser.parse_args()
+
+    dashboard = open_dashboard()
+    try:
+        if args.batch or args.iterations or not sys.stdout.isatty():
+            run_batch(dashboard, args.iterations)
+        else:
+            run_curses(dashboard)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import locks
+import runner
+from config import logger
+
+# Per thread, like the locks: the API serves reads on other threads while a
+# mutation runs, and they must not see its uncommitted snapshot and files
+_local = threading.local()
+
+
+class Transaction:
+    """Shared state and undo log for several commands run in one process.
+
+    While a transaction is active, commands share one firewall snapshot
+    and one view of the config files, defer persistence to commit(), and
+    record how to undo each change they make. Resource locks taken during
+    it are held until it ends.
+    """
+
+    def __init__(self):
+        self.firewall = None
+        self.files: dict[Path, str] = {}
+        self.undo: list[tuple[str, Callable[[], None]]] = []
+        self.restart_on_rollback: list[str] = []
+        self.rolling_back = False
+
+    def record(self, description: str, undo: Callable[[], None]) -> None:
+        if not self.rolling_back:
+            self.undo.append((description, undo))
+
+    def needs_restart(self, *services: str) -> None:
+        for service in services:
+            if service not in self.restart_on_rollback:
+                self.restart_on_rollback.append(service)
+
+    def commit(self) -> None:
+        if self.firewall is not None:
+            with runner.phase("commit"):
+                self.firewall.flush_save()
+
+    def rollback(self) -> None:
+        """Undo recorded changes newest first; keeps going past individual failures."""
+        with runner.phase("rollback"):
+            self._rollback()
+
+    def _rollback(self) -> None:
+        self.rolling_back = True
+        for description, undo in reversed(self.undo):
+            logger.info(f"  Undoing: {description}")
+            try:
+                undo()
+            except Exception as e:
+                logger.error(f"  Failed to undo {description}: {e}")
+        self.undo.clear()
+
+        if self.restart_on_rollback:
+            for service in self.restart_on_rollback:
+                logger.info(f"  Restarting {service}...")
+                runner.run(["sudo", "systemctl", "restart", service], capture_output=True, text=True)
+
+
+def active() -> Transaction | None:
+    """The transaction in progress on this thread, if any."""
+    return getattr(_local, "active", None)
+
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    """Run the enclosed commands as one unit: commit on success, roll back on error."""
+    if active() is not None:
+        raise RuntimeError("A transaction is already in progress")
+    tx = _local.active = Transaction()
+    try:
+        yield tx
+        tx.commit()
+    except BaseException:
+        logger.info("Rolling back...")
+        tx.rollback()
+        raise
+    finally:
+        _local.active = None
+        locks.release_all()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""hostapd tuning profiles: airtime fairness, WMM queues, beacons and station limits.
+
+A profile is a block of hostapd.conf settings between marker comments,
+written by setup and replaced by `pi-bridge tuning set`. A running
+hostapd then re-reads the file. That reload deauthenticates every
+station, like a restart, but they are back sooner because the radio
+stays up.
+
+All profiles turn on dynamic airtime fairness (airtime_mode=2): without
+it hostapd sends each station the same number of frames, so one client
+stuck at 802.11g rates uses most of the airtime and slows everyone else.
+hostapd only parses the airtime keys when built with CONFIG_AIRTIME_POLICY
+and refuses to start on a config it can't parse, so they are left out of
+the block on builds without it.
+"""
+import argparse
+import os
+import re
+import statistics
+from pathlib import Path
+
+from clients import get_wireless_clients
+from config import DEFAULTS, logger
+from interface import HOSTAPD_CONF, parse_hostapd_interface, read_file_with_sudo, write_file_with_sudo
+from locks import locked
+from status import get_connected_clients
+from update_creds import reload_hostapd, restart_hostapd
+
+BLOCK_START = "# pi-bridge tuning: {}"
+BLOCK_END = "# end pi-bridge tuning"
+BLOCK = re.compile(r"^# pi-bridge tuning: (\S+)\n.*?^# end pi-bridge tuning\n", re.MULTILINE | re.DOTALL)
+DEFAULT_PROFILE = DEFAULTS["DEFAULT_HOSTAPD_PROFILE"]
+
+HOSTAPD_BINARY = Path(os.environ.get("PI_BRIDGE_HOSTAPD_BINARY", "/usr/sbin/hostapd"))
+AIRTIME_KEYS = ("airtime_mode", "airtime_update_interval")
+
+# The highest 802.11g rate; stations at or below it are "slow"
+LEGACY_RATE = 54.0
+
+
+def wmm(bk: tuple, be: tuple, vi: tuple, vo: tuple) -> dict[str, str]:
+    """WMM parameters advertised to stations, per access category.
+
+    Each tuple is (aifs, cwmin, cwmax, txop_limit): contention windows as
+    exponents (2^n - 1 slots) and TXOP limits in units of 32 us.
+    """
+    settings = {}
+    for ac, (aifs, cwmin, cwmax, txop) in (("bk", bk), ("be", be), ("vi", vi), ("vo", vo)):
+        settings.update({
+            f"wmm_ac_{ac}_aifs": str(aifs),
+            f"wmm_ac_{ac}_cwmin": str(cwmin),
+            f"wmm_ac_{ac}_cwmax": str(cwmax),
+            f"wmm_ac_{ac}_txop_limit": str(txop),
+            f"wmm_ac_{ac}_acm": "0",
+        })
+    return settings
+
+
+PROFILES = {
+    "balanced": {
+        "description": "hostapd's WMM defaults with airtime fairness",
+        "settings": {
+            "airtime_mode": "2",
+            "airtime_update_interval": "200",
+            **wmm(bk=(7, 4, 10, 0), be=(3, 4, 10, 0), vi=(2, 3, 4, 94), vo=(2, 2, 3, 47)),
+            "beacon_int": "100",
+            "dtim_period": "2",
+        },
+    },
+    "low-latency": {
+        "description": "short best-effort backoff, background pushed back, DTIM every beacon",
+        "settings": {
+            "airtime_mode": "2",
+            "airtime_update_interval": "100",
+            **wmm(bk=(7, 5, 10, 0), be=(2, 3, 6, 0), vi=(2, 3, 4, 94), vo=(2, 2, 3, 47)),
+            "beacon_int": "100",
+            "dtim_period": "1",
+            "max_num_sta": "16",
+        },
+    },
+    "throughput": {
+        "description": "3 ms best-effort bursts for aggregation, fewer beacons, fewer stations",
+        "settings": {
+            "airtime_mode": "2",
+            "airtime_update_interval": "200",
+            **wmm(bk=(7, 4, 10, 0), be=(3, 4, 10, 94), vi=(2, 3, 4, 94), vo=(2, 2, 3, 47)),
+            "beacon_int": "200",
+            "dtim_period": "3",
+            "max_num_sta": "12",
+        },
+    },
+}
+
+
+def airtime_supported() -> bool:
+    """Whether hostapd was built with CONFIG_AIRTIME_POLICY.
+
+    hostapd can't test-parse a config, but its parser only contains the
+    airtime key names when the option is compiled in.
+    """
+    try:
+        return AIRTIME_KEYS[-1].encode() in HOSTAPD_BINARY.read_bytes()
+    except OSError:
+        return False
+
+
+def render_block(profile: str, airtime: bool = True) -> str:
+    """The hostapd.conf lines for a profile, between marker comments."""
+    settings = PROFILES[profile]["settings"]
+    return "".join([
+        BLOCK_START.format(profile) + "\n",
+        *(f"{key}={value}\n" for key, value in settings.items() if airtime or key not in AIRTIME_KEYS),
+        BLOCK_END + "\n",
+    ])
+
+
+def current_profile(content: str) -> str | None:
+    match = BLOCK.search(content)
+    return match.group(1) if match else None
+
+
+def apply_block(content: str, profile: str, airtime: bool = True) -> str:
+    """hostapd.conf content with its tuning block replaced (or added after wmm_enabled)."""
+    block = render_block(profile, airtime)
+    if BLOCK.search(content):
+        return BLOCK.sub(lambda _: block, content, count=1)
+    # Drop loose settings the block now owns, so hostapd doesn't see them twice
+    keys = PROFILES[profile]["settings"]
+    lines = [line for line in content.splitlines(keepends=True) if line.split("=", 1)[0] not in keys]
+    for index, line in enumerate(lines):
+        if line.startswith("wmm_enabled="):
+            lines.insert(index + 1, block)
+            break
+    else:
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.append(block)
+    return "".join(lines)
+
+
+def station_limit(profile: str) -> int | None:
+    """The profile's max_num_sta, or None if it keeps hostapd's default (2007)."""
+    limit = PROFILES[profile]["settings"].get("max_num_sta")
+    return int(limit) if limit else None
+
+
+@locked("hostapd")
+def set_profile(profile: str, restart: bool = False) -> str:
+    """Write a profile to hostapd.conf and apply it live; returns "reload" or "restart"."""
+    if profile not in PROFILES:
+        raise RuntimeError(f"Unknown tuning profile '{profile}' (choose from: {', '.join(PROFILES)})")
+    content = read_file_with_sudo(HOSTAPD_CONF)
+    limit = station_limit(profile)
+    interface = parse_hostapd_interface()
+    if limit is not None and interface:
+        connected = get_connected_clients(interface)
+        if connected > limit:
+            logger.warning(f"{connected} clients are connected but {profile} allows {limit}; "
+                           f"{connected - limit} won't be able to reconnect.")
+    airtime = airtime_supported()
+    if not airtime:
+        logger.warning("hostapd was built without CONFIG_AIRTIME_POLICY; leaving airtime fairness off.")
+    write_file_with_sudo(HOSTAPD_CONF, apply_block(content, profile, airtime))
+    if not restart:
+        logger.info("Reloading hostapd...")
+        if reload_hostapd():
+            return "reload"
+        logger.warning("hostapd could not be reloaded; falling back to a restart.")
+    restart_hostapd()
+    return "restart"
+
+
+def airtime_shares(rates: list[float]) -> list[float]:
+    """Each station's share of airtime if every station sent the same amount of data."""
+    inverse = [1 / rate for rate in rates]
+    total = sum(inverse)
+    return [share / total for share in inverse]
+
+
+def station_stats(stations: list[dict]) -> dict:
+    """Bitrate summary for the stations that report a TX rate."""
+    rates = [s["tx_bitrate"] for s in stations if s.get("tx_bitrate")]
+    if not rates:
+        return {"stations": len(stations)}
+    return {
+        "stations": len(stations),
+        "tx_min": min(rates),
+        "tx_median": statistics.median(rates),
+        "tx_max": max(rates),
+        "slow": sum(1 for rate in rates if rate <= LEGACY_RATE),
+    }
+
+
+def show_stations(interface: str, airtime: bool = True) -> None:
+    stations = [s for s in get_wireless_clients(interface) if s.get("tx_bitrate")]
+    if not stations:
+        logger.info("No stations with a known bitrate.")
+        return
+
+    logger.info(f"{'MAC Address':<20} {'Signal':<9} {'TX Mbit/s':>9} {'RX Mbit/s':>9} {'Retries':>8} {'Airtime*':>9}")
+    logger.info("-" * 70)
+    shares = airtime_shares([s["tx_bitrate"] for s in stations])
+    for station, share in sorted(zip(stations, shares), key=lambda pair: -pair[1]):
+        packets = station.get("tx_packets") or 0
+        retries = f"{station.get('tx_retries', 0) / packets:.0%}" if packets else "-"
+        rx = f"{station['rx_bitrate']:.1f}" if station.get("rx_bitrate") else "-"
+        logger.info(f"{station['mac']:<20} {station.get('signal', '-'):<9} {station['tx_bitrate']:>9.1f} "
+                    f"{rx:>9} {retries:>8} {share:>9.0%}")
+
+    stats = station_stats(stations)
+    logger.info(f"\nTX bitrate: min {stats['tx_min']:.1f}, median {stats['tx_median']:.1f}, "
+                f"max {stats['tx_max']:.1f} Mbit/s")
+    logger.info("* Share of airtime each station needs to move the same amount of data.")
+    if stats["slow"] and airtime:
+        logger.info(f"{stats['slow']} station(s) at 802.11g rates or below; "
+                    "airtime fairness keeps them from slowing the others.")
+    elif stats["slow"]:
+        logger.info(f"{stats['slow']} station(s) at 802.11g rates or below; "
+                    "without airtime fairness they slow the others down.")
+
+
+def show_tuning() -> None:
+    content = read_file_with_sudo(HOSTAPD_CONF)
+    profile = current_profile(content)
+    if profile:
+        logger.info(f"Tuning profile: {profile} ({PROFILES.get(profile, {}).get('description', 'unknown')})")
+    else:
+        logger.info("Tuning profile: none (hostapd defaults)")
+    airtime = re.search(r"^airtime_mode=[1-3]$", content, re.MULTILINE) is not None
+    if profile and not airtime:
+        logger.info("Airtime fairness: off (hostapd built without CONFIG_AIRTIME_POLICY)")
+    match = re.search(r"^interface=(.+)$", content, re.MULTILINE)
+    interface = match.group(1).strip() if match else DEFAULTS["DEFAULT_AP_INTERFACE"]
+    logger.info("")
+    show_stations(interface, airtime)
+
+
+def list_profiles() -> None:
+    for name, profile in PROFILES.items():
+        settings = profile["settings"]
+        limit = station_limit(name)
+        logger.info(f"{name:<12} {profile['description']}")
+        logger.info(f"{'':<12} beacon {settings['beacon_int']} TU, DTIM {settings['dtim_period']}, "
+                    f"{f'max {limit} stations' if limit else 'no station limit'}, "
+                    f"BE TXOP {int(settings['wmm_ac_be_txop_limit']) * 32} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or switch hostapd tuning profiles")
+    sub = parser.add_subparsers(dest="action")
+    sub.add_parser("show", help="Show the current profile and station bitrates")
+    sub.add_parser("list", help="List the available profiles")
+    set_parser = sub.add_parser("set", help="Switch to a profile and reload hostapd")
+    set_parser.add_argument("profile", choices=PROFILES)
+    set_parser.add_argument("--restart", action="store_true",
+                            help="Restart hostapd instead of reloading its configuration")
+    args = parser.parse_args()
+
+    if args.action is None or args.action == "show":
+        show_tuning()
+    elif args.action == "list":
+        list_profiles()
+    elif args.action == "set":
+        method = set_profile(args.profile, args.restart)
+        logger.info(f"Tuning profile set to {args.profile} ({method}).")
+
+
+if __name__ == "__main__":
+    main()
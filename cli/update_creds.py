@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
 import getpass
 import re
 import sys
+import time
 from pathlib import Path
 
+import runner
 from config import logger
+from locks import hold, locked
+from interface import parse_hostapd_interface
+from status import get_connected_clients
 
 HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
+# 802.11 limit on the SSID, in bytes
+MAX_SSID_BYTES = 32
 
 
 def read_current_config() -> dict:
@@ -20,7 +27,7 @@ def read_current_config() -> dict:
             config["ssid"] = ssid_match.group(1)
     except PermissionError:
         # Try with sudo
-        result = subprocess.run(
+        result = runner.run(
             ["sudo", "cat", str(HOSTAPD_CONF)],
             capture_output=True, text=True
         )
@@ -34,39 +41,103 @@ def read_current_config() -> dict:
 def update_config(ssid: str | None, passphrase: str | None):
     """Update hostapd.conf with new credentials."""
     # Read current config
-    result = subprocess.run(
+    result = runner.run(
         ["sudo", "cat", str(HOSTAPD_CONF)],
         capture_output=True, text=True
     )
     if result.returncode != 0:
-        logger.error("Error reading hostapd.conf")
-        sys.exit(1)
+        raise RuntimeError("Error reading hostapd.conf")
 
     content = result.stdout
 
     if ssid:
-        content = re.sub(r'^ssid=.+$', f'ssid={ssid}', content, flags=re.MULTILINE)
+        validate_ssid(ssid)
+        content = re.sub(r'^ssid=.+$', lambda _: f'ssid={ssid}', content, flags=re.MULTILINE)
 
     if passphrase:
-        content = re.sub(r'^wpa_passphrase=.+$', f'wpa_passphrase={passphrase}', content, flags=re.MULTILINE)
+        validate_passphrase(passphrase)
+        content = re.sub(r'^wpa_passphrase=.+$', lambda _: f'wpa_passphrase={passphrase}', content,
+                         flags=re.MULTILINE)
 
     # Write updated config
-    process = subprocess.run(
+    process = runner.run(
         ["sudo", "tee", str(HOSTAPD_CONF)],
         input=content, text=True, capture_output=True
     )
     if process.returncode != 0:
-        logger.error("Error writing hostapd.conf")
-        sys.exit(1)
+        raise RuntimeError("Error writing hostapd.conf")
+
+
+def reload_hostapd() -> bool:
+    """Have the running hostapd re-read hostapd.conf (SIGHUP) instead of restarting it.
+
+    hostapd still deauthenticates every station when it reloads, so clients
+    reassociate either way; but the radio stays up, so the outage is shorter
+    than after a restart. Returns False if hostapd couldn't be reloaded.
+    """
+    with hold("units"):
+        result = runner.run(["sudo", "systemctl", "reload", "hostapd"], capture_output=True, text=True)
+    return result.returncode == 0
 
 
 def restart_hostapd():
     """Restart hostapd service."""
     logger.info("Restarting hostapd...")
-    result = subprocess.run(["sudo", "systemctl", "restart", "hostapd"])
+    with hold("units"):
+        result = runner.run(["sudo", "systemctl", "restart", "hostapd"])
     if result.returncode != 0:
-        logger.error("Error restarting hostapd")
-        sys.exit(1)
+        raise RuntimeError("Error restarting hostapd")
+
+
+@locked("hostapd")
+def apply_credentials(ssid: str | None, passphrase: str | None, restart: bool = False) -> str:
+    """Write hostapd.conf and apply it live; returns "reload" or "restart"."""
+    update_config(ssid, passphrase)
+    if not restart:
+        logger.info("Reloading hostapd...")
+        if reload_hostapd():
+            return "reload"
+        logger.warning("hostapd could not be reloaded; falling back to a restart.")
+    restart_hostapd()
+    return "restart"
+
+
+def wait_for_clients(interface: str, expected: int, timeout: float,
+                     interval: float = 0.25) -> tuple[float | None, int, int]:
+    """Poll the station count until `expected` clients are back.
+
+    Returns (seconds until recovered or None on timeout, lowest count seen,
+    final count).
+    """
+    started = time.monotonic()
+    lowest = None
+    while True:
+        count = get_connected_clients(interface)
+        lowest = count if lowest is None else min(lowest, count)
+        elapsed = time.monotonic() - started
+        if count >= expected:
+            return elapsed, lowest, count
+        if elapsed >= timeout:
+            return None, lowest, count
+        time.sleep(interval)
+
+
+def has_control_chars(value: str) -> bool:
+    return any(ord(c) < 32 or ord(c) == 127 for c in value)
+
+
+def validate_passphrase(passphrase: str):
+    if not 8 <= len(passphrase) <= 63:
+        raise RuntimeError("Passphrase must be 8-63 characters")
+    if has_control_chars(passphrase):
+        raise RuntimeError("Passphrase must not contain control characters")
+
+
+def validate_ssid(ssid: str):
+    if len(ssid.encode()) > MAX_SSID_BYTES:
+        raise RuntimeError(f"SSID must be at most {MAX_SSID_BYTES} bytes")
+    if has_control_chars(ssid):
+        raise RuntimeError("SSID must not contain control characters")
 
 
 def prompt(message: str, default: str | None = None) -> str:
@@ -78,38 +149,84 @@ def prompt(message: str, default: str | None = None) -> str:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Update AP SSID and/or passphrase")
+    parser.add_argument("--ssid", help="New SSID (skips the prompts)")
+    parser.add_argument(
+        "--passphrase-stdin",
+        action="store_true",
+        help="Read the new passphrase from stdin (skips the prompts)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Restart hostapd instead of reloading its configuration",
+    )
+    parser.add_argument(
+        "--measure",
+        action="store_true",
+        help="Wait for clients to reconnect and report how long it took",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for clients with --measure (default: 30)",
+    )
+    args = parser.parse_args()
+
     logger.info("=== Update AP Credentials ===\n")
 
     current = read_current_config()
     current_ssid = current.get("ssid", "")
 
-    logger.info("Leave blank to keep current value.\n")
+    if args.ssid or args.passphrase_stdin:
+        new_ssid = args.ssid or ""
+        new_passphrase = sys.stdin.readline().strip() if args.passphrase_stdin else ""
+        if args.passphrase_stdin and not new_passphrase:
+            raise RuntimeError("Passphrase required via stdin")
+    else:
+        logger.info("Leave blank to keep current value.\n")
 
-    new_ssid = input(f"New SSID [{current_ssid}]: ").strip()
-    new_passphrase = getpass.getpass("New passphrase (blank to keep): ")
+        new_ssid = input(f"New SSID [{current_ssid}]: ").strip()
+        new_passphrase = getpass.getpass("New passphrase (blank to keep): ")
 
     if not new_ssid and not new_passphrase:
         logger.info("No changes specified.")
         return
+    if new_ssid:
+        validate_ssid(new_ssid)
+    if new_passphrase:
+        validate_passphrase(new_passphrase)
 
-    # Confirm
-    logger.info("\nChanges:")
+    logger.info("Changes:")
     if new_ssid:
         logger.info(f"  SSID: {current_ssid} -> {new_ssid}")
     if new_passphrase:
         logger.info(f"  Passphrase: (will be updated)")
     logger.info("")
 
-    confirm = input("Apply changes? [y/N]: ").strip().lower()
-    if confirm not in ("y", "yes"):
-        logger.info("Aborted.")
-        return
+    if not (args.ssid or args.passphrase_stdin):
+        confirm = input("Apply changes? [y/N]: ").strip().lower()
+        if confirm not in ("y", "yes"):
+            logger.info("Aborted.")
+            return
+        logger.info("")
 
-    logger.info("")
-    update_config(new_ssid or None, new_passphrase or None)
-    logger.info("Credentials updated.")
+    interface = parse_hostapd_interface() if args.measure else None
+    before = get_connected_clients(interface) if interface else 0
+
+    method = apply_credentials(new_ssid or None, new_passphrase or None, restart=args.restart)
+    logger.info(f"Credentials updated ({method}).")
+
+    if interface:
+        elapsed, lowest, count = wait_for_clients(interface, before, args.timeout)
+        dropped = before - lowest
+        if elapsed is None:
+            logger.warning(f"Reconnect: {count}/{before} client(s) back after {args.timeout:.0f}s "
+                           f"({dropped} dropped)")
+        else:
+            logger.info(f"Reconnect: {count}/{before} client(s) in {elapsed:.2f}s ({dropped} dropped)")
 
-    restart_hostapd()
     logger.info("\nAP credentials updated successfully.")
 
 
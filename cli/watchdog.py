@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Detect AP failures and repair them with escalating actions.
+
+Unit state changes reach the watchdog through the systemd journal
+(`journalctl -f` on the AP units), so a crash is noticed as soon as
+systemd logs it. The AP interface's operstate and the station count are
+checked on every journal event and on a periodic tick.
+
+Repairs escalate while a problem persists: reload hostapd, restart the
+unit chain in start order, then unbind and rebind the USB radio. Attempts
+are spaced by exponential backoff, and every incident is appended to
+STATE_DIR/watchdog.jsonl with its detection and recovery times.
+
+When every station drops at once, the incident stays open until clients
+are back; if none return within --station-timeout, the empty AP is
+taken as the new normal and the incident is closed unrecovered.
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+import runner
+from ap_control import ap_services
+from locks import hold
+from config import logger, DEFAULTS, STATE_DIR
+from interface import parse_hostapd_interface
+from logs import journal_command, parse_entry
+from status import get_connected_clients
+
+INCIDENT_LOG = STATE_DIR / "watchdog.jsonl"
+SYS_CLASS_NET = Path("/sys/class/net")
+USB_DRIVER = Path("/sys/bus/usb/drivers/usb")
+
+ACTIONS = ("reload", "restart", "rebind")
+# Stations vanishing all at once from at least this many is treated as a fault
+STATION_DROP_MIN = 2
+# Seconds clients get to reassociate after an action before the next one
+REASSOCIATE = 15.0
+
+
+def unit_states(units: list[str]) -> dict[str, bool]:
+    """Whether each unit is active, from one systemctl call."""
+    result = runner.run(["systemctl", "is-active"] + units, capture_output=True, text=True)
+    states = result.stdout.split()
+    return {unit: i < len(states) and states[i] == "active" for i, unit in enumerate(units)}
+
+
+def operstate(interface: str) -> str:
+    """The interface's operstate, or "missing" if it is gone."""
+    try:
+        return (SYS_CLASS_NET / interface / "operstate").read_text().strip()
+    except OSError:
+        pass
+    # No sysfs entry (e.g. a container): ask iproute2 instead
+    result = runner.run(["ip", "-o", "link", "show", interface], capture_output=True, text=True)
+    if result.returncode != 0:
+        return "missing"
+    fields = result.stdout.split()
+    return fields[fields.index("state") + 1].lower() if "state" in fields else "unknown"
+
+
+def usb_device(interface: str) -> str | None:
+    """The USB device (e.g. "1-1.3") behind a network interface, if any."""
+    try:
+        path = (SYS_CLASS_NET / interface / "device").resolve(strict=True)
+    except OSError:
+        return None
+    # .../usb1/1-1/1-1.3/1-1.3:1.0 -> the device is the parent of the USB interface
+    if "usb" not in path.parts or ":" not in path.name:
+        return None
+    return path.parent.name
+
+
+class Watchdog:
+    def __init__(self, interface: str, settle: float = 3.0, backoff: float = 2.0,
+                 max_backoff: float = 300.0, station_timeout: float = 120.0):
+        self.interface = interface
+        self.units = ap_services(interface)
+        self.settle = settle
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.station_timeout = station_timeout
+        # Station count at the last healthy check
+        self.stations: int | None = None
+        self.usb = usb_device(interface)
+        self.incident: dict | None = None
+        self.attempt = 0
+        self.next_action = 0.0
+        self.last_action: float | None = None
+
+    # --- detection ------------------------------------------------------------
+
+    def check(self) -> list[str]:
+        """Problems found right now; empty when healthy."""
+        problems = [f"{unit} inactive" for unit, up in unit_states(self.units).items() if not up]
+        state = operstate(self.interface)
+        if state in ("down", "missing", "notpresent", "lowerlayerdown"):
+            problems.append(f"{self.interface} {state}")
+        elif self.usb is None:
+            self.usb = usb_device(self.interface)
+
+        if not problems:
+            count = get_connected_clients(self.interface)
+            if count == 0 and (self.stations or 0) >= STATION_DROP_MIN:
+                # Keep the old count until clients are back, so the drop stays a problem
+                problems.append(f"stations dropped from {self.stations} to 0")
+            else:
+                self.stations = count
+        return problems
+
+    @staticmethod
+    def stations_missing(problems: list[str]) -> bool:
+        """Whether the only problem left is clients that haven't come back."""
+        return len(problems) == 1 and problems[0].startswith("stations dropped")
+
+    # --- recovery -------------------------------------------------------------
+
+    def choose_action(self, problems: list[str]) -> str | None:
+        """Next rung of the ladder for this incident; None when exhausted."""
+        hostapd_down = "hostapd inactive" in problems
+        for action in ACTIONS[self.attempt:]:
+            self.attempt += 1
+            if action == "reload" and hostapd_down:
+                continue
+            if action == "rebind" and self.usb is None:
+                continue
+            return action
+        return None
+
+    def perform(self, action: str) -> bool:
+        logger.info(f"  Action: {action}")
+        with hold("units"):
+            return self._perform(action)
+
+    def _perform(self, action: str) -> bool:
+        if action == "reload":
+            result = runner.run(["sudo", "systemctl", "reload", "hostapd"], capture_output=True, text=True)
+            return result.returncode == 0
+        if action == "restart":
+            return self.restart_chain()
+        # rebind, then bring the chain back up on the re-created interface
+        for op in ("unbind", "bind"):
+            result = runner.run(["sudo", "tee", str(USB_DRIVER / op)], input=self.usb,
+                                capture_output=True, text=True)
+            if result.returncode != 0:
+                return False
+            time.sleep(self.settle if op == "unbind" else 0)
+        return self.restart_chain()
+
+    def restart_chain(self) -> bool:
+        ok = True
+        for unit in self.units:
+            result = runner.run(["sudo", "systemctl", "restart", unit], capture_output=True, text=True)
+            ok = ok and result.returncode == 0
+        return ok
+
+    # --- incidents --------------------------------------------------------------
+
+    def open_incident(self, problems: list[str], event: dict | None) -> None:
+        now = time.time()
+        self.incident = {
+            "detected": now,
+            "problems": problems,
+            "trigger": "journal" if event else "check",
+            "detection_latency_s": round(now - event["time"], 3) if event and event["time"] else None,
+            "actions": [],
+            "recovered": None,
+            "recovery_s": None,
+        }
+        self.attempt = 0
+        self.next_action = 0.0
+        self.last_action = None
+        logger.warning(f"Problem detected: {', '.join(problems)}")
+
+    def close_incident(self, recovered: bool) -> None:
+        incident, self.incident = self.incident, None
+        if recovered:
+            now = time.time()
+            incident["recovered"] = now
+            incident["recovery_s"] = round(now - incident["detected"], 3)
+            logger.info(f"Recovered after {incident['recovery_s']:.1f}s")
+        record_incident(incident)
+
+    def act(self, problems: list[str]) -> bool:
+        """Take the next repair action; False when the ladder is exhausted."""
+        action = self.choose_action(problems)
+        if action is None:
+            return False
+        ok = self.perform(action)
+        self.incident["actions"].append({"action": action, "time": time.time(), "ok": ok})
+        self.last_action = time.monotonic()
+        return True
+
+    def step(self, event: dict | None = None) -> bool:
+        """Check once and act if due. Returns True when healthy."""
+        problems = self.check()
+        if not problems:
+            if self.incident is not None:
+                self.close_incident(recovered=True)
+            return True
+        if self.incident is None:
+            self.open_incident(problems, event)
+        if self.stations_missing(problems):
+            if time.time() - self.incident["detected"] >= self.station_timeout:
+                logger.warning(f"No clients back after {self.station_timeout:g}s; taking the empty AP as normal.")
+                self.stations = 0
+                self.close_incident(recovered=False)
+                return True
+            # Give clients time to reassociate before escalating
+            if self.last_action is not None:
+                self.next_action = max(self.next_action, self.last_action + REASSOCIATE)
+        if time.monotonic() < self.next_action:
+            return False
+        if not self.act(problems):
+            # Ladder exhausted: start over after the longest backoff
+            self.attempt = 0
+            self.next_action = time.monotonic() + self.max_backoff
+            logger.error(f"Recovery failed: {', '.join(problems)}; retrying in {self.max_backoff:g}s")
+            return False
+        delay = min(self.backoff * 2 ** (len(self.incident["actions"]) - 1), self.max_backoff)
+        self.next_action = time.monotonic() + max(delay, self.settle)
+        return False
+
+    # --- modes --------------------------------------------------------------------
+
+    def run_once(self) -> bool:
+        """Check, and if broken walk the whole ladder. Returns True if healthy at the end."""
+        if self.step():
+            logger.info("AP healthy.")
+            return True
+        while True:
+            time.sleep(self.settle)
+            problems = self.check()
+            if not problems:
+                self.close_incident(recovered=True)
+                return True
+            if not self.act(problems):
+                break
+        self.close_incident(recovered=False)
+        logger.error("AP still unhealthy.")
+        return False
+
+    def run_forever(self, interval: float) -> None:
+        events: queue.Queue = queue.Queue()
+        threading.Thread(target=follow_journal, args=(self.units, events), daemon=True).start()
+        logger.info(f"Watching {', '.join(self.units)} on {self.interface}...")
+        try:
+            while True:
+                timeout = interval
+                if self.incident is not None:
+                    timeout = max(0.0, min(interval, self.next_action - time.monotonic()))
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    event = None
+                # One check covers a burst of journal lines
+                while not events.empty():
+                    events.get_nowait()
+                self.step(event)
+        except KeyboardInterrupt:
+            if self.incident is not None:
+                self.close_incident(recovered=False)
+
+
+def follow_journal(units: list[str], events: queue.Queue) -> None:
+    """Feed journal entries for the units into `events`."""
+    for line in runner.stream_lines(journal_command(units, lines=0, follow=True)):
+        entry = parse_entry(line)
+        if entry is not None:
+            events.put(entry)
+
+
+def record_incident(incident: dict) -> None:
+    INCIDENT_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(INCIDENT_LOG, "a") as f:
+        f.write(json.dumps(incident) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the AP and repair it when it fails")
+    parser.add_argument("--once", action="store_true",
+                        help="Check once, repair if needed, and exit (non-zero if still broken)")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="Seconds between checks without journal activity (default: 10)")
+    parser.add_argument("--settle", type=float, default=3.0,
+                        help="Seconds to let an action take effect before re-checking (default: 3)")
+    parser.add_argument("--max-backoff", type=float, default=300.0,
+                        help="Upper bound for the delay between repair attempts (default: 300)")
+    parser.add_argument("--station-timeout", type=float, default=120.0,
+                        help="Seconds to wait for clients after they all drop before giving up (default: 120)")
+    args = parser.parse_args()
+
+    interface = parse_hostapd_interface() or DEFAULTS["DEFAULT_AP_INTERFACE"]
+    watchdog = Watchdog(interface, settle=args.settle, max_backoff=args.max_backoff,
+                        station_timeout=args.station_timeout)
+
+    if args.once:
+        if not watchdog.run_once():
+            sys.exit(1)
+        return
+    watchdog.run_forever(args.interval)
+
+
+if __name__ == "__main__":
+    main()
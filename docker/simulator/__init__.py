@@ -0,0 +1,5 @@
+"""Stateful stand-in for the system tools pi-bridge drives (iptables, ip, iw, ...).
+
+One daemon keeps the whole simulated system in memory; the scripts in
+docker/stubs forward their argv to it. See docker/README.md.
+"""
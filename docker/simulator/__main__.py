@@ -0,0 +1,84 @@
+"""Control the simulator: python3 -m simulator <command> (or `pi-bridge-sim`).
+
+  pi-bridge-sim reset
+  pi-bridge-sim generate stations 300 --interface wlan1
+  pi-bridge-sim generate leases 300
+  pi-bridge-sim generate wans 8
+  pi-bridge-sim generate rules 5000
+  pi-bridge-sim link usb0 --mtu 1400 --path-mtu 1360
+  pi-bridge-sim latency iptables 20 --jitter 5
+  pi-bridge-sim fault iptables --match "-A" --count 1
+  pi-bridge-sim clear faults        (or latency, calls, journal, all)
+  pi-bridge-sim state
+  pi-bridge-sim stop
+"""
+import argparse
+import json
+
+from .client import admin
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="pi-bridge-sim", description="Control the pi-bridge simulator")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("reset", help="Back to a freshly booted system")
+    sub.add_parser("state", help="Print the simulated state as JSON")
+    sub.add_parser("calls", help="Print per-command call counts")
+    sub.add_parser("stop", help="Stop the daemon")
+
+    gen = sub.add_parser("generate", help="Populate state at scale")
+    gen.add_argument("kind", choices=["stations", "leases", "interfaces", "wans", "rules", "journal"])
+    gen.add_argument("count", type=int)
+    gen.add_argument("--interface", help="Station interface (stations)")
+    gen.add_argument("--table", help="iptables table (rules)")
+    gen.add_argument("--chain", help="iptables chain (rules)")
+    gen.add_argument("--seed", type=int, help="Generator seed")
+
+    link = sub.add_parser("link", help="Change a simulated interface")
+    link.add_argument("name")
+    link.add_argument("--mtu", type=int, help="Link MTU")
+    link.add_argument("--path-mtu", type=int, help="Smallest MTU on the path beyond the link (ping -M do)")
+
+    lat = sub.add_parser("latency", help="Delay every call of a command ('*' for all)")
+    lat.add_argument("target")
+    lat.add_argument("ms", type=float)
+    lat.add_argument("--jitter", type=float, default=0.0, help="Random +/- ms")
+
+    fault = sub.add_parser("fault", help="Fail calls of a command ('*' for all)")
+    fault.add_argument("target")
+    fault.add_argument("--match", default="", help="Only calls whose arguments contain this text")
+    fault.add_argument("--rc", type=int, default=1, help="Exit status (default: 1)")
+    fault.add_argument("--stderr", default="", help="Error message")
+    fault.add_argument("--count", type=int, help="Fail this many times, then stop")
+    fault.add_argument("--probability", type=float, default=1.0, help="Chance each call fails")
+
+    clear = sub.add_parser("clear", help="Remove injected faults/latency, call counts or the journal")
+    clear.add_argument("what", choices=["faults", "latency", "calls", "journal", "all"])
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        options = {k: v for k, v in (("interface", args.interface), ("table", args.table),
+                                     ("chain", args.chain), ("seed", args.seed)) if v is not None}
+        admin("generate", kind=args.kind, count=args.count, **options)
+    elif args.command == "link":
+        options = {k: v for k, v in (("mtu", args.mtu), ("path_mtu", args.path_mtu)) if v is not None}
+        admin("link", name=args.name, **options)
+    elif args.command == "latency":
+        admin("latency", command=args.target, ms=args.ms, jitter=args.jitter)
+    elif args.command == "fault":
+        admin("fault", command=args.target, match=args.match, returncode=args.rc,
+              stderr=args.stderr, count=args.count, probability=args.probability)
+    elif args.command == "clear":
+        admin("clear", what=args.what)
+    elif args.command == "state":
+        print(json.dumps(admin("state")["state"], indent=2))
+    elif args.command == "calls":
+        print(json.dumps(admin("calls")["calls"], indent=2))
+    else:
+        admin(args.command)
+
+
+if __name__ == "__main__":
+    main()
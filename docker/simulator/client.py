@@ -0,0 +1,85 @@
+"""Client side of the simulator: used by every stub and by tests.
+
+Kept to cheap imports because it runs once per stubbed command.
+"""
+import json
+import os
+import socket
+import sys
+import time
+
+SOCKET = os.environ.get("PI_BRIDGE_SIM_SOCKET", "/tmp/pi-bridge-sim.sock")
+LOG_FILE = os.environ.get("PI_BRIDGE_SIM_LOG", "/tmp/pi-bridge-sim.log")
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPAWN_TIMEOUT = 5.0
+
+
+def send(payload: dict) -> dict:
+    data = json.dumps(payload).encode() + b"\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET)
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+def spawn() -> None:
+    """Start the daemon unless another stub already did; wait until it answers."""
+    import fcntl
+    import subprocess
+
+    with open(SOCKET + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            send({"admin": "ping"})
+            return
+        except OSError:
+            pass
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_PARENT, env.get("PYTHONPATH")]))
+        with open(LOG_FILE, "a") as log:
+            subprocess.Popen(
+                [sys.executable, "-m", "simulator.server", "--socket", SOCKET],
+                env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                start_new_session=True,
+            )
+        deadline = time.monotonic() + SPAWN_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                send({"admin": "ping"})
+                return
+            except OSError:
+                time.sleep(0.01)
+    raise RuntimeError(f"simulator did not start; see {LOG_FILE}")
+
+
+def request(payload: dict) -> dict:
+    try:
+        return send(payload)
+    except (FileNotFoundError, ConnectionRefusedError):
+        spawn()
+        return send(payload)
+
+
+def admin(op: str, **kwargs) -> dict:
+    """Run an admin operation (reset, generate, fault, ...); raises on error."""
+    response = request({"admin": op, **kwargs})
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response
+
+
+def run_stub(name: str) -> int:
+    """Entry point for docker/stubs/<name>: forward argv, replay the output."""
+    response = request({"argv": [name] + sys.argv[1:], "cwd": os.getcwd()})
+    if "error" in response:
+        sys.stderr.write(f"{name}: simulator error: {response['error']}\n")
+        return 1
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["returncode"]
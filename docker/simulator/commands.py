@@ -0,0 +1,876 @@
+"""Command handlers: argv in, (returncode, stdout, stderr) out.
+
+Each handler mirrors the subset of the real tool's behaviour and output
+format that pi-bridge and its setup scripts rely on.
+"""
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from .state import ARCH, BUILTIN_CHAINS, NM_CONF, REPOSITORY, State
+
+Result = tuple[int, str, str]
+
+
+def lines(*items: str) -> str:
+    return "".join(f"{item}\n" for item in items)
+
+
+# --- iptables ----------------------------------------------------------------
+
+IPTABLES_ACTIONS = ("-S", "-C", "-A", "-D", "-I", "-N", "-X", "-F")
+NO_CHAIN = "iptables: No chain/target/match by that name.\n"
+BAD_RULE = "iptables: Bad rule (does a matching rule exist in that chain?).\n"
+
+
+def iptables(state: State, args: list[str]) -> Result:
+    table_name = "filter"
+    rest = []
+    i = 0
+    while i < len(args):
+        if args[i] == "-t" and i + 1 < len(args):
+            table_name = args[i + 1]
+            i += 2
+        elif args[i] in ("-w", "--wait"):
+            i += 1
+        else:
+            rest.append(args[i])
+            i += 1
+
+    table = state.table(table_name)
+    if table is None:
+        return 3, "", f"iptables v1.8.9: can't initialize iptables table `{table_name}': Table does not exist\n"
+    if not rest or rest[0] not in IPTABLES_ACTIONS:
+        return 2, "", "iptables v1.8.9: no command specified\n"
+
+    action, chain = rest[0], rest[1] if len(rest) > 1 else None
+    spec_tokens = rest[2:]
+
+    if action == "-S":
+        if chain and chain not in table:
+            return 1, "", NO_CHAIN
+        out = []
+        for name in [chain] if chain else table:
+            if name in BUILTIN_CHAINS[table_name]:
+                out.append(f"-P {name} ACCEPT")
+            else:
+                out.append(f"-N {name}")
+        for name in [chain] if chain else table:
+            out += [f"-A {name} {spec}" for spec in table[name]]
+        return 0, lines(*out), ""
+
+    if action == "-N":
+        if chain in table:
+            return 1, "", "iptables: Chain already exists.\n"
+        table[chain] = {}
+        return 0, "", ""
+
+    if action == "-X":
+        names = [chain] if chain else [c for c in table if c not in BUILTIN_CHAINS[table_name]]
+        for name in names:
+            if name not in table or name in BUILTIN_CHAINS[table_name]:
+                return 1, "", NO_CHAIN
+            if table[name]:
+                return 1, "", "iptables: Directory not empty.\n"
+            del table[name]
+        return 0, "", ""
+
+    if action == "-F":
+        for name in [chain] if chain else list(table):
+            if name not in table:
+                return 1, "", NO_CHAIN
+            table[name] = {}
+        return 0, "", ""
+
+    if chain not in table:
+        return 1, "", NO_CHAIN
+    rules = table[chain]
+
+    if action in ("-A", "-I") and "--match-set" in spec_tokens:
+        name = spec_tokens[spec_tokens.index("--match-set") + 1]
+        if name not in state.ipsets:
+            return 2, "", f"iptables v1.8.9: Set {name} doesn't exist.\n"
+
+    if action == "-I":
+        position = 1
+        if spec_tokens and spec_tokens[0].isdigit():
+            position = int(spec_tokens.pop(0))
+        spec = " ".join(spec_tokens)
+        ordered = list(rules)
+        ordered.insert(position - 1, spec)
+        table[chain] = dict.fromkeys(ordered)
+        return 0, "", ""
+
+    spec = " ".join(spec_tokens)
+
+    if action == "-C":
+        return (0, "", "") if spec in rules else (1, "", BAD_RULE)
+
+    if action == "-A":
+        rules[spec] = None
+        return 0, "", ""
+
+    # -D, by spec or by 1-based rule number
+    if spec.isdigit():
+        ordered = list(rules)
+        if not 1 <= int(spec) <= len(ordered):
+            return 1, "", "iptables: Index of deletion too big.\n"
+        del rules[ordered[int(spec) - 1]]
+        return 0, "", ""
+    if spec not in rules:
+        return 1, "", BAD_RULE
+    del rules[spec]
+    return 0, "", ""
+
+
+# --- ipset -------------------------------------------------------------------
+
+IPSET = "ipset v7.17: "
+
+
+def ipset_member(kind: str, entry: str) -> str:
+    if kind == "hash:mac":
+        return entry.upper()
+    if kind == "hash:net" and entry.endswith("/32"):
+        return entry[:-3]
+    return entry
+
+
+def ipset(state: State, args: list[str]) -> Result:
+    exist = "-exist" in args or "-!" in args
+    words = [a for a in args if a not in ("-exist", "-!")]
+    if not words:
+        return 1, "", IPSET + "No command specified.\n"
+    cmd, rest = words[0], words[1:]
+    sets = state.ipsets
+
+    if cmd in ("save", "list"):
+        names = rest[:1] or list(sets)
+        if any(n not in sets for n in names):
+            return 1, "", IPSET + "The set with the given name does not exist\n"
+        out = []
+        for name in names:
+            kind = sets[name]["type"]
+            if cmd == "save":
+                out.append(f"create {name} {kind} family inet hashsize 1024 maxelem 65536")
+                out += [f"add {name} {member}" for member in sets[name]["members"]]
+            else:
+                out += [f"Name: {name}", f"Type: {kind}",
+                        f"Number of entries: {len(sets[name]['members'])}", "Members:"]
+                out += list(sets[name]["members"])
+        return 0, lines(*out), ""
+
+    if not rest:
+        return 1, "", IPSET + "Missing mandatory argument: setname\n"
+    name = rest[0]
+
+    if cmd in ("create", "-N"):
+        if name in sets:
+            return (0, "", "") if exist else (1, "", IPSET + "Set cannot be created: set with the same name already exists\n")
+        sets[name] = {"type": rest[1], "members": {}}
+        return 0, "", ""
+    if name not in sets:
+        return 1, "", IPSET + "The set with the given name does not exist\n"
+    members = sets[name]["members"]
+
+    if cmd in ("destroy", "-X"):
+        if any(name in other["members"] for other in sets.values()):
+            return 1, "", IPSET + "Set cannot be destroyed: it is in use by a kernel component\n"
+        del sets[name]
+        return 0, "", ""
+    if cmd in ("flush", "-F"):
+        members.clear()
+        return 0, "", ""
+    if len(rest) < 2:
+        return 1, "", IPSET + "Missing mandatory argument: entry\n"
+    member = ipset_member(sets[name]["type"], rest[1])
+    if cmd in ("add", "-A"):
+        if sets[name]["type"] == "list:set" and member not in sets:
+            return 1, "", IPSET + f"Set to be added/deleted/tested as element does not exist.\n"
+        if member in members and not exist:
+            return 1, "", IPSET + "Element cannot be added to the set: it's already added\n"
+        members[member] = None
+        return 0, "", ""
+    if cmd in ("del", "-D"):
+        if member not in members and not exist:
+            return 1, "", IPSET + "Element cannot be deleted from the set: it's not added\n"
+        members.pop(member, None)
+        return 0, "", ""
+    if cmd in ("test", "-T"):
+        if member in members:
+            return 0, "", f"{rest[1]} is in set {name}.\n"
+        return 1, "", IPSET + f"{rest[1]} is NOT in set {name}.\n"
+    return 1, "", IPSET + f"No command specified: unknown argument {cmd}\n"
+
+
+# --- ip ----------------------------------------------------------------------
+
+def link_line(name: str, info: dict, oneline: bool = False) -> str:
+    flags = "BROADCAST,MULTICAST,UP,LOWER_UP" if info["up"] else "BROADCAST,MULTICAST"
+    state = "UP" if info["up"] else "DOWN"
+    head = (f"{info['index']}: {name}: <{flags}> mtu {info['mtu']} qdisc noqueue "
+            f"state {state} mode DEFAULT group default qlen 1000")
+    ether = f"link/ether {info['mac']} brd ff:ff:ff:ff:ff:ff"
+    return f"{head}\\    {ether}" if oneline else f"{head}\n    {ether}"
+
+
+def ip(state: State, args: list[str]) -> Result:
+    oneline = "-o" in args
+    args = [a for a in args if a not in ("-o", "-4", "-br")]
+    if not args:
+        return 0, "", ""
+    obj, rest = args[0], args[1:]
+    verb = rest[0] if rest else "show"
+
+    if obj == "link" and verb == "show":
+        names = rest[1:2] or list(state.interfaces)
+        if any(n not in state.interfaces for n in names):
+            return 1, "", f'Device "{names[0]}" does not exist.\n'
+        return 0, lines(*(link_line(n, state.interfaces[n], oneline) for n in names)), ""
+
+    if obj == "link" and verb == "set":
+        name = rest[1] if len(rest) > 1 else rest[-1]
+        if len(rest) > 2 and rest[1] == "dev":
+            name = rest[2]
+        info = state.interfaces.get(name)
+        if info is None:
+            return 1, "", f'Cannot find device "{name}"\n'
+        if "up" in rest:
+            info["up"] = True
+        if "down" in rest:
+            info["up"] = False
+        if "mtu" in rest:
+            info["mtu"] = int(rest[rest.index("mtu") + 1])
+        return 0, "", ""
+
+    if obj in ("addr", "address", "a"):
+        if verb == "show":
+            names = rest[1:2] or list(state.interfaces)
+            if rest[1:2] == ["dev"]:
+                names = rest[2:3]
+            if any(n not in state.interfaces for n in names):
+                return 1, "", f'Device "{names[0]}" does not exist.\n'
+            out = []
+            for name in names:
+                info = state.interfaces[name]
+                flags = "BROADCAST,MULTICAST,UP,LOWER_UP" if info["up"] else "BROADCAST,MULTICAST"
+                out.append(f"{info['index']}: {name}: <{flags}> mtu {info['mtu']}")
+                if info["cidr"]:
+                    address = info["cidr"].split("/", 1)[0]
+                    broadcast = address.rsplit(".", 1)[0] + ".255"
+                    out.append(f"    inet {info['cidr']} brd {broadcast} scope global {name}")
+            return 0, lines(*out), ""
+        name = rest[rest.index("dev") + 1] if "dev" in rest else None
+        info = state.interfaces.get(name)
+        if info is None:
+            return 1, "", f'Cannot find device "{name}"\n'
+        if verb == "flush":
+            info["cidr"] = None
+        elif verb == "add":
+            info["cidr"] = rest[1]
+        elif verb in ("del", "delete"):
+            if info["cidr"] != rest[1]:
+                return 2, "", "RTNETLINK answers: Cannot assign requested address\n"
+            info["cidr"] = None
+        return 0, "", ""
+
+    if obj == "netns":
+        # Like an unprivileged container: no CAP_SYS_ADMIN for namespaces
+        if verb in ("list", "show"):
+            return 0, "", ""
+        if verb in ("del", "delete") and len(rest) > 1:
+            return 1, "", f'Cannot remove namespace file "/run/netns/{rest[1]}": No such file or directory\n'
+        return 1, "", "mount --make-shared /run/netns failed: Operation not permitted\n"
+
+    return 0, "", ""
+
+
+# --- systemctl -----------------------------------------------------------------
+
+def unit_name(unit: str) -> str:
+    return unit[:-8] if unit.endswith(".service") else unit
+
+
+def systemctl(state: State, args: list[str]) -> Result:
+    now = "--now" in args
+    words = []
+    i = 0
+    while i < len(args):
+        if args[i] in ("-s", "--signal"):
+            i += 2
+            continue
+        if not args[i].startswith("-"):
+            words.append(args[i])
+        i += 1
+    if not words:
+        return 1, "", ""
+
+    cmd, units = words[0], [unit_name(u) for u in words[1:]]
+    if cmd in ("daemon-reload", "unmask", "mask", "reset-failed"):
+        return 0, "", ""
+    if not units:
+        return 1, "", f"Too few arguments.\n"
+
+    active, enabled = state.services_active, state.services_enabled
+
+    if cmd == "is-active":
+        out = ["active" if u in active else "inactive" for u in units]
+        return (0 if all(u in active for u in units) else 3), lines(*out), ""
+    if cmd == "is-enabled":
+        out = ["enabled" if u in enabled else "disabled" for u in units]
+        return (0 if all(u in enabled for u in units) else 1), lines(*out), ""
+    if cmd in ("start", "restart", "reload-or-restart", "try-restart"):
+        if "hostapd" in units and (cmd != "start" or "hostapd" not in active):
+            state.start_hostapd()
+        for unit in units:
+            # <iface>-static-ip runs `ip link set <iface> up`
+            if unit.endswith("-static-ip") and unit[:-10] in state.interfaces:
+                state.interfaces[unit[:-10]]["up"] = True
+        active.update(units)
+        return 0, "", ""
+    if cmd == "reload":
+        if any(u not in active for u in units):
+            return 1, "", f"Job for {units[0]}.service failed because the unit is not active.\n"
+        if "hostapd" in units:
+            # ExecReload sends SIGHUP, which makes hostapd re-read its config file
+            state.reload_hostapd(reread=True)
+        return 0, "", ""
+    if cmd == "stop":
+        if "hostapd" in units:
+            state.drop_stations(forever=True)
+        active.difference_update(units)
+        return 0, "", ""
+    if cmd == "enable":
+        enabled.update(units)
+        if now:
+            if "hostapd" in units and "hostapd" not in active:
+                state.start_hostapd()
+            active.update(units)
+        return 0, "", ""
+    if cmd == "disable":
+        enabled.difference_update(units)
+        if now:
+            if "hostapd" in units:
+                state.drop_stations(forever=True)
+            active.difference_update(units)
+        return 0, "", ""
+    if cmd == "kill":
+        return (0, "", "") if all(u in active for u in units) else (1, "", "")
+    if cmd == "status":
+        out = []
+        for u in units:
+            running = "active (running)" if u in active else "inactive (dead)"
+            out += [f"{u}.service - mocked service", f"   Active: {running}"]
+        return (0 if all(u in active for u in units) else 3), lines(*out), ""
+    return 0, "", ""
+
+
+# --- iw ----------------------------------------------------------------------
+
+STATION_LINES = (
+    ("inactive time", "inactive_ms", "{} ms"),
+    ("rx bytes", "rx_bytes", "{}"),
+    ("tx bytes", "tx_bytes", "{}"),
+    ("tx packets", "tx_packets", "{}"),
+    ("tx retries", "tx_retries", "{}"),
+    ("tx failed", "tx_failed", "{}"),
+    ("signal", "signal", "{0} [{0}] dBm"),
+    ("tx bitrate", "tx_bitrate", "{:.1f} MBit/s"),
+    ("rx bitrate", "rx_bitrate", "{:.1f} MBit/s"),
+    ("connected time", "connected_s", "{} seconds"),
+)
+
+
+def station_block(station: dict) -> list[str]:
+    out = [f"Station {station['mac']} (on {station['interface']})"]
+    for label, key, fmt in STATION_LINES:
+        if station.get(key) is not None:
+            out.append(f"\t{label}:\t{fmt.format(station[key])}")
+    return out
+
+
+def iw(state: State, args: list[str]) -> Result:
+    if args == ["dev"]:
+        out = []
+        for phy, (name, info) in enumerate((n, i) for n, i in state.interfaces.items() if i["wireless"]):
+            out += [f"phy#{phy}", f"\tInterface {name}", f"\t\tifindex {info['index']}",
+                    f"\t\taddr {info['mac']}", "\t\ttype managed"]
+        return 0, lines(*out), ""
+    if len(args) >= 4 and args[0] == "dev" and args[2] == "station":
+        interface = args[1]
+        if interface not in state.interfaces:
+            return 237, "", "command failed: No such device (-19)\n"
+        if args[3] == "dump":
+            out = []
+            for station in state.visible_stations(interface):
+                out += station_block(station)
+            return 0, lines(*out), ""
+        if args[3] == "get" and len(args) > 4:
+            station = state.stations.get(args[4].lower())
+            if station is None or station not in state.visible_stations(interface):
+                return 254, "", "command failed: No such file or directory (-2)\n"
+            return 0, lines(*station_block(station)), ""
+    return 0, "", ""
+
+
+# --- hostapd_cli ---------------------------------------------------------------
+
+NO_CTRL = "Failed to connect to hostapd - wpa_ctrl_open: No such file or directory\n"
+
+
+def hostapd_cli(state: State, args: list[str]) -> Result:
+    interface = None
+    words = []
+    i = 0
+    while i < len(args):
+        if args[i] in ("-i", "-p") and i + 1 < len(args):
+            if args[i] == "-i":
+                interface = args[i + 1]
+            i += 2
+        else:
+            words.append(args[i])
+            i += 1
+
+    running = "hostapd" in state.services_active and "ctrl_interface" in state.hostapd
+    if not running or (interface and interface != state.hostapd.get("interface")):
+        return 255, "", NO_CTRL
+    if not words:
+        return 0, "", ""
+
+    cmd = words[0].lower()
+    if cmd == "ping":
+        return 0, "PONG\n", ""
+    if cmd == "set" and len(words) >= 3:
+        state.hostapd_pending[words[1]] = " ".join(words[2:])
+        return 0, "OK\n", ""
+    if cmd == "reload":
+        state.reload_hostapd()
+        return 0, "OK\n", ""
+    if cmd == "get_config":
+        conf = state.hostapd
+        return 0, lines(f"bssid={state.interfaces.get(conf.get('interface'), {}).get('mac', '')}",
+                        f"ssid={conf.get('ssid', '')}", f"wpa={conf.get('wpa', '0')}",
+                        f"key_mgmt={conf.get('wpa_key_mgmt', '')}"), ""
+    if cmd == "status":
+        conf = state.hostapd
+        count = sum(1 for _ in state.visible_stations(conf.get("interface")))
+        return 0, lines("state=ENABLED", f"channel={conf.get('channel', '')}",
+                        f"ssid[0]={conf.get('ssid', '')}", f"num_sta[0]={count}"), ""
+    if cmd in ("all_sta", "list_sta"):
+        return 0, lines(*(s["mac"] for s in state.visible_stations(state.hostapd.get("interface")))), ""
+    return 0, "UNKNOWN COMMAND\n", ""
+
+
+def sta_info(station: dict) -> str:
+    """A station as hostapd's control interface reports it (STA-FIRST/STA-NEXT)."""
+    fields = [station["mac"], "flags=[AUTH][ASSOC][AUTHORIZED][WMM]"]
+    for key, name in (("rx_bytes", "rx_bytes"), ("tx_bytes", "tx_bytes"), ("tx_packets", "tx_packets"),
+                      ("inactive_ms", "inactive_msec"), ("signal", "signal"), ("connected_s", "connected_time")):
+        if station.get(key) is not None:
+            fields.append(f"{name}={station[key]}")
+    # Rates are in units of 100 kbit/s
+    for key, name in (("rx_bitrate", "rx_rate_info"), ("tx_bitrate", "tx_rate_info")):
+        if station.get(key) is not None:
+            fields.append(f"{name}={round(station[key] * 10)}")
+    return lines(*fields)
+
+
+def hostapd_ctrl(state: State, interface: str, request: str) -> str:
+    """Reply to one request on hostapd's control socket (the protocol hostapd_cli speaks)."""
+    if "hostapd" not in state.services_active or state.hostapd.get("interface") != interface:
+        return "FAIL\n"
+    words = request.split()
+    cmd = words[0].upper() if words else ""
+    if cmd == "PING":
+        return "PONG\n"
+    if cmd in ("STA-FIRST", "STA-NEXT"):
+        stations = list(state.visible_stations(interface))
+        if cmd == "STA-NEXT":
+            macs = [s["mac"] for s in stations]
+            after = words[1].lower() if len(words) > 1 else ""
+            stations = stations[macs.index(after) + 1:] if after in macs else []
+        return sta_info(stations[0]) if stations else ""
+    if cmd == "STATUS":
+        count = sum(1 for _ in state.visible_stations(interface))
+        return lines("state=ENABLED", f"channel={state.hostapd.get('channel', '')}",
+                     f"ssid[0]={state.hostapd.get('ssid', '')}", f"num_sta[0]={count}")
+    return "UNKNOWN COMMAND\n"
+
+
+# --- journalctl ----------------------------------------------------------------
+
+def short_unix(entry: dict) -> str:
+    stamp = int(entry.get("__REALTIME_TIMESTAMP", 0)) / 1_000_000
+    ident = entry.get("SYSLOG_IDENTIFIER", "unknown")
+    return f"{stamp:.6f} sim {ident}[{entry.get('_PID', 1)}]: {entry.get('MESSAGE', '')}"
+
+
+def journalctl(state: State, args: list[str]) -> Result:
+    units: set[str] = set()
+    output, count, after = "short", None, None
+    i = 0
+    while i < len(args):
+        arg, value = args[i], args[i + 1] if i + 1 < len(args) else None
+        if arg == "-u":
+            units.add(value if value.endswith(".service") else f"{value}.service")
+            i += 2
+        elif arg == "-o":
+            output = value
+            i += 2
+        elif arg == "-n":
+            count = int(value)
+            i += 2
+        elif arg == "--after-cursor":
+            after = value
+            i += 2
+        elif arg == "--since":
+            i += 2
+        else:
+            i += 1
+
+    if not len(state.journal) and output == "short":
+        return 0, "mocked journalctl output\n", ""
+
+    entries = state.journal.select(units, after)
+    if after is None and count is not None:
+        entries = entries[-count:] if count else []
+
+    if output == "json":
+        return 0, lines(*(json.dumps(e) for e in entries)), ""
+    if output == "short-unix":
+        return 0, lines(*(short_unix(e) for e in entries)), ""
+    out = []
+    for entry in entries:
+        stamp = datetime.fromtimestamp(int(entry.get("__REALTIME_TIMESTAMP", 0)) / 1_000_000)
+        out.append(f"{stamp:%b %d %H:%M:%S} sim {entry.get('MESSAGE', '')}")
+    return 0, lines(*out), ""
+
+
+# --- dpkg and apt ----------------------------------------------------------------
+
+def deb_filename(name: str) -> str:
+    return f"{name}_{quote(REPOSITORY[name][0], safe='')}_{ARCH}.deb"
+
+
+def dependency_closure(names: list[str], installed: dict[str, str] | None = None) -> list[str]:
+    """What apt's solver installs for names: an OR dependency takes the
+    alternative already installed (or in the set), else the first one."""
+    installed = installed or {}
+    closure, pending = [], list(names)
+    while pending:
+        name = pending.pop(0)
+        if name not in closure:
+            closure.append(name)
+            for dependency in REPOSITORY[name][1]:
+                alternatives = dependency.split(" | ")
+                chosen = next((a for a in alternatives if a in installed or a in closure or a in pending),
+                              alternatives[0])
+                pending.append(chosen)
+    return closure
+
+
+def depends_on(parent: str, name: str) -> bool:
+    return any(name in dependency.split(" | ") for dependency in REPOSITORY[parent][1])
+
+
+def apt_options(args: list[str]) -> tuple[dict[str, str], list[str]]:
+    """Split apt's -o Key=Value options from the other arguments."""
+    options, rest = {}, []
+    i = 0
+    while i < len(args):
+        if args[i] == "-o" and i + 1 < len(args):
+            key, _, value = args[i + 1].partition("=")
+            options[key] = value
+            i += 2
+        else:
+            rest.append(args[i])
+            i += 1
+    return options, rest
+
+
+def read_status(path: Path) -> dict[str, str]:
+    """Installed packages from a dpkg status file (Package/Version stanzas)."""
+    packages, name = {}, None
+    for line in path.read_text().splitlines():
+        if line.startswith("Package: "):
+            name = line.split(": ", 1)[1]
+        elif line.startswith("Version: ") and name:
+            packages[name] = line.split(": ", 1)[1]
+    return packages
+
+
+def dpkg_query(state: State, args: list[str]) -> Result:
+    fmt = "${Package}\t${Version}\n"
+    names = []
+    i = 0
+    while i < len(args):
+        if args[i] in ("-f", "--showformat") and i + 1 < len(args):
+            fmt = args[i + 1]
+            i += 2
+        elif args[i].startswith("--showformat="):
+            fmt = args[i].split("=", 1)[1]
+            i += 1
+        elif args[i].startswith("-"):
+            i += 1
+        else:
+            names.append(args[i])
+            i += 1
+    out, err = [], []
+    for name in names or sorted(state.packages):
+        if name not in state.packages:
+            err.append(f"dpkg-query: no packages found matching {name}")
+            continue
+        fields = {"Package": name, "Version": state.packages[name],
+                  "db:Status-Abbrev": "ii ", "Status": "install ok installed"}
+        line = fmt.replace("\\n", "\n").replace("\\t", "\t")
+        for key, value in fields.items():
+            line = line.replace("${" + key + "}", value)
+        out.append(line)
+    return (1 if err else 0), "".join(out), lines(*err)
+
+
+def compare_versions(a: str, b: str) -> int:
+    """Debian version comparison (epoch, upstream, revision; ~ sorts first): -1, 0 or 1."""
+
+    def parts(version: str) -> tuple[int, str, str]:
+        epoch, _, rest = version.rpartition(":")
+        upstream, _, revision = rest.rpartition("-") if "-" in rest else (rest, "", "0")
+        return int(epoch or 0), upstream, revision
+
+    def order(c: str) -> int:
+        return -1 if c == "~" else ord(c) if c.isalpha() else ord(c) + 256
+
+    def compare(x: str, y: str) -> int:
+        while x or y:
+            xs, ys = re.match(r"\D*", x).group(), re.match(r"\D*", y).group()
+            for i in range(max(len(xs), len(ys))):
+                cx = order(xs[i]) if i < len(xs) else 0
+                cy = order(ys[i]) if i < len(ys) else 0
+                if cx != cy:
+                    return -1 if cx < cy else 1
+            x, y = x[len(xs):], y[len(ys):]
+            xd, yd = re.match(r"\d*", x).group(), re.match(r"\d*", y).group()
+            if int(xd or 0) != int(yd or 0):
+                return -1 if int(xd or 0) < int(yd or 0) else 1
+            x, y = x[len(xd):], y[len(yd):]
+        return 0
+
+    (ea, ua, ra), (eb, ub, rb) = parts(a), parts(b)
+    if ea != eb:
+        return -1 if ea < eb else 1
+    return compare(ua, ub) or compare(ra, rb)
+
+
+VERSION_RELATIONS = {
+    "lt": lambda c: c < 0, "le": lambda c: c <= 0, "eq": lambda c: c == 0,
+    "ne": lambda c: c != 0, "ge": lambda c: c >= 0, "gt": lambda c: c > 0,
+}
+
+
+def dpkg(state: State, args: list[str]) -> Result:
+    if "--print-architecture" in args:
+        return 0, f"{ARCH}\n", ""
+    if args[:1] == ["--compare-versions"] and len(args) == 4 and args[2] in VERSION_RELATIONS:
+        return (0 if VERSION_RELATIONS[args[2]](compare_versions(args[1], args[3])) else 1), "", ""
+    return 0, "", ""
+
+
+def apt_cache(state: State, args: list[str]) -> Result:
+    words = [a for a in args if not a.startswith("-")]
+    if words[:1] != ["depends"]:
+        return 0, "", ""
+    names = words[1:]
+    unknown = [name for name in names if name not in REPOSITORY]
+    if unknown:
+        return 100, "", "E: No packages found\n"
+    # Like apt-cache, --recurse follows every alternative of an OR dependency
+    closure, pending = [], list(names)
+    while pending:
+        name = pending.pop(0)
+        if name not in closure:
+            closure.append(name)
+            if "--recurse" in args:
+                pending += [a for dependency in REPOSITORY[name][1] for a in dependency.split(" | ")]
+    out = []
+    for name in closure:
+        out.append(name)
+        for dependency in REPOSITORY[name][1]:
+            alternatives = dependency.split(" | ")
+            out += [f" |Depends: {a}" for a in alternatives[:-1]] + [f"  Depends: {alternatives[-1]}"]
+    return 0, lines(*out), ""
+
+
+def apt_get(state: State, args: list[str]) -> Result:
+    config, words = apt_options(args)
+    options = {w for w in words if w.startswith("-")}
+    words = [w for w in words if not w.startswith("-")]
+    if not words:
+        return 100, "", "E: Invalid operation\n"
+    verb, items = words[0], words[1:]
+
+    if verb == "update":
+        return 0, "Reading package lists... Done\n", ""
+
+    if verb == "download":
+        for name in items:
+            if name not in REPOSITORY:
+                return 100, "", f"E: Can't select candidate version from package {name} as it has no candidate\n"
+        for name in items:
+            Path(state.cwd, deb_filename(name)).write_bytes(b"!<arch>\n")
+        return 0, lines(*(f"Get:{n} sim {name} {ARCH} {REPOSITORY[name][0]}" for n, name in enumerate(items, 1))), ""
+
+    if verb == "install":
+        local = {}
+        names = []
+        for item in items:
+            if item.endswith(".deb"):
+                path = Path(state.cwd, item)
+                if not path.exists():
+                    return 100, "", f"E: Unsupported file {item} given on commandline\n"
+                local[path.name.split("_")[0]] = unquote(path.name.split("_")[1])
+            elif item not in REPOSITORY:
+                return 100, "", f"E: Unable to locate package {item}\n"
+            else:
+                names.append(item)
+        if "--download-only" in options:
+            # Resolved against Dir::State::status if given, else what is installed
+            status = config.get("Dir::State::status")
+            installed = read_status(Path(state.cwd, status)) if status else state.packages
+            archives = Path(state.cwd, config.get("Dir::Cache::archives", "/var/cache/apt/archives"))
+            if not (archives / "partial").is_dir():
+                return 100, "", f"E: Archives directory {archives}/partial is missing. - Acquire (2: No such file or directory)\n"
+            wanted = [name for name in dependency_closure(names, installed) if name not in installed]
+            for name in wanted:
+                (archives / deb_filename(name)).write_bytes(b"!<arch>\n")
+            return 0, lines(*(f"Get:{n} sim {name} {ARCH} {REPOSITORY[name][0]}"
+                              for n, name in enumerate(wanted, 1)), "Download complete and in download only mode"), ""
+        wanted = dependency_closure(names + list(local), state.packages)
+        # Dependencies are versioned: each needs at least the repository's version
+        # (or the .deb given for it), so an older installed one is upgraded
+        target = {name: local.get(name, REPOSITORY[name][0]) for name in wanted}
+        new = [name for name in wanted
+               if name not in state.packages or compare_versions(state.packages[name], target[name]) < 0]
+        if "--no-download" in options:
+            missing = [name for name in new if name not in local and name not in state.packages]
+            stale = [name for name in new if name not in local and name in state.packages]
+            if missing or stale:
+                return 100, "", lines(
+                    *(f"E: Can't find a source to download version "
+                      f"'{REPOSITORY[name][0]}' of '{name}:{ARCH}'" for name in missing),
+                    *(f" {parent} : Depends: {name} (>= {REPOSITORY[name][0]}) but {state.packages[name]} "
+                      f"is to be installed" for name in stale
+                      for parent in wanted if depends_on(parent, name)),
+                    *(["E: Unable to correct problems, you have held broken packages."] if stale else []),
+                )
+        for name in new:
+            state.packages[name] = target[name]
+        return 0, lines(*(f"Setting up {name} ({state.packages[name]}) ..." for name in new)), ""
+
+    return 100, "", f"E: Invalid operation {verb}\n"
+
+
+# --- small tools ---------------------------------------------------------------
+
+def sysctl(state: State, args: list[str]) -> Result:
+    names_only = "-n" in args
+    words = [a for a in args if not a.startswith("-")]
+    out = []
+    for word in words:
+        if "=" in word:
+            key, value = word.split("=", 1)
+            state.sysctl[key] = value
+            out.append(f"{key} = {value}")
+        elif word in state.sysctl:
+            out.append(state.sysctl[word] if names_only else f"{word} = {state.sysctl[word]}")
+        else:
+            return 255, "", f"sysctl: cannot stat /proc/sys/{word.replace('.', '/')}: No such file or directory\n"
+    return 0, lines(*out), ""
+
+
+def netfilter_persistent(state: State, args: list[str]) -> Result:
+    if args[:1] == ["save"]:
+        state.saves.append(" ".join(args))
+    return 0, "", ""
+
+
+def nmcli(state: State, args: list[str]) -> Result:
+    words = [a for a in args if not a.startswith("-")]
+    if "-f" in args:
+        words.remove(args[args.index("-f") + 1])
+    if words[:1] != ["device"]:
+        return 0, "", ""
+    try:
+        conf = NM_CONF.read_text()
+    except OSError:
+        conf = ""
+    unmanaged = {value.split(":", 1)[-1] for line in conf.splitlines()
+                 if line.startswith("unmanaged-devices=")
+                 for value in line.split("=", 1)[1].split(";")}
+    out = []
+    for name, info in state.interfaces.items():
+        if name in unmanaged:
+            status = "unmanaged"
+        else:
+            status = "connected" if info["up"] and info["cidr"] else "disconnected"
+        out.append(f"{name}:{status}")
+    return 0, lines(*out), ""
+
+
+def ping(state: State, args: list[str]) -> Result:
+    """Only what the path MTU probe needs: -M do -s SIZE -I IFACE HOST."""
+    size, interface, df = 56, None, False
+    words = []
+    i = 0
+    while i < len(args):
+        arg, value = args[i], args[i + 1] if i + 1 < len(args) else None
+        if arg in ("-s", "-I", "-M", "-c", "-W"):
+            if arg == "-s":
+                size = int(value)
+            elif arg == "-I":
+                interface = value
+            elif arg == "-M":
+                df = value == "do"
+            i += 2
+        else:
+            words.append(arg)
+            i += 1
+    host = words[-1] if words else ""
+    info = state.interfaces.get(interface) if interface else next(iter(state.interfaces.values()))
+    if info is None:
+        return 2, "", f"ping: SO_BINDTODEVICE {interface}: No such device\n"
+    if not info["up"] or not info["cidr"]:
+        return 2, "", "ping: connect: Network is unreachable\n"
+    packet = size + 28
+    header = f"PING {host} ({host}) {size}({packet}) bytes of data.\n"
+    if df and packet > info["mtu"]:
+        return 1, header, f"ping: local error: message too long, mtu={info['mtu']}\n"
+    path_mtu = info.get("path_mtu") or info["mtu"]
+    if df and packet > path_mtu:
+        return 1, header + f"From {host} icmp_seq=1 Frag needed and DF set (mtu = {path_mtu})\n", ""
+    return 0, header + f"{packet - 20} bytes from {host}: icmp_seq=1 ttl=57 time=12.3 ms\n", ""
+
+
+def noop(state: State, args: list[str]) -> Result:
+    return 0, "", ""
+
+
+HANDLERS = {
+    "iptables": iptables,
+    "ipset": ipset,
+    "ip": ip,
+    "systemctl": systemctl,
+    "iw": iw,
+    "hostapd_cli": hostapd_cli,
+    "journalctl": journalctl,
+    "sysctl": sysctl,
+    "netfilter-persistent": netfilter_persistent,
+    "nmcli": nmcli,
+    "ping": ping,
+    "dpkg": dpkg,
+    "dpkg-query": dpkg_query,
+    "apt-get": apt_get,
+    "apt-cache": apt_cache,
+    "rfkill": noop,
+}
@@ -0,0 +1,139 @@
+"""Generators that populate the simulator with a loaded AP's worth of state.
+
+All generators are deterministic for a given seed so benchmark runs are
+comparable.
+"""
+import random
+import time
+
+from .state import State
+
+
+def mac(i: int, prefix: str = "02:00") -> str:
+    return prefix + ":" + ":".join(f"{(i >> shift) & 0xff:02x}" for shift in (24, 16, 8, 0))
+
+
+def client_ip(i: int) -> str:
+    return f"192.168.{31 + i // 250}.{10 + i % 250}"
+
+
+def stations(state: State, count: int, interface: str = "wlan1", seed: int = 0,
+             replace: bool = True) -> None:
+    """Associated stations with a spread of signal levels and bitrates."""
+    rand = random.Random(seed)
+    generated = []
+    for i in range(count):
+        signal = rand.randint(-85, -35)
+        # Weaker stations negotiate lower rates and retry more
+        rate = max(6.5, min(433.3, (signal + 95) * rand.uniform(4.0, 7.0)))
+        tx_packets = rand.randint(1_000, 1_000_000)
+        generated.append({
+            "mac": mac(i),
+            "interface": interface,
+            "inactive_ms": rand.randint(0, 5000),
+            "rx_bytes": rand.randint(10_000, 500_000_000),
+            "tx_bytes": rand.randint(10_000, 2_000_000_000),
+            "tx_packets": tx_packets,
+            "tx_retries": int(tx_packets * rand.uniform(0.0, 0.3 if signal < -70 else 0.05)),
+            "tx_failed": rand.randint(0, 50),
+            "signal": signal,
+            "tx_bitrate": round(rate, 1),
+            "rx_bitrate": round(rate * rand.uniform(0.7, 1.0), 1),
+            "connected_s": rand.randint(1, 86_400),
+        })
+    if replace:
+        state.stations = {}
+    state.stations.update({s["mac"]: s for s in generated})
+
+
+def leases(state: State, count: int, seed: int = 0, lifetime: int = 43_200) -> None:
+    """DHCP leases matching the generated stations' MACs (written to the lease file)."""
+    rand = random.Random(seed)
+    now = int(time.time())
+    state.set_leases([
+        {
+            "mac": mac(i),
+            "ip": client_ip(i),
+            "hostname": f"client-{i}" if rand.random() < 0.8 else "",
+            "expiry": now + rand.randint(60, lifetime),
+        }
+        for i in range(count)
+    ])
+
+
+def interfaces(state: State, count: int, prefix: str = "eth", start: int = 1,
+               wireless: bool = False) -> list[str]:
+    """Extra interfaces named <prefix><n>, each with its own /24."""
+    names = []
+    for n in range(start, start + count):
+        name = f"{prefix}{n}"
+        if name not in state.interfaces:
+            state.add_interface(name, cidr=f"10.{n // 256}.{n % 256}.1/24", wireless=wireless)
+        names.append(name)
+    return names
+
+
+# The client block list sets, as `pi-bridge clients block` creates them
+BLOCK_SETS = {"pi-bridge-block-mac": "hash:mac", "pi-bridge-block-net": "hash:net",
+              "pi-bridge-allow": "hash:mac", "pi-bridge-block": "list:set"}
+
+
+def nat_rules(state: State, wan: str, ap: str = "wlan1") -> None:
+    """forwarding.nat_rules() for a WAN: the block rule goes on top, like ensure_nat_rules() puts it."""
+    for name, kind in BLOCK_SETS.items():
+        state.ipsets.setdefault(name, {"type": kind, "members": {}})
+    state.ipsets["pi-bridge-block"]["members"].update(dict.fromkeys(["pi-bridge-block-mac", "pi-bridge-block-net"]))
+    state.iptables["nat"]["POSTROUTING"][f"-o {wan} -j MASQUERADE"] = None
+    forward = state.iptables["filter"]["FORWARD"]
+    forward[f"-i {wan} -o {ap} -m state --state RELATED,ESTABLISHED -j ACCEPT"] = None
+    forward[f"-i {ap} -o {wan} -j ACCEPT"] = None
+    block = f"-i {ap} -o {wan} -m set --match-set pi-bridge-block src -j DROP"
+    state.iptables["filter"]["FORWARD"] = {block: None, **forward}
+
+
+def wans(state: State, count: int, ap: str = "wlan1") -> list[str]:
+    """WAN interfaces with NAT forwarding rules, as `pi-bridge forwarding add` makes."""
+    names = interfaces(state, count, prefix="wan")
+    for name in names:
+        nat_rules(state, name, ap)
+    return names
+
+
+def rules(state: State, count: int, table: str = "filter", chain: str = "INPUT") -> None:
+    """Unrelated rules, e.g. a large blocklist loaded by another tool."""
+    target = state.iptables[table].setdefault(chain, {})
+    for i in range(count):
+        target[f"-s 10.{i >> 16 & 0xff}.{i >> 8 & 0xff}.{i & 0xff}/32 -j DROP"] = None
+
+
+def journal(state: State, count: int, start: float | None = None, interval: float = 30.0,
+            seed: int = 0) -> None:
+    """hostapd/dnsmasq session traffic: connects, DHCP, disconnects."""
+    rand = random.Random(seed)
+    when = start if start is not None else time.time() - count * interval
+    for i in range(count):
+        client = rand.randrange(max(1, count // 4))
+        kind = rand.random()
+        if kind < 0.4:
+            unit, message = "hostapd", f"wlan1: AP-STA-CONNECTED {mac(client)}"
+        elif kind < 0.8:
+            unit, message = "dnsmasq", f"DHCPACK(wlan1) {client_ip(client)} {mac(client)} client-{client}"
+        else:
+            unit, message = "hostapd", f"wlan1: AP-STA-DISCONNECTED {mac(client)}"
+        state.journal.add({
+            "_SYSTEMD_UNIT": f"{unit}.service",
+            "SYSLOG_IDENTIFIER": unit,
+            "__REALTIME_TIMESTAMP": str(int(when * 1_000_000)),
+            "MESSAGE": message,
+        })
+        when += interval
+
+
+GENERATORS = {
+    "stations": stations,
+    "leases": leases,
+    "interfaces": interfaces,
+    "wans": wans,
+    "rules": rules,
+    "journal": journal,
+}
@@ -0,0 +1,262 @@
+"""Simulator daemon: holds the state and serves stub calls over a Unix socket.
+
+Protocol: the client sends one JSON object per connection and reads one
+JSON object back.
+
+  {"argv": ["iptables", "-t", "nat", "-S"], "cwd": "/root"}
+      -> {"returncode": 0, "stdout": "...", "stderr": ""}
+  {"admin": "generate", "kind": "stations", "count": 300}
+      -> {"ok": true, ...}
+
+Started on demand by the first stub call (see client.py) and exits after
+an idle period.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+import traceback
+
+from . import generators
+from .commands import HANDLERS, hostapd_ctrl
+from .state import REPOSITORY, Fault, Journal, State
+
+SOCKET = os.environ.get("PI_BRIDGE_SIM_SOCKET", "/tmp/pi-bridge-sim.sock")
+IDLE_TIMEOUT = float(os.environ.get("PI_BRIDGE_SIM_IDLE_TIMEOUT", "1800"))
+
+
+class ControlSocket:
+    """hostapd's control socket (ctrl_interface/<iface>), open while simulated hostapd runs on it."""
+
+    def __init__(self, simulator: "Simulator", directory: str, interface: str):
+        self.simulator = simulator
+        self.interface = interface
+        self.path = os.path.join(directory, interface)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.settimeout(0.2)
+        self.running = True
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self) -> None:
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with self.simulator.lock:
+                self.simulator.last_activity = time.monotonic()
+                state = self.simulator.state
+                state.calls["hostapd-ctrl"] = state.calls.get("hostapd-ctrl", 0) + 1
+                reply = hostapd_ctrl(state, self.interface, data.decode(errors="replace"))
+            try:
+                self.sock.sendto(reply.encode(), address)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self.running = False
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class Simulator:
+    def __init__(self, seed: int | None = None):
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.rand = random.Random(seed)
+        self.state = State()
+        self.last_activity = time.monotonic()
+        self.server = None
+        self.control: ControlSocket | None = None
+
+    def sync_control(self) -> None:
+        """Open or close the control socket to match hostapd's state. Called with the lock held."""
+        state = self.state
+        # Plain path or the DIR=<path> GROUP=<group> form
+        directory = state.hostapd.get("ctrl_interface", "")
+        match = re.search(r"(?:^|\s)DIR=(\S+)", directory)
+        directory = match.group(1) if match else directory.strip()
+        interface = state.hostapd.get("interface")
+        wanted = "hostapd" in state.services_active and directory and interface
+        if self.control and (not wanted or self.control.path != os.path.join(directory, interface)):
+            self.control.close()
+            self.control = None
+        if wanted and self.control is None:
+            try:
+                self.control = ControlSocket(self, directory, interface)
+            except OSError:
+                pass
+
+    def execute(self, argv: list[str], cwd: str = "/") -> dict:
+        command, args = os.path.basename(argv[0]), argv[1:]
+        with self.lock:
+            state = self.state
+            state.cwd = cwd
+            state.calls[command] = state.calls.get(command, 0) + 1
+            delay = state.delay(command, self.rand)
+            fault = state.take_fault(command, args, self.rand)
+            if fault is not None:
+                returncode, stdout, stderr = fault.returncode, "", fault.stderr + "\n"
+            elif command not in HANDLERS:
+                returncode, stdout, stderr = 127, "", f"{command}: not simulated\n"
+            else:
+                try:
+                    returncode, stdout, stderr = HANDLERS[command](state, args)
+                except Exception:
+                    returncode, stdout, stderr = 1, "", traceback.format_exc()
+                if command == "systemctl":
+                    self.sync_control()
+        # Latency is served outside the lock so concurrent calls overlap
+        if delay:
+            time.sleep(delay)
+        return {"returncode": returncode, "stdout": stdout, "stderr": stderr}
+
+    def admin(self, request: dict) -> dict:
+        op = request.pop("admin")
+        with self.lock:
+            state = self.state
+            if op == "ping":
+                return {"ok": True, "pid": os.getpid()}
+            if op == "reset":
+                self.state = State()
+                self.sync_control()
+                self.rand = random.Random(self.seed)
+                self.state.write_leases()
+                return {"ok": True}
+            if op == "state":
+                return {"ok": True, "state": state.summary()}
+            if op == "generate":
+                kind = request.pop("kind")
+                if kind not in generators.GENERATORS:
+                    return {"error": f"unknown generator: {kind}"}
+                result = generators.GENERATORS[kind](state, **request)
+                return {"ok": True, "result": result}
+            if op == "stations":
+                state.set_stations(request["stations"])
+                return {"ok": True}
+            if op == "iptables":
+                state.set_iptables(request["tables"])
+                return {"ok": True}
+            if op == "link":
+                info = state.interfaces[request.pop("name")]
+                info.update(request)
+                return {"ok": True, "link": info}
+            if op == "packages":
+                # A list of names (at the repository's version) or {name: version}
+                installed = request["installed"]
+                if isinstance(installed, list):
+                    installed = {name: REPOSITORY[name][0] for name in installed}
+                state.packages = dict(installed)
+                return {"ok": True}
+            if op == "leases":
+                state.set_leases(request["leases"])
+                return {"ok": True}
+            if op == "journal":
+                for record in request.get("records", []):
+                    state.journal.add(record)
+                return {"ok": True, "size": len(state.journal)}
+            if op == "latency":
+                state.latency[request["command"]] = (float(request.get("ms", 0)),
+                                                     float(request.get("jitter", 0)))
+                return {"ok": True}
+            if op == "fault":
+                state.faults.append(Fault(**request))
+                return {"ok": True}
+            if op == "clear":
+                what = request.get("what", "faults")
+                if what in ("faults", "all"):
+                    state.faults.clear()
+                if what in ("latency", "all"):
+                    state.latency.clear()
+                if what in ("calls", "all"):
+                    state.calls.clear()
+                if what == "journal":
+                    state.journal = Journal()
+                return {"ok": True}
+            if op == "saves":
+                return {"ok": True, "saves": len(state.saves)}
+            if op == "calls":
+                return {"ok": True, "calls": dict(state.calls)}
+            if op == "stop":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return {"ok": True}
+        return {"error": f"unknown admin operation: {op}"}
+
+    def handle(self, request: dict) -> dict:
+        self.last_activity = time.monotonic()
+        if "argv" in request:
+            return self.execute(request["argv"], request.get("cwd", "/"))
+        if "admin" in request:
+            try:
+                return self.admin(request)
+            except (KeyError, TypeError, ValueError) as e:
+                return {"error": f"bad request: {e}"}
+        return {"error": "expected 'argv' or 'admin'"}
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            response = {"error": "invalid JSON"}
+        else:
+            response = self.server.simulator.handle(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def stop_when_idle(simulator: Simulator, idle_timeout: float) -> None:
+    while True:
+        time.sleep(min(5.0, idle_timeout))
+        if time.monotonic() - simulator.last_activity > idle_timeout:
+            simulator.server.shutdown()
+            return
+
+
+def serve(socket_path: str, idle_timeout: float, seed: int | None = None) -> None:
+    simulator = Simulator(seed)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with Server(socket_path, Handler) as server:
+        os.chmod(socket_path, 0o666)
+        server.simulator = simulator
+        simulator.server = server
+        if idle_timeout > 0:
+            threading.Thread(target=stop_when_idle, args=(simulator, idle_timeout), daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            if simulator.control:
+                simulator.control.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pi-bridge system simulator daemon")
+    parser.add_argument("--socket", default=SOCKET, help=f"Unix socket path (default: {SOCKET})")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="Exit after this many idle seconds; 0 to never exit")
+    parser.add_argument("--seed", type=int, help="Seed for latency jitter and fault probability")
+    args = parser.parse_args()
+    serve(args.socket, args.idle_timeout, args.seed)
+
+
+if __name__ == "__main__":
+    main()
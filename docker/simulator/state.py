@@ -0,0 +1,276 @@
+"""In-memory system state shared by every stubbed command.
+
+Everything a stub needs is indexed so that a call costs the same with a
+handful of objects as with thousands: iptables chains are ordered dicts
+keyed by rule spec, stations and leases are keyed by MAC, and the journal
+keeps per-unit indexes sorted by timestamp.
+"""
+import bisect
+import os
+import random
+import time
+from pathlib import Path
+
+LEASE_FILE = Path(os.environ.get("PI_BRIDGE_SIM_LEASES", "/var/lib/misc/dnsmasq.leases"))
+HOSTAPD_CONF = Path(os.environ.get("PI_BRIDGE_SIM_HOSTAPD_CONF", "/etc/hostapd/hostapd.conf"))
+NM_CONF = Path(os.environ.get("PI_BRIDGE_SIM_NM_CONF", "/etc/NetworkManager/NetworkManager.conf"))
+
+# Seconds a station takes to find the AP again after hostapd drops it
+REASSOC_DELAY = (0.5, 3.0)
+# Extra seconds a restart keeps the AP down (process start, driver and channel setup)
+RESTART_DELAY = 1.5
+
+BUILTIN_CHAINS = {
+    "filter": ("INPUT", "FORWARD", "OUTPUT"),
+    "nat": ("PREROUTING", "INPUT", "OUTPUT", "POSTROUTING"),
+    "mangle": ("PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING"),
+    "raw": ("PREROUTING", "OUTPUT"),
+}
+
+# The apt repository: package -> (version, dependencies); "a | b" is an OR dependency
+REPOSITORY = {
+    "firmware-iwlwifi": ("20230210-5", []),
+    "firmware-realtek": ("20230210-5", []),
+    "hostapd": ("2:2.10-12", ["libc6", "libnl-3-200", "libnl-genl-3-200", "libssl3"]),
+    "dnsmasq": ("2.89-1", ["dnsmasq-base | dnsmasq-base-lua", "netbase"]),
+    "dnsmasq-base": ("2.89-1", ["libc6", "libnetfilter-conntrack3"]),
+    "dnsmasq-base-lua": ("2.89-1", ["libc6", "libnetfilter-conntrack3", "liblua5.4-0"]),
+    "liblua5.4-0": ("5.4.4-3", ["libc6"]),
+    "iptables-persistent": ("1.0.20", ["netfilter-persistent", "iptables"]),
+    "netfilter-persistent": ("1.0.20", ["lsb-base"]),
+    "ipset": ("7.17-1", ["libc6", "libipset13"]),
+    "ipset-persistent": ("1.0.20", ["ipset", "netfilter-persistent"]),
+    "iptables": ("1.8.9-2", ["libc6", "libxtables12"]),
+    "libnl-3-200": ("3.7.0-0.2", ["libc6"]),
+    "libnl-genl-3-200": ("3.7.0-0.2", ["libc6", "libnl-3-200"]),
+    "libnetfilter-conntrack3": ("1.0.9-3", ["libc6"]),
+    "libipset13": ("7.17-1", ["libc6"]),
+    "libxtables12": ("1.8.9-2", ["libc6"]),
+    "libssl3": ("3.0.11-1", ["libc6"]),
+    "lsb-base": ("11.6", []),
+    "netbase": ("6.4", []),
+    "libc6": ("2.36-9", []),
+}
+# Installed on a fresh Raspberry Pi OS Lite image
+BASE_PACKAGES = ("libc6", "libssl3", "iptables", "libxtables12", "netbase", "lsb-base")
+ARCH = "arm64"
+
+DEFAULT_INTERFACES = {
+    "eth0": {"cidr": "192.168.1.100/24", "wireless": False},
+    "usb0": {"cidr": None, "wireless": False},
+    "wlan0": {"cidr": "192.168.31.4/24", "wireless": True},
+    "wlan1": {"cidr": "192.168.31.4/24", "wireless": True},
+}
+
+
+class Journal:
+    """Journal records ordered by realtime timestamp, indexed by unit."""
+
+    def __init__(self):
+        self.entries: list[tuple[int, int, dict]] = []
+        self.by_unit: dict[str, list[tuple[int, int, dict]]] = {}
+        self.cursors: dict[str, tuple[int, int]] = {}
+        self.seq = 0
+
+    def add(self, record: dict) -> None:
+        self.seq += 1
+        stamp = int(record.get("__REALTIME_TIMESTAMP", 0))
+        record.setdefault("__CURSOR", f"s=sim;i={self.seq:x}")
+        item = (stamp, self.seq, record)
+        bisect.insort(self.entries, item, key=lambda e: (e[0], e[1]))
+        # Like `journalctl -u`, a unit matches its own messages and systemd's about it
+        for unit in {record.get("_SYSTEMD_UNIT", ""), record.get("UNIT", "")} - {""} or {""}:
+            bisect.insort(self.by_unit.setdefault(unit, []), item, key=lambda e: (e[0], e[1]))
+        self.cursors[record["__CURSOR"]] = (stamp, self.seq)
+
+    def select(self, units: set[str], after: str | None = None) -> list[dict]:
+        if units:
+            merged = sorted(
+                (item for unit in units for item in self.by_unit.get(unit, [])),
+                key=lambda e: (e[0], e[1]),
+            )
+        else:
+            merged = self.entries
+        if after in self.cursors:
+            position = bisect.bisect_right(merged, self.cursors[after], key=lambda e: (e[0], e[1]))
+            merged = merged[position:]
+        return [record for _, _, record in merged]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class Fault:
+    """Make matching calls fail instead of running."""
+
+    def __init__(self, command: str, match: str = "", returncode: int = 1, stderr: str = "",
+                 count: int | None = None, probability: float = 1.0):
+        self.command = command
+        self.match = match
+        self.returncode = returncode
+        self.stderr = stderr or f"{command}: injected failure"
+        self.count = count
+        self.probability = probability
+
+    def as_dict(self) -> dict:
+        return {"command": self.command, "match": self.match, "returncode": self.returncode,
+                "stderr": self.stderr, "count": self.count, "probability": self.probability}
+
+
+class State:
+    def __init__(self):
+        self.services_active: set[str] = set()
+        self.services_enabled: set[str] = set()
+        self.iptables: dict[str, dict[str, dict[str, None]]] = {
+            table: {chain: {} for chain in chains} for table, chains in BUILTIN_CHAINS.items()
+        }
+        self.ipsets: dict[str, dict] = {}
+        self.interfaces: dict[str, dict] = {}
+        for name, info in DEFAULT_INTERFACES.items():
+            self.add_interface(name, **info)
+        self.stations: dict[str, dict] = {}
+        self.hostapd: dict[str, str] = {}
+        self.hostapd_pending: dict[str, str] = {}
+        self.reloads = 0
+        self.rand = random.Random(0)
+        self.leases: dict[str, dict] = {}
+        self.journal = Journal()
+        self.sysctl: dict[str, str] = {"net.ipv4.ip_forward": "0"}
+        self.packages: dict[str, str] = {name: REPOSITORY[name][0] for name in BASE_PACKAGES}
+        self.cwd = "/"
+        self.saves: list[str] = []
+        self.latency: dict[str, tuple[float, float]] = {}
+        self.faults: list[Fault] = []
+        self.calls: dict[str, int] = {}
+
+    # --- interfaces ---------------------------------------------------------
+
+    def add_interface(self, name: str, cidr: str | None = None, wireless: bool = False,
+                      mtu: int = 1500) -> None:
+        index = len(self.interfaces) + 2
+        self.interfaces[name] = {
+            "index": index,
+            "cidr": cidr,
+            "wireless": wireless,
+            "mtu": mtu,
+            "up": True,
+            "mac": f"00:11:22:33:{index >> 8 & 0xff:02x}:{index & 0xff:02x}",
+        }
+
+    # --- iptables -----------------------------------------------------------
+
+    def table(self, name: str) -> dict[str, dict[str, None]] | None:
+        return self.iptables.get(name)
+
+    def set_iptables(self, tables: dict[str, dict[str, list[str]]]) -> None:
+        """Replace the ruleset, e.g. with one saved from summary()."""
+        self.iptables = {
+            table: {chain: {} for chain in chains} for table, chains in BUILTIN_CHAINS.items()
+        }
+        for table, chains in tables.items():
+            for chain, rules in chains.items():
+                self.iptables.setdefault(table, {})[chain] = dict.fromkeys(rules)
+
+    # --- stations and leases ------------------------------------------------
+
+    def set_stations(self, stations: list[dict]) -> None:
+        self.stations = {s["mac"].lower(): s for s in stations}
+
+    def visible_stations(self, interface: str):
+        now = time.monotonic()
+        for station in self.stations.values():
+            if station["interface"] == interface and station.get("away_until", 0) <= now:
+                yield station
+
+    def drop_stations(self, interface: str | None = None, forever: bool = False, down: float = 0.0) -> None:
+        """Disassociate stations; they come back `down` seconds plus REASSOC_DELAY later unless forever."""
+        now = time.monotonic() + down
+        for station in self.stations.values():
+            if interface is None or station["interface"] == interface:
+                station["away_until"] = float("inf") if forever else now + self.rand.uniform(*REASSOC_DELAY)
+
+    # --- hostapd ------------------------------------------------------------
+
+    def read_hostapd_conf(self) -> None:
+        try:
+            content = HOSTAPD_CONF.read_text()
+        except OSError:
+            content = ""
+        self.hostapd = dict(line.split("=", 1) for line in content.splitlines()
+                            if "=" in line and not line.startswith("#"))
+        self.hostapd_pending = {}
+
+    def start_hostapd(self) -> None:
+        """(Re)start hostapd on hostapd.conf; the AP is down for RESTART_DELAY."""
+        self.read_hostapd_conf()
+        self.drop_stations(down=RESTART_DELAY)
+
+    def reload_hostapd(self, reread: bool = False) -> None:
+        """Apply SET values (RELOAD), or re-read hostapd.conf (SIGHUP) when reread.
+
+        As in hostapd, a reload flushes every station on the BSS, so all of
+        them reassociate; the radio stays up, so that's quicker than a restart.
+        """
+        if reread:
+            self.read_hostapd_conf()
+        else:
+            self.hostapd.update(self.hostapd_pending)
+            self.hostapd_pending = {}
+        self.reloads += 1
+        self.drop_stations(self.hostapd.get("interface"))
+
+    def set_leases(self, leases: list[dict]) -> None:
+        self.leases = {lease["mac"].lower(): lease for lease in leases}
+        self.write_leases()
+
+    def write_leases(self) -> None:
+        lines = [
+            f"{lease['expiry']} {mac} {lease['ip']} {lease.get('hostname') or '*'} *"
+            for mac, lease in self.leases.items()
+        ]
+        try:
+            LEASE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            LEASE_FILE.write_text("".join(f"{line}\n" for line in lines))
+        except OSError:
+            pass
+
+    # --- fault and latency injection ----------------------------------------
+
+    def take_fault(self, command: str, argv: list[str], rand) -> Fault | None:
+        line = " ".join(argv)
+        for fault in self.faults:
+            if fault.command not in (command, "*") or fault.match not in line:
+                continue
+            if fault.probability < 1.0 and rand.random() >= fault.probability:
+                continue
+            if fault.count is not None:
+                fault.count -= 1
+                if fault.count <= 0:
+                    self.faults.remove(fault)
+            return fault
+        return None
+
+    def delay(self, command: str, rand) -> float:
+        base, jitter = self.latency.get(command) or self.latency.get("*") or (0.0, 0.0)
+        return max(0.0, base + (rand.uniform(-jitter, jitter) if jitter else 0.0)) / 1000
+
+    def summary(self) -> dict:
+        return {
+            "services": {"active": sorted(self.services_active),
+                         "enabled": sorted(self.services_enabled)},
+            "iptables": {table: {chain: list(rules) for chain, rules in chains.items()}
+                         for table, chains in self.iptables.items()},
+            "interfaces": self.interfaces,
+            "ipsets": {name: {"type": ipset["type"], "members": list(ipset["members"])}
+                       for name, ipset in self.ipsets.items()},
+            "stations": len(self.stations),
+            "hostapd": {"ssid": self.hostapd.get("ssid"), "reloads": self.reloads, "config": self.hostapd},
+            "leases": len(self.leases),
+            "journal": len(self.journal),
+            "sysctl": self.sysctl,
+            "packages": self.packages,
+            "saves": len(self.saves),
+            "latency": {k: list(v) for k, v in self.latency.items()},
+            "faults": [f.as_dict() for f in self.faults],
+            "calls": self.calls,
+        }
@@ -16,6 +16,9 @@ echo "Setting up pi-bridge CLI..."
 # Make bin scripts executable
 chmod +x "$BIN_DIR/pi-bridge"
 
+# Precompile the CLI so commands don't compile bytecode on first run
+python3 -m compileall -q "$SCRIPT_DIR/cli" > /dev/null || true
+
 # Detect shell config file
 if [ -n "$ZSH_VERSION" ]; then
     SHELL_RC="$HOME/.zshrc"
@@ -9,19 +9,27 @@ APT_WAIT_INTERVAL="${APT_WAIT_INTERVAL:-5}"
 
 run_apt_with_lock_retry() {
     local elapsed=0
+    local errors
+    errors=$(mktemp)
 
     while true; do
-        if "$@"; then
+        local rc=0
+        "$@" 2> "$errors" || rc=$?
+        cat "$errors" >&2
+        if [ "$rc" -eq 0 ]; then
+            rm -f "$errors"
             return 0
         fi
 
-        local rc=$?
-        if [ "$rc" -ne 100 ]; then
+        # apt exits 100 on any error; only a held lock is worth waiting for
+        if [ "$rc" -ne 100 ] || ! grep -q "lock" "$errors"; then
+            rm -f "$errors"
             return "$rc"
         fi
 
         if [ "$elapsed" -ge "$APT_WAIT_TIMEOUT" ]; then
             echo "Timed out waiting for apt lock after ${APT_WAIT_TIMEOUT}s." >&2
+            rm -f "$errors"
             return "$rc"
         fi
 
@@ -31,21 +39,86 @@ run_apt_with_lock_retry() {
     done
 }
 
-echo "Installing required packages..."
-run_apt_with_lock_retry sudo apt-get update
+installed_packages() {
+    # One dpkg-query for the whole list; unknown packages just aren't printed
+    installed_versions "$@" | awk '{ print $1 }'
+}
+
+installed_versions() {
+    # "<package> <version>" for each installed package in the list
+    dpkg-query -W -f '${db:Status-Abbrev} ${Package} ${Version}\n' "$@" 2>/dev/null |
+        awk '$1 == "ii" { print $2, $3 }' || true
+}
 
 if [ "$WIFI_CHIPSET" = "intel" ]; then
-    echo "Installing Intel WiFi firmware..."
-    run_apt_with_lock_retry sudo apt-get install -y firmware-iwlwifi
+    FIRMWARE_PACKAGE=firmware-iwlwifi
 elif [ "$WIFI_CHIPSET" = "realtek" ]; then
-    echo "Installing Realtek WiFi firmware..."
-    run_apt_with_lock_retry sudo apt-get install -y firmware-realtek
+    FIRMWARE_PACKAGE=firmware-realtek
 else
     echo "Unknown chipset: $WIFI_CHIPSET" >&2
     exit 1
 fi
+PACKAGES="$FIRMWARE_PACKAGE hostapd dnsmasq iptables-persistent ipset ipset-persistent"
+
+if [ "${1:-}" = "--list" ]; then
+    echo "$PACKAGES"
+    exit 0
+fi
+
+INSTALLED=$(installed_packages $PACKAGES)
+MISSING=""
+for package in $PACKAGES; do
+    if ! echo "$INSTALLED" | grep -qx "$package"; then
+        MISSING="$MISSING $package"
+    fi
+done
+
+if [ -z "$MISSING" ]; then
+    echo "All required packages are already installed."
+    exit 0
+fi
+echo "Missing packages:$MISSING"
+
+if [ -n "$PACKAGE_BUNDLE" ]; then
+    # Offline install from a bundle made by `pi-bridge install-deps --bundle-create`
+    BUNDLE_DIR=$(mktemp -d)
+    trap 'rm -rf "$BUNDLE_DIR"' EXIT
+    tar -xzf "$PACKAGE_BUNDLE" -C "$BUNDLE_DIR"
+
+    HEADER=$(head -n 1 "$BUNDLE_DIR/manifest")
+    ARCH=$(dpkg --print-architecture)
+    case "$HEADER" in
+        *" chipset=$WIFI_CHIPSET arch=$ARCH") ;;
+        *)
+            echo "Bundle does not match this system (chipset=$WIFI_CHIPSET arch=$ARCH): $HEADER" >&2
+            exit 1
+            ;;
+    esac
+
+    # The .debs for packages that are missing or older than the bundled version.
+    # Packages installed at that version or newer are left alone, so apt neither
+    # reinstalls nor downgrades them.
+    declare -A INSTALLED_VERSION
+    while read -r package version; do
+        INSTALLED_VERSION[$package]=$version
+    done < <(installed_versions $(awk '!/^#/ { print $1 }' "$BUNDLE_DIR/manifest"))
+    FILES=""
+    while read -r package version file; do
+        case "$package" in "#"*|"") continue ;; esac
+        current="${INSTALLED_VERSION[$package]:-}"
+        if [ -z "$current" ] || dpkg --compare-versions "$current" lt "$version"; then
+            FILES="$FILES $BUNDLE_DIR/$file"
+        fi
+    done < "$BUNDLE_DIR/manifest"
 
-echo "Installing networking packages..."
-run_apt_with_lock_retry sudo apt-get install -y hostapd dnsmasq iptables-persistent
+    echo "Installing from bundle $PACKAGE_BUNDLE..."
+    run_apt_with_lock_retry sudo apt-get install -y --no-download $FILES
+    echo "Package installation complete."
+    exit 0
+fi
+
+echo "Installing required packages..."
+run_apt_with_lock_retry sudo apt-get update
+run_apt_with_lock_retry sudo apt-get install -y $MISSING
 
 echo "Package installation complete."
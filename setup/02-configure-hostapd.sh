@@ -14,6 +14,8 @@ echo "Configuring hostapd..."
 sudo tee /etc/hostapd/hostapd.conf > /dev/null <<EOF
 interface=$AP_INTERFACE
 driver=nl80211
+# Group-accessible so pi-bridge top can read stations without root
+ctrl_interface=DIR=/var/run/hostapd GROUP=netdev
 ssid=$AP_SSID
 # 2.4GHz Only
 hw_mode=g
@@ -32,4 +34,9 @@ wpa_pairwise=TKIP CCMP
 rsn_pairwise=CCMP
 EOF
 
+# Airtime fairness, WMM and beacon settings rendered by `pi-bridge setup --tuning`
+if [ -n "$HOSTAPD_TUNING" ]; then
+    printf '%s\n' "$HOSTAPD_TUNING" | sudo tee -a /etc/hostapd/hostapd.conf > /dev/null
+fi
+
 echo "hostapd configuration complete."
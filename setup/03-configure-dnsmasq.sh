@@ -5,6 +5,10 @@ source "$(dirname "$0")/defaults.sh"
 
 AP_INTERFACE="${AP_INTERFACE:-$DEFAULT_AP_INTERFACE}"
 AP_GATEWAY="${AP_GATEWAY:-$DEFAULT_AP_GATEWAY}"
+DNS_SERVERS="${DNS_SERVERS:-$DEFAULT_DNS_SERVERS}"
+DNS_CACHE="${DNS_CACHE:-$DEFAULT_DNS_CACHE}"
+DNS_CACHE_SIZE="${DNS_CACHE_SIZE:-$DEFAULT_DNS_CACHE_SIZE}"
+DNS_NEG_CACHE="${DNS_NEG_CACHE:-$DEFAULT_DNS_NEG_CACHE}"
 
 # Derive subnet prefix from gateway (strip last octet)
 SUBNET_PREFIX="${AP_GATEWAY%.*}"
@@ -17,7 +21,24 @@ no-ping
 interface=$AP_INTERFACE
 dhcp-range=${SUBNET_PREFIX}.10,${SUBNET_PREFIX}.100,255.255.255.0,24h
 dhcp-option=3,$AP_GATEWAY
-dhcp-option=6,8.8.8.8,8.8.4.4
 EOF
 
-echo "dnsmasq configuration complete."
\ No newline at end of file
+if [ "$DNS_CACHE" = "yes" ]; then
+    # Clients resolve through the Pi; dnsmasq caches and forwards misses upstream
+    {
+        echo "dhcp-option=6,$AP_GATEWAY"
+        echo "no-resolv"
+        for server in ${DNS_SERVERS//,/ }; do
+            echo "server=$server"
+        done
+        echo "cache-size=$DNS_CACHE_SIZE"
+        if [ "$DNS_NEG_CACHE" != "yes" ]; then
+            echo "no-negcache"
+        fi
+    } | sudo tee -a /etc/dnsmasq.conf > /dev/null
+    echo "Local DNS cache enabled (cache-size=$DNS_CACHE_SIZE, upstream: $DNS_SERVERS)."
+else
+    echo "dhcp-option=6,$DNS_SERVERS" | sudo tee -a /etc/dnsmasq.conf > /dev/null
+fi
+
+echo "dnsmasq configuration complete."
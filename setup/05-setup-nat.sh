@@ -21,6 +21,22 @@ sudo iptables -t nat -C POSTROUTING -o "$WAN_INTERFACE" -j MASQUERADE 2>/dev/nul
   sudo iptables -t nat -A POSTROUTING -o "$WAN_INTERFACE" -j MASQUERADE
 sudo iptables -C FORWARD -i "$WAN_INTERFACE" -o "$AP_INTERFACE" -m state --state RELATED,ESTABLISHED -j ACCEPT 2>/dev/null ||
   sudo iptables -A FORWARD -i "$WAN_INTERFACE" -o "$AP_INTERFACE" -m state --state RELATED,ESTABLISHED -j ACCEPT
+# Client block list (pi-bridge clients block), dropped ahead of the ACCEPT below.
+# Same sets and rule as forwarding.nat_rules() and acl.set_commands().
+# ipset is in /usr/sbin, so look for it on sudo's PATH.
+if sudo sh -c 'command -v ipset' > /dev/null; then
+  for set in "pi-bridge-block-mac hash:mac" "pi-bridge-block-net hash:net" "pi-bridge-allow hash:mac" \
+             "pi-bridge-block list:set"; do
+    sudo ipset create $set -exist
+  done
+  sudo ipset add pi-bridge-block pi-bridge-block-mac -exist
+  sudo ipset add pi-bridge-block pi-bridge-block-net -exist
+  sudo iptables -C FORWARD -i "$AP_INTERFACE" -o "$WAN_INTERFACE" -m set --match-set pi-bridge-block src -j DROP 2>/dev/null ||
+    sudo iptables -I FORWARD -i "$AP_INTERFACE" -o "$WAN_INTERFACE" -m set --match-set pi-bridge-block src -j DROP
+else
+  echo "Warning: ipset is not installed, so blocked clients can still reach $WAN_INTERFACE." \
+    "Run \`pi-bridge install-deps\` to install it." >&2
+fi
 sudo iptables -C FORWARD -i "$AP_INTERFACE" -o "$WAN_INTERFACE" -j ACCEPT 2>/dev/null ||
   sudo iptables -A FORWARD -i "$AP_INTERFACE" -o "$WAN_INTERFACE" -j ACCEPT
 
@@ -11,7 +11,10 @@ echo "Creating systemd service for $AP_INTERFACE..."
 sudo tee /etc/systemd/system/${AP_INTERFACE}-static-ip.service > /dev/null <<EOF
 [Unit]
 Description=Set static IP for $AP_INTERFACE
-After=network.target
+# Start as soon as the radio shows up instead of waiting for network.target
+# (NetworkManager and the WAN), and stop if it disappears
+BindsTo=sys-subsystem-net-devices-$AP_INTERFACE.device
+After=sys-subsystem-net-devices-$AP_INTERFACE.device
 Before=hostapd.service dnsmasq.service
 
 [Service]
@@ -23,7 +26,7 @@ ExecStart=/usr/sbin/ip addr add $AP_GATEWAY/24 dev $AP_INTERFACE
 RemainAfterExit=yes
 
 [Install]
-WantedBy=multi-user.target
+WantedBy=sys-subsystem-net-devices-$AP_INTERFACE.device multi-user.target
 EOF
 
 sudo systemctl daemon-reload
@@ -16,9 +16,15 @@ sudo systemctl enable dnsmasq
 sudo rfkill unblock wifi
 sudo nmcli radio wifi on
 
-# Restart NetworkManager first
+# Restart NetworkManager first, then wait (up to 10s) until it has
+# released the AP interface rather than sleeping a fixed time
 sudo systemctl restart NetworkManager
-sleep 2
+for _ in $(seq 1 100); do
+    if nmcli -t -f DEVICE,STATE device status 2>/dev/null | grep -q "^${AP_INTERFACE}:unmanaged$"; then
+        break
+    fi
+    sleep 0.1
+done
 
 # Start AP interface IP service
 sudo systemctl start ${AP_INTERFACE}-static-ip.service
@@ -7,3 +7,8 @@ DEFAULT_WAN_INTERFACE="eth0"
 DEFAULT_AP_SSID="PiNet"
 DEFAULT_AP_COUNTRY="US"
 DEFAULT_AP_GATEWAY="192.168.31.4"
+DEFAULT_HOSTAPD_PROFILE="balanced"
+DEFAULT_DNS_SERVERS="8.8.8.8,8.8.4.4"
+DEFAULT_DNS_CACHE="no"
+DEFAULT_DNS_CACHE_SIZE="1000"
+DEFAULT_DNS_NEG_CACHE="yes"
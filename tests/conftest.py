@@ -1,8 +1,14 @@
+import json
 import os
 import subprocess
+import sys
+from pathlib import Path
 
 import pytest
 
+sys.path.insert(0, os.environ.get("PI_BRIDGE_SIM_PATH", str(Path(__file__).parent.parent / "docker")))
+from simulator.client import admin  # noqa: E402
+
 
 @pytest.fixture
 def run():
@@ -23,7 +29,8 @@ def run():
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_ap():
-    """Run pi-bridge setup once before all tests."""
+    """Run pi-bridge setup once before all tests, on a freshly reset simulator."""
+    admin("reset")
     env = dict(os.environ)
     env["PI_BRIDGE_SKIP_PACKAGE_INSTALL"] = "1"
 
@@ -35,3 +42,84 @@ def setup_ap():
         env=env,
         check=True,
     )
+
+
+@pytest.fixture
+def sim():
+    """The simulator admin client; injected faults and latency are cleared after the test."""
+    yield admin
+    admin("clear", what="faults")
+    admin("clear", what="latency")
+
+
+@pytest.fixture
+def journal():
+    """Seed the simulated journal with records.
+
+    Takes (unit, realtime_seconds, message) tuples, optionally with a
+    fourth item of extra journal fields.
+    """
+
+    def _journal(*records):
+        admin("journal", records=[
+            {
+                "_SYSTEMD_UNIT": f"{unit}.service",
+                "SYSLOG_IDENTIFIER": unit,
+                "__REALTIME_TIMESTAMP": str(int(when * 1_000_000)),
+                "MESSAGE": message,
+                **(extra[0] if extra else {}),
+            }
+            for unit, when, message, *extra in records
+        ])
+
+    yield _journal
+    admin("clear", what="journal")
+
+
+@pytest.fixture
+def stations():
+    """Set the simulated station dump; cleared after the test.
+
+    Takes dicts with mac, signal, tx_bitrate and optional rx_bitrate and
+    interface (wlan1 by default).
+    """
+
+    def _stations(*entries):
+        admin("stations", stations=[
+            {
+                "mac": entry["mac"],
+                "interface": entry.get("interface", "wlan1"),
+                "inactive_ms": 120,
+                "tx_packets": 1000,
+                "tx_retries": 10,
+                "tx_failed": 0,
+                "signal": entry["signal"],
+                "tx_bitrate": entry["tx_bitrate"],
+                "rx_bitrate": entry.get("rx_bitrate", entry["tx_bitrate"]),
+            }
+            for entry in entries
+        ])
+
+    yield _stations
+    admin("stations", stations=[])
+
+
+@pytest.fixture
+def calls(tmp_path):
+    """Run a pi-bridge command with the call log enabled.
+
+    Returns the external calls it made as dicts (argv, duration_ms,
+    returncode, sudo), so tests can pin down fork counts.
+    """
+    log = tmp_path / "calls.jsonl"
+
+    def _calls(cmd, **kwargs):
+        log.unlink(missing_ok=True)
+        env = dict(os.environ, PI_BRIDGE_CALL_LOG=str(log))
+        subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                       text=True, check=True, **kwargs)
+        if not log.exists():
+            return []
+        return [json.loads(line) for line in log.read_text().splitlines()]
+
+    return _calls
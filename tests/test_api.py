@@ -0,0 +1,130 @@
+"""Tests for the local JSON API server."""
+
+import http.client
+import json
+import socket
+import subprocess
+import time
+
+import pytest
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def start_api(sock, *args):
+    server = subprocess.Popen(
+        ["pi-bridge", "api", "--socket", str(sock), "--cache-ttl", "5", *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(50):
+        if sock.exists():
+            break
+        time.sleep(0.1)
+    return server
+
+
+def requester(conn):
+    def _request(method, path, body=None, headers=None):
+        # A str body is sent as-is, anything else as JSON
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body)
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    return _request
+
+
+@pytest.fixture
+def api(tmp_path):
+    sock = tmp_path / "api.sock"
+    server = start_api(sock)
+    conn = UnixHTTPConnection(str(sock))
+    yield requester(conn)
+    conn.close()
+    server.terminate()
+    server.wait()
+
+
+class TestApi:
+    def test_status(self, api):
+        code, body = api("GET", "/status")
+        assert code == 200
+        assert body["services"]["hostapd"] == "active"
+        assert body["ap"]["interface"] == "wlan1"
+        assert body["nat"]["wan_interface"] == "eth0"
+
+    def test_forwarding_add_remove(self, api):
+        code, body = api("GET", "/forwarding")
+        assert body["interfaces"] == ["eth0"]
+
+        code, body = api("POST", "/forwarding", {"interface": "usb0"})
+        assert code == 200
+        # MASQUERADE, the two FORWARD ACCEPTs and the client block rule
+        assert body["added"] == 4
+
+        # Mutations invalidate cached reads
+        code, body = api("GET", "/forwarding")
+        assert "usb0" in body["interfaces"]
+
+        code, body = api("DELETE", "/forwarding/usb0")
+        assert body["removed"] == 4
+
+    def test_errors(self, api):
+        assert api("GET", "/nope")[0] == 404
+        assert api("DELETE", "/status")[0] == 405
+        assert api("POST", "/forwarding", {})[0] == 400
+        assert api("POST", "/credentials", {"passphrase": "short"})[0] == 400
+        assert api("POST", "/credentials", {"passphrase": "pass\nmacaddr_acl=0x"})[0] == 400
+        assert api("POST", "/credentials", {"ssid": "\u00e9" * 17})[0] == 400
+        assert api("POST", "/credentials", {"passphrase": 123456789})[0] == 400
+
+    def test_bad_bodies(self, api):
+        assert api("POST", "/forwarding", "{not json") == (400, {"error": "Invalid JSON body"})
+        assert api("POST", "/forwarding", [1, 2])[0] == 400
+
+    def test_command_errors_are_500(self, api, sim):
+        # A ValueError inside a command is a server error, not a bad request
+        sim("link", name="usb0", mtu="n/a")
+        try:
+            code, body = api("POST", "/forwarding", {"interface": "usb0"})
+        finally:
+            sim("link", name="usb0", mtu=1500)
+        assert code == 500
+        assert "invalid literal for int()" in body["error"]
+        # The connection is still usable
+        assert api("GET", "/status")[0] == 200
+
+    def test_socket_not_world_accessible(self, api, tmp_path):
+        assert (tmp_path / "api.sock").stat().st_mode & 0o777 == 0o660
+
+
+class TestApiAuth:
+    def test_token_required(self, tmp_path):
+        token_file = tmp_path / "token"
+        token_file.write_text("s3cret\n")
+        sock = tmp_path / "api.sock"
+        server = start_api(sock, "--token-file", str(token_file))
+        conn = UnixHTTPConnection(str(sock))
+        request = requester(conn)
+        try:
+            assert request("GET", "/status")[0] == 401
+            assert request("GET", "/status", headers={"Authorization": "Bearer wrong"})[0] == 401
+            assert request("GET", "/status", headers={"Authorization": "Bearer s3cret"})[0] == 200
+        finally:
+            conn.close()
+            server.terminate()
+            server.wait()
+
+    def test_refuses_open_host_without_token(self, run):
+        result = run(["pi-bridge", "api", "--port", "8765", "--host", "0.0.0.0"], check=False, timeout=10)
+        assert result.returncode == 1
+        assert "--token-file" in result.stdout
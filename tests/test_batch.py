@@ -0,0 +1,74 @@
+"""Tests for pi-bridge batch."""
+
+from conftest import admin
+
+
+def save_count() -> int:
+    return admin("saves")["saves"]
+
+
+class TestBatch:
+    def test_single_save(self, run):
+        before = save_count()
+        run(["pi-bridge", "batch"], input="# provisioning\nforwarding add usb0\nforwarding add wwan0\n")
+        try:
+            result = run(["iptables", "-t", "nat", "-S", "POSTROUTING"])
+            assert "-o usb0 -j MASQUERADE" in result.stdout
+            assert "-o wwan0 -j MASQUERADE" in result.stdout
+            assert save_count() == before + 1
+        finally:
+            run(["pi-bridge", "batch"], input="forwarding remove usb0\nforwarding remove wwan0\n")
+
+    def test_failure_rolls_back(self, run):
+        before = save_count()
+        result = run(
+            ["pi-bridge", "batch"],
+            input="forwarding add usb0\ninterface switch nosuch0\n",
+            check=False,
+        )
+        assert result.returncode != 0
+        assert "rolled back" in result.stdout
+
+        result = run(["iptables", "-t", "nat", "-S", "POSTROUTING"])
+        assert "-o usb0 -j MASQUERADE" not in result.stdout
+        assert save_count() == before
+
+    def test_rollback_restores_rule_order(self, run):
+        run(["pi-bridge", "forwarding", "add", "usb0"])
+        try:
+            before = run(["iptables", "-S", "FORWARD"]).stdout
+            result = run(
+                ["pi-bridge", "batch"],
+                input="forwarding remove usb0\ninterface switch nosuch0\n",
+                check=False,
+            )
+            assert result.returncode != 0
+            assert "rolled back" in result.stdout
+
+            after = run(["iptables", "-S", "FORWARD"]).stdout
+            assert after.splitlines() == before.splitlines()
+            assert after.index("--match-set pi-bridge-block src -j DROP") < after.index("-o usb0 -j ACCEPT")
+        finally:
+            run(["pi-bridge", "forwarding", "remove", "usb0"])
+
+    def test_iptables_failure_rolls_back(self, run, sim):
+        before = save_count()
+        sim("fault", command="iptables", match="-A FORWARD -i wlan1 -o usb0", count=1,
+            stderr="iptables: Resource temporarily unavailable.")
+        result = run(["pi-bridge", "batch"], input="forwarding add usb0\n", check=False)
+        assert result.returncode != 0
+        assert "Resource temporarily unavailable" in result.stdout
+
+        result = run(["iptables", "-t", "nat", "-S", "POSTROUTING"])
+        assert "-o usb0 -j MASQUERADE" not in result.stdout
+        result = run(["iptables", "-S", "FORWARD"])
+        assert "usb0" not in result.stdout
+        assert save_count() == before
+
+    def test_rejects_unknown_command(self, run):
+        result = run(["pi-bridge", "batch"], input="forwarding add usb0\nsetup\n", check=False)
+        assert result.returncode != 0
+        assert "unsupported command" in result.stdout
+
+        result = run(["iptables", "-t", "nat", "-S", "POSTROUTING"])
+        assert "-o usb0 -j MASQUERADE" not in result.stdout
@@ -0,0 +1,50 @@
+"""Tests for the boot-to-AP report."""
+import json
+
+BOOT = "0123456789abcdef"
+
+
+def at(seconds, **fields):
+    return {"__MONOTONIC_TIMESTAMP": str(int(seconds * 1_000_000)), "_BOOT_ID": BOOT, **fields}
+
+
+def seed(journal):
+    journal(
+        ("init", 1000.0, "Finished Set static IP for wlan1.",
+         at(4.2, _SYSTEMD_UNIT="init.scope", UNIT="wlan1-static-ip.service")),
+        ("hostapd", 1001.0, "wlan1: interface state UNINITIALIZED->ENABLED", at(5.1)),
+        ("hostapd", 1002.0, "wlan1: AP-ENABLED", at(5.8)),
+        ("dnsmasq", 1003.0, "started, version 2.89 cachesize 150", at(6.0)),
+        ("hostapd", 1010.0, "wlan1: AP-STA-CONNECTED aa:bb:cc:dd:ee:01", at(12.5)),
+        ("dnsmasq", 1011.0, "DHCPACK(wlan1) 192.168.31.50 aa:bb:cc:dd:ee:01 phone", at(12.9)),
+        ("dnsmasq", 1020.0, "DHCPACK(wlan1) 192.168.31.51 aa:bb:cc:dd:ee:02 laptop", at(20.0)),
+    )
+
+
+def test_milestones(run, journal):
+    seed(journal)
+    report = json.loads(run(["pi-bridge", "boot-report", "--json"]).stdout)
+    assert report["boot_id"] == BOOT
+    assert report["milestones"] == {
+        "static_ip": 4.2,
+        "hostapd_started": 5.1,
+        "ap_enabled": 5.8,
+        "first_association": 12.5,
+        "dnsmasq_started": 6.0,
+        "first_dhcpack": 12.9,
+    }
+
+
+def test_text_report(run, journal):
+    seed(journal)
+    journal(("hostapd", 900.0, "wlan1: AP-DISABLED", at(1.0)))
+    result = run(["pi-bridge", "boot-report"])
+    assert "AP-ENABLED" in result.stdout
+    assert "5.80s" in result.stdout
+
+
+def test_unreached_milestones(run, journal):
+    journal(("hostapd", 1000.0, "wlan1: interface state UNINITIALIZED->ENABLED", at(5.1)))
+    result = run(["pi-bridge", "boot-report"])
+    assert "hostapd started" in result.stdout
+    assert "not reached" in result.stdout
@@ -0,0 +1,31 @@
+"""Tests for the pi-bridge launcher."""
+import shutil
+
+
+class TestLauncher:
+    def test_help_lists_commands(self, run):
+        result = run(["pi-bridge", "--help"])
+        assert "usage: pi-bridge" in result.stdout
+        assert "interface" in result.stdout
+        assert "batch" in result.stdout
+
+    def test_no_command_prints_help(self, run):
+        result = run(["pi-bridge"])
+        assert "Commands:" in result.stdout
+
+    def test_unknown_command_fails(self, run):
+        result = run(["pi-bridge", "bogus"], check=False)
+        assert result.returncode == 1
+        assert "Unknown command: bogus" in result.stdout
+
+    def test_command_help_reaches_command(self, run):
+        result = run(["pi-bridge", "forwarding", "--help"])
+        assert "pi-bridge forwarding" in result.stdout
+        assert "Commands:" not in result.stdout
+
+    def test_help_does_not_configure_logging(self, run):
+        result = run(["python3", "-S", "-X", "importtime", shutil.which("pi-bridge"), "--help"])
+        imported = [line.split("|")[-1].strip() for line in result.stdout.splitlines()
+                    if line.startswith("import time:")]
+        assert "logging" not in imported
+        assert "argparse" not in imported
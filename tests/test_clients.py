@@ -0,0 +1,177 @@
+"""Tests for the clients command and session history."""
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+PHONE = "aa:bb:cc:dd:ee:01"
+LAPTOP = "aa:bb:cc:dd:ee:02"
+
+
+class TestClientsCommand:
+    def test_no_clients(self, run):
+        result = run(["pi-bridge", "clients"])
+        assert "No clients connected." in result.stdout
+
+    def test_station_table(self, run, stations):
+        stations({"mac": PHONE, "signal": -48, "tx_bitrate": 144.4})
+        result = run(["pi-bridge", "clients"])
+        assert PHONE in result.stdout
+        assert "-48 dBm" in result.stdout
+
+    def test_loaded_ap(self, run, sim):
+        sim("generate", kind="stations", count=300)
+        sim("generate", kind="leases", count=300)
+        try:
+            result = run(["pi-bridge", "clients"])
+            assert "Total: 300 client(s)" in result.stdout
+            assert "client-" in result.stdout
+        finally:
+            sim("stations", stations=[])
+            sim("leases", leases=[])
+
+
+@pytest.fixture
+def acl(run):
+    """Clear the block list and allowlist after the test."""
+    yield
+    run(["pi-bridge", "clients", "unblock", PHONE, LAPTOP, "192.168.31.77", "10.0.0.0/8"])
+
+
+class TestClientAcl:
+    def test_block_uses_one_rule(self, run, calls, acl):
+        run(["pi-bridge", "clients", "block", PHONE, "10.0.0.0/8"])
+        recorded = calls(["pi-bridge", "clients", "block", "192.168.31.77"])
+        commands = [" ".join(c["argv"][1:]) for c in recorded]
+        # Membership changes go to the set; the ruleset is only read
+        assert "ipset add pi-bridge-block-net 192.168.31.77 -exist" in commands
+        assert not any(c.startswith("iptables -I") or c.startswith("iptables -A") for c in commands)
+
+        # The rule comes with the WAN's forwarding rules, ahead of its ACCEPT
+        rules = run(["iptables", "-S", "FORWARD"]).stdout.splitlines()
+        assert sum("--match-set pi-bridge-block src -j DROP" in rule for rule in rules) == 1
+        assert (rules.index("-A FORWARD -i wlan1 -o eth0 -m set --match-set pi-bridge-block src -j DROP")
+                < rules.index("-A FORWARD -i wlan1 -o eth0 -j ACCEPT"))
+
+        listing = run(["pi-bridge", "clients", "block"]).stdout
+        for entry in (PHONE, "10.0.0.0/8", "192.168.31.77"):
+            assert entry in listing
+
+    def test_allowlist_rule_follows_entries(self, run, acl):
+        rule = "-i wlan1 -m set ! --match-set pi-bridge-allow src -j DROP"
+        run(["pi-bridge", "clients", "allow", LAPTOP.upper()])
+        assert rule in run(["iptables", "-S", "FORWARD"]).stdout
+        assert LAPTOP in run(["pi-bridge", "clients", "allow"]).stdout
+
+        run(["pi-bridge", "clients", "unblock", LAPTOP])
+        assert rule not in run(["iptables", "-S", "FORWARD"]).stdout
+
+    def test_rejects_bad_entries(self, run):
+        result = run(["pi-bridge", "clients", "block", "not-a-client"], check=False)
+        assert result.returncode == 1
+        assert "Not a MAC address" in result.stdout
+
+        result = run(["pi-bridge", "clients", "allow", "192.168.31.77"], check=False)
+        assert "MAC addresses only" in result.stdout
+
+
+class TestClientRf:
+    def test_rf_flags_slow_stations(self, run, stations, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        stations(
+            {"mac": PHONE, "signal": -48, "tx_bitrate": 144.4},
+            {"mac": LAPTOP, "signal": -79, "tx_bitrate": 6.0},
+        )
+        result = run(["pi-bridge", "clients", "--rf"], env=env)
+        assert "-48/-48/-48" in result.stdout
+        assert "SLOW" in next(line for line in result.stdout.splitlines() if LAPTOP in line)
+        assert "SLOW" not in next(line for line in result.stdout.splitlines() if PHONE in line)
+        assert "1 station(s) average below" in result.stdout
+
+    def test_rf_samples_configured_interface(self, run, stations, tmp_path):
+        # After `interface switch` hostapd serves another radio
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        conf = Path("/etc/hostapd/hostapd.conf")
+        original = conf.read_text()
+        conf.write_text(original.replace("interface=wlan1\n", "interface=wlan0\n"))
+        try:
+            stations({"mac": PHONE, "signal": -52, "tx_bitrate": 72.2, "interface": "wlan0"})
+            result = run(["pi-bridge", "clients", "--rf"], env=env)
+        finally:
+            conf.write_text(original)
+        assert "-52/-52/-52" in result.stdout
+
+
+class TestClientHistory:
+    def test_sessions_from_journal(self, run, journal, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        now = time.time()
+        journal(
+            ("hostapd", now - 600, f"wlan1: STA {PHONE} IEEE 802.11: associated (aid 1)"),
+            ("hostapd", now - 599, f"wlan1: AP-STA-CONNECTED {PHONE}"),
+            ("hostapd", now - 599, f"wlan1: STA {PHONE} WPA: pairwise key handshake completed (RSN)"),
+            ("dnsmasq", now - 598, f"DHCPACK(wlan1) 192.168.31.50 {PHONE} phone"),
+            ("hostapd", now - 300, f"wlan1: STA {PHONE} IEEE 802.11: deauthenticated due to inactivity (timer DEAUTH/REMOVE)"),
+            ("hostapd", now - 300, f"wlan1: AP-STA-DISCONNECTED {PHONE}"),
+            ("hostapd", now - 100, f"wlan1: AP-STA-CONNECTED {LAPTOP}"),
+        )
+
+        result = run(["pi-bridge", "clients", "history"], env=env)
+        assert "192.168.31.50" in result.stdout
+        assert "deauthenticated due to inactivity" in result.stdout
+        assert "5m00s" in result.stdout
+        assert "connected" in result.stdout
+        assert "Total: 2 session(s)" in result.stdout
+
+        result = run(["pi-bridge", "clients", "history", "--mac", LAPTOP], env=env)
+        assert PHONE not in result.stdout
+        assert "Total: 1 session(s)" in result.stdout
+
+    def test_reconnect_closes_session_without_disconnect(self, run, journal, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        now = time.time()
+        journal(
+            ("hostapd", now - 3600, f"wlan1: AP-STA-CONNECTED {PHONE}"),
+            ("hostapd", now - 600, f"wlan1: STA {PHONE} IEEE 802.11: associated (aid 1)"),
+            ("hostapd", now - 599, f"wlan1: AP-STA-CONNECTED {PHONE}"),
+        )
+
+        result = run(["pi-bridge", "clients", "history"], env=env)
+        assert "unknown/no disconnect logged" in result.stdout
+        assert "50m00s" in result.stdout
+        assert "Total: 2 session(s)" in result.stdout
+
+    def test_hostapd_restart_closes_open_sessions(self, run, journal, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        now = time.time()
+        journal(
+            ("hostapd", now - 900, f"wlan1: AP-STA-CONNECTED {LAPTOP}"),
+            ("hostapd", now - 600, "wlan1: AP-ENABLED"),
+        )
+
+        result = run(["pi-bridge", "clients", "history"], env=env)
+        assert "hostapd restarted" in result.stdout
+        assert "5m00s" in result.stdout
+        assert "Total: 1 session(s)" in result.stdout
+
+    def test_closed_sessions_ignore_current_leases(self, run, journal, sim, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        now = time.time()
+        journal(
+            ("hostapd", now - 900, f"wlan1: AP-STA-CONNECTED {PHONE}"),
+            ("hostapd", now - 600, f"wlan1: AP-STA-DISCONNECTED {PHONE}"),
+            ("hostapd", now - 100, f"wlan1: AP-STA-CONNECTED {LAPTOP}"),
+        )
+        sim("leases", leases=[
+            {"mac": PHONE, "ip": "192.168.31.60", "hostname": "phone", "expiry": int(now) + 3600},
+            {"mac": LAPTOP, "ip": "192.168.31.61", "hostname": "laptop", "expiry": int(now) + 3600},
+        ])
+
+        try:
+            result = run(["pi-bridge", "clients", "history"], env=env)
+        finally:
+            sim("leases", leases=[])
+        assert "192.168.31.61" in result.stdout
+        assert "192.168.31.60" not in result.stdout
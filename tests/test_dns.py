@@ -0,0 +1,60 @@
+"""Tests for the local DNS cache option and stats command."""
+
+import os
+from pathlib import Path
+
+SETUP_DIR = Path(__file__).parent.parent / "setup"
+
+
+class TestDnsCacheConf:
+    conf = Path("/etc/dnsmasq.conf")
+
+    def configure(self, run, **env_overrides):
+        env = dict(os.environ)
+        env.update(env_overrides)
+        run(["bash", str(SETUP_DIR / "03-configure-dnsmasq.sh")], env=env)
+
+    def test_default_pushes_upstream(self):
+        text = self.conf.read_text()
+        assert "dhcp-option=6,8.8.8.8,8.8.4.4" in text
+        assert "cache-size=" not in text
+
+    def test_cache_mode(self, run):
+        self.configure(run, DNS_CACHE="yes", DNS_CACHE_SIZE="2500",
+                       DNS_SERVERS="1.1.1.1,9.9.9.9", DNS_NEG_CACHE="no")
+        try:
+            text = self.conf.read_text()
+            assert "dhcp-option=6,192.168.31.4" in text
+            assert "server=1.1.1.1" in text
+            assert "server=9.9.9.9" in text
+            assert "cache-size=2500" in text
+            assert "no-resolv" in text
+            assert "no-negcache" in text
+        finally:
+            # Restore default test state for subsequent tests.
+            self.configure(run)
+
+
+class TestDnsStats:
+    def test_stats_without_dumps(self, run):
+        result = run(["pi-bridge", "dns", "stats", "--no-dump"])
+        assert "No cache statistics found" in result.stdout
+
+    def test_stats_from_journal_dumps(self, run, journal):
+        # What dnsmasq logs on SIGUSR1, with the per-server lines in between
+        journal(
+            ("dnsmasq", 1000.0, "time 1700000000"),
+            ("dnsmasq", 1000.0, "cache size 1000, 0/12 cache insertions re-used unexpired cache entries."),
+            ("dnsmasq", 1000.0, "queries forwarded 40, queries answered locally 60"),
+            ("dnsmasq", 1000.0, "server 8.8.8.8#53: queries sent 40, retried or failed 0"),
+            ("dnsmasq", 1600.0, "cache size 1000, 3/30 cache insertions re-used unexpired cache entries."),
+            ("dnsmasq", 1600.0, "queries forwarded 50, queries answered locally 150"),
+        )
+        result = run(["pi-bridge", "dns", "stats", "--no-dump"])
+        rows = [line.split()[-5:] for line in result.stdout.splitlines()
+                if "%" in line and "Hit rate" not in line]
+        # Cumulative counters become per-interval deltas
+        assert rows == [["100", "60", "40", "60.0%", "0"],
+                        ["100", "90", "10", "90.0%", "3"]]
+        assert "Insertions:        30" in result.stdout
+        assert "Hit rate (total):  75.0%" in result.stdout
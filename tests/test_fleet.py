@@ -0,0 +1,130 @@
+"""Tests for fleet runs over a fake ssh."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+FAKE_SSH = """\
+import json, os, subprocess, sys, time
+args = sys.argv[1:]
+options = []
+while args[0].startswith("-"):
+    options.append(args[:2])
+    args = args[2:]
+destination, command = args
+started = time.time()
+if os.path.exists(os.path.join(os.environ["FLEET_DIR"], "down-" + destination)):
+    print(f"ssh: connect to host {destination} port 22: Connection refused", file=sys.stderr)
+    code = 255
+else:
+    time.sleep(float(os.environ.get("FAKE_SSH_DELAY", "0")))
+    code = subprocess.run(["sh", "-c", command]).returncode
+with open(os.path.join(os.environ["FLEET_DIR"], "ssh.jsonl"), "a") as f:
+    f.write(json.dumps({"destination": destination, "options": options, "command": command,
+                        "started": started, "ended": time.time()}) + "\\n")
+sys.exit(code)
+"""
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    """(run `pi-bridge fleet ...` against a fake ssh, mark a host down/up, read ssh calls)."""
+    ssh = tmp_path / "ssh"
+    ssh.write_text(FAKE_SSH)
+    (tmp_path / "inventory").write_text(
+        "# name   address          groups\n"
+        "lab-1    pi@lab-1         lab\n"
+        "lab-2    pi@lab-2:2222    lab\n"
+        "shop-1   pi@shop-1        shops\n"
+    )
+    env = dict(os.environ, FLEET_DIR=str(tmp_path), PI_BRIDGE_SSH=f"{sys.executable} {ssh}",
+               PI_BRIDGE_INVENTORY=str(tmp_path / "inventory"), PI_BRIDGE_STATE_DIR=str(tmp_path / "state"))
+
+    def _fleet(*args, check=True, input=None, **kwargs):
+        return subprocess.run(["pi-bridge", "fleet", *args], env={**env, **kwargs}, check=check, input=input,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def _down(host, down=True):
+        marker = tmp_path / f"down-{host}"
+        marker.touch() if down else marker.unlink()
+
+    def _calls():
+        with open(tmp_path / "ssh.jsonl") as f:
+            return [json.loads(line) for line in f]
+
+    yield _fleet, _down, _calls
+    (tmp_path / "ssh.jsonl").unlink(missing_ok=True)
+
+
+def test_run_collects_results(fleet):
+    run, _, calls = fleet
+    result = run("run", "--format", "ndjson", "--", "interface", "show", "--format", "json")
+    records = {r["host"]: r for r in map(json.loads, result.stdout.splitlines())}
+    assert sorted(records) == ["lab-1", "lab-2", "shop-1"]
+    assert all(r["ok"] and r["attempts"] == 1 and r["duration_s"] >= 0 for r in records.values())
+    assert json.loads(records["lab-1"]["stdout"]) == [{"interface": "wlan1"}]
+
+    by_host = {c["destination"]: c for c in calls()}
+    assert by_host["pi@lab-1"]["command"] == "pi-bridge interface show --format json"
+    # One reusable master connection per host
+    options = [value for _, value in by_host["pi@lab-2"]["options"]]
+    assert "ControlMaster=auto" in options and "2222" in options
+    assert any(value.startswith("ControlPath=") for value in options)
+
+
+def test_profile_flag_goes_to_hosts(fleet):
+    run, _, calls = fleet
+    run("run", "--group", "lab", "--", "--profile", "status")
+    assert [c["command"] for c in calls()] == ["pi-bridge --profile status"] * 2
+
+
+def test_bounded_concurrency(fleet):
+    run, _, calls = fleet
+    run("run", "-j", "2", "status", FAKE_SSH_DELAY="0.3")
+    spans = [(c["started"], c["ended"]) for c in calls()]
+    overlapping = max(sum(1 for s, e in spans if s <= start < e) for start, _ in spans)
+    assert overlapping == 2
+
+
+def test_retry_only_failed_hosts(fleet):
+    run, down, calls = fleet
+    down("pi@shop-1")
+    result = run("run", "--group", "shops", "--group", "lab", "forwarding", "list", check=False)
+    assert result.returncode == 1
+    assert "FAILED  shop-1" in result.stderr
+    assert "Connection refused" in result.stderr
+    assert "1 host(s) failed: shop-1" in result.stderr
+
+    down("pi@shop-1", False)
+    result = run("retry")
+    assert "ok      shop-1" in result.stderr
+    assert "lab-1" not in result.stderr
+    assert [c["destination"] for c in calls()][-1] == "pi@shop-1"
+    assert run("retry").stderr.strip().endswith("No failed hosts to retry.")
+
+
+def test_local_transport_and_unknown_host(fleet):
+    run, _, _ = fleet
+    result = run("run", "--transport", "local", "--hosts", "lab-1", "--format", "json", "interface", "show")
+    [record] = json.loads(result.stdout)
+    assert record["host"] == "lab-1" and "Configured AP interface: wlan1" in record["stderr"]
+
+    result = run("run", "--hosts", "nope", "status", check=False)
+    assert result.returncode == 1
+    assert "Not in the inventory: nope" in result.stderr
+
+
+@pytest.mark.parametrize("transport", ["ssh", "local"])
+def test_stdin_only_from_input(fleet, tmp_path, transport):
+    run, _, _ = fleet
+    options = ["--transport", transport, "--remote", "cat", "--format", "json"]
+    command = ["--", "-"]
+    # Without --input the hosts don't get (or wait on) fleet's own stdin
+    result = run("run", *options, *command, input="not for the hosts\n")
+    assert [r["stdout"] for r in json.loads(result.stdout)] == ["", "", ""]
+
+    (tmp_path / "input").write_text("for every host\n")
+    result = run("run", *options, "--input", str(tmp_path / "input"), *command, input="not for the hosts\n")
+    assert [r["stdout"] for r in json.loads(result.stdout)] == ["for every host\n"] * 3
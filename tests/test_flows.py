@@ -0,0 +1,87 @@
+"""Tests for the conntrack flows command."""
+
+import os
+
+import pytest
+
+PHONE = "192.168.31.50"
+LAPTOP = "192.168.31.51"
+
+# /proc/net/nf_conntrack lines, with accounting on (bytes= in both directions)
+TABLE = [
+    f"ipv4     2 tcp      6 431999 ESTABLISHED src={PHONE} dst=93.184.216.34 sport=51234 dport=443 "
+    "packets=12 bytes=2048 src=93.184.216.34 dst=192.168.1.20 sport=443 dport=51234 packets=10 bytes=8192 "
+    "[ASSURED] mark=0 zone=0 use=2",
+    f"ipv4     2 tcp      6 431990 ESTABLISHED src={PHONE} dst=93.184.216.34 sport=51240 dport=443 "
+    "packets=4 bytes=512 src=93.184.216.34 dst=192.168.1.20 sport=443 dport=51240 packets=3 bytes=1536 "
+    "[ASSURED] mark=0 zone=0 use=2",
+    f"ipv4     2 udp      17 28 src={LAPTOP} dst=8.8.8.8 sport=40000 dport=53 packets=1 bytes=60 "
+    "src=8.8.8.8 dst=192.168.1.20 sport=53 dport=40000 packets=1 bytes=120 mark=0 zone=0 use=2",
+    f"ipv4     2 icmp     1 29 src={LAPTOP} dst=1.1.1.1 type=8 code=0 id=7 packets=1 bytes=84 "
+    "src=1.1.1.1 dst=192.168.1.20 type=0 code=0 id=7 packets=1 bytes=84 mark=0 zone=0 use=2",
+    # Without accounting there are no counters, only connections
+    f"ipv4     2 tcp      6 117 TIME_WAIT src={LAPTOP} dst=140.82.112.3 sport=55000 dport=22 "
+    "src=140.82.112.3 dst=192.168.1.20 sport=22 dport=55000 [ASSURED] mark=0 zone=0 use=2",
+]
+
+
+@pytest.fixture
+def conntrack(tmp_path):
+    """Write a conntrack table and return the environment that makes flows read it."""
+
+    def _conntrack(lines):
+        table = tmp_path / "nf_conntrack"
+        with table.open("w") as f:
+            for line in lines:
+                f.write(line + "\n")
+        return dict(os.environ, PI_BRIDGE_CONNTRACK_FILE=str(table))
+
+    return _conntrack
+
+
+def rows(output: str) -> list[list[str]]:
+    """Table rows, without the log prefix."""
+    return [line.split("[INFO] ", 1)[1].split() for line in output.splitlines()
+            if "[INFO] " in line and " 192.168." in line]
+
+
+class TestFlowsCommand:
+    def test_reports_table_usage(self, run):
+        result = run(["pi-bridge", "flows"])
+        assert "Conntrack table:" in result.stdout
+
+    def test_group_by_client(self, run):
+        result = run(["pi-bridge", "flows", "--by", "client", "--top", "5"])
+        assert "=== Top Flows ===" in result.stdout
+
+    def test_flows_from_table(self, run, conntrack):
+        result = run(["pi-bridge", "flows"], env=conntrack(TABLE))
+        # Connections to the same destination port fold into one flow; bytes count both directions
+        assert rows(result.stdout)[0] == [PHONE, "tcp", "93.184.216.34:443", "2", "12.0", "KB"]
+        flows = {tuple(row[1:3]): row[3:] for row in rows(result.stdout)}
+        assert flows[("udp", "8.8.8.8:53")] == ["1", "180", "B"]
+        assert flows[("icmp", "1.1.1.1")] == ["1", "168", "B"]
+        assert flows[("tcp", "140.82.112.3:22")] == ["1", "0", "B"]
+        assert "Showing 4 of 4 group(s) across 5 connection(s)" in result.stdout
+
+    def test_by_destination_and_client_filter(self, run, conntrack):
+        env = conntrack(TABLE)
+        result = run(["pi-bridge", "flows", "--by", "destination"], env=env)
+        assert "tcp    93.184.216.34:443" in result.stdout
+
+        result = run(["pi-bridge", "flows", "--client", LAPTOP], env=env)
+        assert PHONE not in result.stdout
+        assert "across 3 connection(s)" in result.stdout
+
+    def test_large_table(self, run, conntrack):
+        # 50,000 entries from 200 clients, read one line at a time
+        lines = (
+            f"ipv4     2 tcp      6 431999 ESTABLISHED src=192.168.31.{10 + i % 200} dst=10.1.{i % 7}.1 "
+            f"sport={1024 + i % 60000} dport=443 packets=2 bytes=100 src=10.1.{i % 7}.1 dst=192.168.1.20 "
+            f"sport=443 dport={1024 + i % 60000} packets=2 bytes=400 [ASSURED] mark=0 zone=0 use=2"
+            for i in range(50_000)
+        )
+        result = run(["pi-bridge", "flows", "--by", "client", "--top", "3"], env=conntrack(lines))
+        assert "Showing 3 of 200 group(s) across 50000 connection(s)" in result.stdout
+        # Each client has 250 connections of 500 bytes
+        assert all(row[1:] == ["250", "122.1", "KB"] for row in rows(result.stdout))
@@ -0,0 +1,100 @@
+"""Tests for install-deps and offline package bundles."""
+import tarfile
+
+import pytest
+
+REQUIRED = ["firmware-iwlwifi", "hostapd", "dnsmasq", "dnsmasq-base", "iptables-persistent",
+            "netfilter-persistent", "ipset", "ipset-persistent"]
+BASE = ["libc6", "libssl3", "iptables", "libxtables12", "netbase", "lsb-base"]
+
+
+@pytest.fixture
+def packages(sim):
+    """Set the installed packages; back to a fresh image afterwards. Returns a state reader."""
+
+    def _installed(names=None):
+        if names is not None:
+            sim("packages", installed=names)
+        return sim("state")["state"]["packages"]
+
+    sim("clear", what="calls")
+    yield _installed
+    sim("packages", installed=BASE)
+
+
+def test_skips_when_installed(run, sim, packages):
+    packages(BASE + REQUIRED + ["libnl-3-200", "libnl-genl-3-200", "libnetfilter-conntrack3", "libipset13"])
+    result = run(["pi-bridge", "install-deps", "--chipset", "intel"])
+    assert "All required packages are already installed" in result.stdout
+    calls = sim("calls")["calls"]
+    assert calls.get("dpkg-query") == 1
+    assert "apt-get" not in calls
+
+
+def test_bundle_installs_offline(run, sim, packages, tmp_path):
+    bundle = tmp_path / "intel.tar.gz"
+    run(["pi-bridge", "install-deps", "--bundle-create", str(bundle), "--chipset", "intel"], cwd=tmp_path)
+    assert bundle.exists()
+
+    # No network: any apt-get update would fail
+    packages(BASE)
+    sim("fault", command="apt-get", match="update", stderr="Temporary failure resolving 'deb.debian.org'")
+    sim("clear", what="calls")
+    result = run(["pi-bridge", "install-deps", "--bundle", str(bundle)])
+    assert "Chipset: intel" in result.stdout
+
+    installed = packages()
+    assert all(name in installed for name in REQUIRED)
+    assert installed["hostapd"] == "2:2.10-12"
+    # One query for the required list, one for the bundle; one install of local .debs only
+    calls = sim("calls")["calls"]
+    assert calls["dpkg-query"] == 2
+    assert calls["apt-get"] == 1
+
+
+def test_bundle_takes_one_alternative(run, packages, tmp_path):
+    # dnsmasq depends on dnsmasq-base | dnsmasq-base-lua, which conflict
+    bundle = tmp_path / "intel.tar.gz"
+    run(["pi-bridge", "install-deps", "--bundle-create", str(bundle), "--chipset", "intel"], cwd=tmp_path)
+    with tarfile.open(bundle) as tar:
+        manifest = tar.extractfile("manifest").read().decode()
+    names = [line.split()[0] for line in manifest.splitlines()[1:]]
+    assert "dnsmasq-base" in names
+    assert "dnsmasq-base-lua" not in names and "liblua5.4-0" not in names
+    # Installed here or not, every dependency is in the bundle
+    assert "libc6" in names
+
+
+def test_bundle_for_other_chipset_rejected(run, packages, tmp_path):
+    bundle = tmp_path / "realtek.tar.gz"
+    run(["pi-bridge", "install-deps", "--bundle-create", str(bundle), "--chipset", "realtek"], cwd=tmp_path)
+    packages(BASE)
+    result = run(["pi-bridge", "install-deps", "--bundle", str(bundle), "--chipset", "intel"], check=False)
+    assert result.returncode != 0
+    assert "Bundle does not match this system" in result.stdout
+    assert "hostapd" not in packages()
+
+
+def test_bundle_upgrades_older_dependencies(run, sim, packages, tmp_path):
+    bundle = tmp_path / "intel.tar.gz"
+    run(["pi-bridge", "install-deps", "--bundle-create", str(bundle), "--chipset", "intel"], cwd=tmp_path)
+
+    # An image older than the bundle: hostapd needs a newer libssl3 than the one
+    # installed, while libc6 is already newer than the bundled one
+    packages({**packages(BASE), "libssl3": "3.0.9-1", "libc6": "2.36-9+deb12u1"})
+    sim("fault", command="apt-get", match="update", stderr="Temporary failure resolving 'deb.debian.org'")
+    run(["pi-bridge", "install-deps", "--bundle", str(bundle)])
+
+    installed = packages()
+    assert all(name in installed for name in REQUIRED)
+    assert installed["libssl3"] == "3.0.11-1"
+    # Not downgraded to the bundle's 2.36-9
+    assert installed["libc6"] == "2.36-9+deb12u1"
+
+
+def test_apt_failure_fails_install(run, sim, packages):
+    packages(BASE)
+    sim("fault", command="apt-get", match="install", returncode=100, stderr="E: Unable to locate package hostapd")
+    result = run(["pi-bridge", "install-deps", "--chipset", "intel"], check=False)
+    assert result.returncode != 0
+    assert "Package installation complete" not in result.stdout
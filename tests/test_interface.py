@@ -26,3 +26,29 @@ class TestInterfaceCommand:
 
         # Restore default test state for subsequent tests.
         run(["pi-bridge", "interface", "switch", "wlan1", "--wan", "eth0"])
+
+    def test_switch_reports_downtime(self, run, calls):
+        recorded = calls(["pi-bridge", "interface", "switch", "wlan0", "--wan", "eth0"])
+        commands = [" ".join(c["argv"]) for c in recorded]
+        assert "sudo systemctl restart hostapd dnsmasq" in commands
+        assert "sudo systemctl restart NetworkManager" not in commands
+
+        result = run(["pi-bridge", "interface", "switch", "wlan1", "--wan", "eth0"])
+        assert "AP interface switched to wlan1 (down for" in result.stdout
+
+    def test_switch_rolls_back_when_hostapd_fails(self, run, sim):
+        sim("fault", command="hostapd_cli", match="status", returncode=255)
+        result = run(["pi-bridge", "interface", "switch", "wlan0", "--wan", "eth0", "--deadline", "0.3"],
+                     check=False)
+        assert result.returncode == 1
+        assert "hostapd did not come up on wlan0" in result.stdout
+
+        assert "wlan1" in run(["pi-bridge", "interface", "show"]).stdout
+        rules = run(["iptables", "-S", "FORWARD"]).stdout
+        assert "-i wlan1 -o eth0 -j ACCEPT" in rules
+        assert "wlan0" not in rules
+
+    def test_switch_rejects_wired_interface(self, run):
+        result = run(["pi-bridge", "interface", "switch", "eth0"], check=False)
+        assert result.returncode == 1
+        assert "not a wireless interface" in result.stdout
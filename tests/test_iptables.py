@@ -31,8 +31,11 @@ class TestForwardingCli:
         result = run(["iptables", "-t", "nat", "-S", "POSTROUTING"])
         assert "-o usb0 -j MASQUERADE" in result.stdout
 
-        result = run(["iptables", "-S", "FORWARD"])
-        assert "-i wlan1 -o usb0 -j ACCEPT" in result.stdout
+        rules = run(["iptables", "-S", "FORWARD"]).stdout.splitlines()
+        assert "-A FORWARD -i wlan1 -o usb0 -j ACCEPT" in rules
+        # The client block rule is one of the WAN's rules, ahead of its ACCEPT
+        block = "-A FORWARD -i wlan1 -o usb0 -m set --match-set pi-bridge-block src -j DROP"
+        assert rules.index(block) < rules.index("-A FORWARD -i wlan1 -o usb0 -j ACCEPT")
 
         # Remove forwarding for usb0
         run(["pi-bridge", "forwarding", "remove", "usb0"])
@@ -42,3 +45,142 @@ class TestForwardingCli:
 
         result = run(["iptables", "-S", "FORWARD"])
         assert "-i wlan1 -o usb0 -j ACCEPT" not in result.stdout
+        assert "-o usb0 -m set" not in result.stdout
+
+
+    def test_forwarding_without_ipset(self, run, sim):
+        sim("fault", command="ipset", stderr="sudo: ipset: command not found")
+        try:
+            result = run(["pi-bridge", "forwarding", "add", "usb0"])
+            assert "pi-bridge install-deps" in result.stdout
+
+            rules = run(["iptables", "-S", "FORWARD"]).stdout
+            assert "-i wlan1 -o usb0 -j ACCEPT" in rules
+            assert "-o usb0 -m set" not in rules
+
+            result = run(["pi-bridge", "clients", "block", "192.168.31.77"], check=False)
+            assert result.returncode != 0
+            assert "ipset is not installed; run `pi-bridge install-deps`" in result.stdout
+        finally:
+            run(["pi-bridge", "forwarding", "remove", "usb0"])
+
+
+class TestMssClamping:
+    """Test MSS clamping for small-MTU WANs."""
+
+    def test_clamp_follows_link_mtu(self, run):
+        run(["ip", "link", "set", "usb0", "mtu", "1400"])
+        try:
+            run(["pi-bridge", "forwarding", "add", "usb0"])
+            mangle = run(["iptables", "-t", "mangle", "-S", "FORWARD"]).stdout
+            assert "-o usb0 -p tcp -m tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss 1360" in mangle
+            assert "-i usb0 -p tcp -m tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss 1360" in mangle
+
+            # Back at a standard MTU the clamp goes away
+            run(["ip", "link", "set", "usb0", "mtu", "1500"])
+            run(["pi-bridge", "forwarding", "add", "usb0"])
+            assert "usb0" not in run(["iptables", "-t", "mangle", "-S", "FORWARD"]).stdout
+        finally:
+            run(["ip", "link", "set", "usb0", "mtu", "1500"])
+            run(["pi-bridge", "forwarding", "remove", "usb0"])
+
+    def test_probe_lowers_clamp_to_path_mtu(self, run, sim):
+        sim("link", name="usb0", cidr="172.20.10.2/28", mtu=1492, path_mtu=1420)
+        try:
+            run(["pi-bridge", "forwarding", "add", "usb0", "--probe-mtu"])
+            mangle = run(["iptables", "-t", "mangle", "-S", "FORWARD"]).stdout
+            assert "-o usb0 -p tcp -m tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss 1380" in mangle
+
+            run(["pi-bridge", "forwarding", "remove", "usb0"])
+            assert "usb0" not in run(["iptables", "-t", "mangle", "-S", "FORWARD"]).stdout
+        finally:
+            sim("link", name="usb0", cidr=None, mtu=1500, path_mtu=None)
+            run(["pi-bridge", "forwarding", "remove", "usb0"])
+
+
+class TestPortForwarding:
+    """Test pi-bridge forwarding port (DNAT)."""
+
+    def test_add_list_remove(self, run, calls):
+        run(["pi-bridge", "forwarding", "port", "add", "eth0", "8080", "192.168.31.50:80"])
+        run(["pi-bridge", "forwarding", "port", "add", "eth0", "9000-9010", "192.168.31.51", "--proto", "both"])
+        try:
+            nat = run(["iptables", "-t", "nat", "-S"]).stdout
+            assert nat.count("-A PREROUTING -i eth0 -j PIB-DNAT-eth0") == 1
+            assert ("-A PIB-DNAT-eth0 -p tcp -m tcp --dport 8080 -j DNAT "
+                    "--to-destination 192.168.31.50:80") in nat
+            assert "-A PIB-DNAT-eth0 -p udp -m udp --dport 9000:9010 -j DNAT --to-destination 192.168.31.51" in nat
+            # Hairpin: AP traffic to the WAN's address takes the same chain
+            assert "-A PREROUTING -d 192.168.1.100/32 -i wlan1 -j PIB-DNAT-eth0" in nat
+            assert "-A POSTROUTING -s 192.168.31.0/24 -o wlan1 -m conntrack --ctstate DNAT -j MASQUERADE" in nat
+
+            listing = run(["pi-bridge", "forwarding", "port", "list"]).stdout
+            assert "8080" in listing and "192.168.31.50:80" in listing
+            assert "Port forwards: 3" in run(["pi-bridge", "status"]).stdout
+
+            # Adding a mapping only appends to the chain: no -C checks, one read per table
+            recorded = calls(["pi-bridge", "forwarding", "port", "add", "eth0", "2222", "192.168.31.52:22"])
+            commands = [" ".join(c["argv"][2:]) for c in recorded if c["argv"][1] == "iptables"]
+            assert not any(" -C " in c for c in commands)
+            assert [c for c in commands if " -A " in c] == [
+                "-t nat -A PIB-DNAT-eth0 -p tcp -m tcp --dport 2222 -j DNAT --to-destination 192.168.31.52:22"
+            ]
+        finally:
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "8080"])
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "2222"])
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "9000-9010", "--proto", "both"])
+
+        nat = run(["iptables", "-t", "nat", "-S"]).stdout
+        assert "PIB-DNAT" not in nat
+        assert "--ctstate DNAT" not in nat
+        assert "--ctstate DNAT" not in run(["iptables", "-S", "FORWARD"]).stdout
+
+    def test_hairpin_only_matches_wan_address(self, run):
+        run(["ip", "addr", "add", "10.0.0.2/24", "dev", "usb0"])
+        # A rule from before hairpin jumps were limited to the WAN address
+        legacy = "PREROUTING -i wlan1 -m addrtype --dst-type LOCAL -j PIB-DNAT-eth0"
+        run(["iptables", "-t", "nat", "-N", "PIB-DNAT-eth0"])
+        run(["iptables", "-t", "nat", "-A"] + legacy.split())
+        try:
+            run(["pi-bridge", "forwarding", "port", "add", "eth0", "8080", "192.168.31.50:80"])
+            run(["pi-bridge", "forwarding", "port", "add", "usb0", "8080", "192.168.31.51:80"])
+            jumps = [line for line in run(["iptables", "-t", "nat", "-S", "PREROUTING"]).stdout.splitlines()
+                     if "-i wlan1" in line]
+            # Each WAN's mappings only see AP traffic to that WAN's address, so
+            # the AP gateway's own ports (DNS, DHCP, SSH) are never redirected
+            assert sorted(jumps) == [
+                "-A PREROUTING -d 10.0.0.2/32 -i wlan1 -j PIB-DNAT-usb0",
+                "-A PREROUTING -d 192.168.1.100/32 -i wlan1 -j PIB-DNAT-eth0",
+            ]
+        finally:
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "8080"])
+            run(["pi-bridge", "forwarding", "port", "remove", "usb0", "8080"])
+            run(["ip", "addr", "del", "10.0.0.2/24", "dev", "usb0"])
+        assert "PIB-DNAT" not in run(["iptables", "-t", "nat", "-S"]).stdout
+
+    def test_reservation_target(self, run):
+        conf = "/etc/dnsmasq.conf"
+        with open(conf) as f:
+            original = f.read()
+        with open(conf, "a") as f:
+            f.write("dhcp-host=aa:bb:cc:dd:ee:0a,192.168.31.60,camera,infinite\n")
+        try:
+            run(["pi-bridge", "forwarding", "port", "add", "eth0", "8554", "camera"])
+            assert "--to-destination 192.168.31.60" in run(["iptables", "-t", "nat", "-S"]).stdout
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "8554"])
+        finally:
+            with open(conf, "w") as f:
+                f.write(original)
+
+    def test_rejects_conflicts_and_unknown_targets(self, run):
+        result = run(["pi-bridge", "forwarding", "port", "add", "eth0", "80", "printer"], check=False)
+        assert result.returncode == 1
+        assert "No DHCP reservation" in result.stdout
+
+        run(["pi-bridge", "forwarding", "port", "add", "eth0", "8000-8100", "192.168.31.50"])
+        try:
+            result = run(["pi-bridge", "forwarding", "port", "add", "eth0", "8080", "192.168.31.51"], check=False)
+            assert result.returncode == 1
+            assert "already forward to 192.168.31.50" in result.stdout
+        finally:
+            run(["pi-bridge", "forwarding", "port", "remove", "eth0", "8000-8100"])
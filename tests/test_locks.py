@@ -0,0 +1,54 @@
+"""Tests for per-resource command locking."""
+import fcntl
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def locks(tmp_path):
+    """(env for pi-bridge with its own lock dir, function that takes a lock as another process would)."""
+    env = dict(os.environ, PI_BRIDGE_LOCK_DIR=str(tmp_path), PI_BRIDGE_LOCK_TIMEOUT="0.5")
+    held = []
+
+    def _hold(resource):
+        fd = os.open(tmp_path / f"{resource}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, b"4242\n")
+        held.append(fd)
+        return fd
+
+    yield env, _hold
+    for fd in held:
+        os.close(fd)
+
+
+def test_conflicting_command_times_out(run, locks):
+    env, hold = locks
+    hold("firewall")
+    result = run(["pi-bridge", "forwarding", "add", "usb0"], env=env, check=False)
+    assert result.returncode == 1
+    assert "Timed out waiting for the firewall lock (held by pid 4242)" in result.stdout
+    assert "-o usb0 -j MASQUERADE" not in run(["iptables", "-t", "nat", "-S"]).stdout
+
+
+def test_unrelated_and_read_only_commands_proceed(run, locks):
+    env, hold = locks
+    hold("firewall")
+    assert "All services restarted" in run(["pi-bridge", "restart"], env=env).stdout
+    assert "eth0" in run(["pi-bridge", "forwarding", "list"], env=env).stdout
+    run(["pi-bridge", "status"], env=env)
+
+
+def test_waits_for_release(run, locks):
+    env, hold = locks
+    fd = hold("firewall")
+    threading.Timer(0.3, fcntl.flock, args=(fd, fcntl.LOCK_UN)).start()
+    env["PI_BRIDGE_LOCK_TIMEOUT"] = "10"
+    try:
+        result = run(["pi-bridge", "forwarding", "add", "usb0"], env=env)
+        assert "Waiting for the firewall lock" in result.stdout
+        assert "-o usb0 -j MASQUERADE" in run(["iptables", "-t", "nat", "-S"]).stdout
+    finally:
+        run(["pi-bridge", "forwarding", "remove", "usb0"], env=env)
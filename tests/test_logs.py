@@ -0,0 +1,57 @@
+"""Tests for the merged service log reader."""
+
+import json
+import os
+from pathlib import Path
+
+MAC = "aa:bb:cc:dd:ee:01"
+
+
+def seed(journal):
+    journal(
+        ("dnsmasq", 1000.0, f"DHCPACK(wlan1) 192.168.31.50 {MAC} phone"),
+        ("hostapd", 999.0, f"wlan1: STA {MAC} IEEE 802.11: associated"),
+        ("hostapd", 1001.0, "wlan1: STA aa:bb:cc:dd:ee:02 IEEE 802.11: associated"),
+    )
+
+
+class TestMergedLogs:
+    def test_all_is_time_ordered(self, run, journal):
+        seed(journal)
+        result = run(["pi-bridge", "logs", "all", "--json"])
+        entries = [json.loads(line) for line in result.stdout.splitlines()]
+        assert [e["unit"] for e in entries] == ["hostapd", "dnsmasq", "hostapd"]
+
+    def test_mac_filter(self, run, journal):
+        seed(journal)
+        result = run(["pi-bridge", "logs", "all", "--mac", MAC.upper()])
+        assert "DHCPACK" in result.stdout
+        assert "ee:02" not in result.stdout
+
+    def test_since_last_resumes(self, run, journal, tmp_path):
+        env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+        seed(journal)
+        first = run(["pi-bridge", "logs", "all", "--json", "--since-last"], env=env)
+        assert len(first.stdout.splitlines()) == 3
+
+        journal(("dnsmasq", 1002.0, "DHCPACK(wlan1) 192.168.31.51 aa:bb:cc:dd:ee:02 laptop"))
+        second = run(["pi-bridge", "logs", "all", "--json", "--since-last"], env=env)
+        lines = second.stdout.splitlines()
+        assert len(lines) == 1
+        assert "laptop" in json.loads(lines[0])["message"]
+
+    def test_static_ip_follows_ap_interface(self, run, journal):
+        # After `interface switch` the static IP unit is named after the new interface
+        conf = Path("/etc/hostapd/hostapd.conf")
+        original = conf.read_text()
+        conf.write_text(original.replace("interface=wlan1\n", "interface=wlan2\n"))
+        try:
+            journal(
+                ("wlan1-static-ip", 1000.0, "old address"),
+                ("wlan2-static-ip", 1001.0, "new address"),
+            )
+            result = run(["pi-bridge", "logs", "static-ip"])
+        finally:
+            conf.write_text(original)
+        assert "new address" in result.stdout
+        assert "old address" not in result.stdout
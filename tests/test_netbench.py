@@ -0,0 +1,44 @@
+"""Tests for the NAT forwarding bench."""
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+BIN = str(Path(__file__).parent.parent / "bin")
+SYSTEM_PATH = os.pathsep.join([BIN, "/usr/local/sbin", "/usr/sbin", "/sbin", "/usr/bin", "/bin"])
+
+
+def real_namespaces() -> bool:
+    """Whether real ip/iptables can build namespaces here (not the simulator's stubs)."""
+    if not all(shutil.which(tool, path=SYSTEM_PATH) for tool in ("ip", "iptables", "sudo")):
+        return False
+    probe = subprocess.run(["sudo", "-n", "unshare", "--net", "true"], env={"PATH": SYSTEM_PATH},
+                           capture_output=True)
+    return probe.returncode == 0
+
+
+def test_fails_cleanly_without_namespaces(run):
+    # The simulator, like an unprivileged container, can't create namespaces
+    result = run(["pi-bridge", "bench", "forward", "--duration", "0.1"], check=False)
+    assert result.returncode == 1
+    assert "needs root and network namespace support" in result.stdout
+    assert "Operation not permitted" in result.stdout
+
+
+@pytest.mark.skipif(not real_namespaces(), reason="needs real network namespaces and iptables")
+def test_forward_through_nat(tmp_path):
+    output = tmp_path / "bench.json"
+    env = dict(os.environ, PATH=SYSTEM_PATH)
+    subprocess.run(["pi-bridge", "bench", "forward", "--duration", "0.5", "--pings", "50",
+                    "--output", str(output)], env=env, check=True, capture_output=True)
+    results = json.loads(output.read_text())
+    assert "-t nat -A POSTROUTING -o pib-wan0 -j MASQUERADE" in results["rules"]
+    assert results["tcp"]["mbit_s"] > 0
+    assert results["udp"]["pps"] > 0
+    assert results["latency"]["p50_us"] <= results["latency"]["p99_us"]
+    assert len(results["tcp"]["cpu"]) == os.cpu_count()
+    listed = subprocess.run(["ip", "netns", "list"], env=env, capture_output=True, text=True).stdout
+    assert "pib-bench" not in listed
@@ -0,0 +1,61 @@
+"""Tests for --format json/ndjson and --filter/--sort/--limit."""
+import json
+import subprocess
+
+PHONE = "aa:bb:cc:dd:ee:01"
+LAPTOP = "aa:bb:cc:dd:ee:02"
+TABLET = "aa:bb:cc:dd:ee:03"
+
+
+def stdout(run, cmd):
+    """A command's stdout alone; log lines stay on stderr."""
+    return run(cmd, stderr=subprocess.PIPE).stdout
+
+
+def test_clients_ndjson_selected(run, stations):
+    stations(
+        {"mac": PHONE, "signal": -48, "tx_bitrate": 144.4},
+        {"mac": LAPTOP, "signal": -77, "tx_bitrate": 6.5},
+        {"mac": TABLET, "signal": -60, "tx_bitrate": 72.2},
+    )
+    lines = stdout(run, ["pi-bridge", "clients", "--format", "ndjson",
+                         "--filter", "signal_dbm>-70", "--sort", "signal_dbm", "--limit", "1"]).splitlines()
+    assert [json.loads(line)["mac"] for line in lines] == [TABLET]
+
+    records = json.loads(stdout(run, ["pi-bridge", "clients", "--format", "json", "--sort", "tx_bitrate", "-r"]))
+    assert [r["mac"] for r in records] == [PHONE, TABLET, LAPTOP]
+    assert records[0]["signal_dbm"] == -48
+
+    # Text output is selected the same way
+    result = run(["pi-bridge", "clients", "--filter", f"mac={LAPTOP}"])
+    assert LAPTOP in result.stdout and PHONE not in result.stdout
+    assert "Total: 1 client(s)" in result.stdout
+
+
+def test_no_clients_is_empty_array(run):
+    assert json.loads(stdout(run, ["pi-bridge", "clients", "--format", "json"])) == []
+
+
+def test_status_records(run):
+    records = [json.loads(line) for line in stdout(run, ["pi-bridge", "status", "--format", "ndjson"]).splitlines()]
+    services = {r["name"]: r["state"] for r in records if r["section"] == "service"}
+    assert services["hostapd"] == "active"
+    ap = next(r for r in records if r["section"] == "ap")
+    assert ap["ssid"] == "PiNet" and ap["interface"] == "wlan1"
+    assert next(r for r in records if r["section"] == "nat")["wan_interface"] == "eth0"
+
+    inactive = json.loads(stdout(run, ["pi-bridge", "status", "--format", "json",
+                                       "--filter", "section=service", "--filter", "state!=active"]))
+    assert inactive == []
+
+
+def test_forwarding_and_interface(run):
+    records = json.loads(stdout(run, ["pi-bridge", "forwarding", "list", "--format", "json"]))
+    assert {"interface": "eth0", "ap_interface": "wlan1"} in records
+    assert stdout(run, ["pi-bridge", "interface", "show", "--format", "ndjson"]) == '{"interface": "wlan1"}\n'
+
+
+def test_bad_filter_rejected(run):
+    result = run(["pi-bridge", "clients", "--filter", "signal"], check=False)
+    assert result.returncode == 2
+    assert "invalid filter" in result.stdout
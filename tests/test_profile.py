@@ -0,0 +1,55 @@
+"""Tests for external-call accounting and --profile output."""
+import json
+
+
+class TestForkCounts:
+    def test_status(self, calls):
+        recorded = calls(["pi-bridge", "status"])
+        programs = [c["argv"][1] if c["sudo"] else c["argv"][0] for c in recorded]
+        assert len(recorded) == 9
+        assert programs.count("systemctl") == 4
+        assert programs.count("iptables") == 1
+
+    def test_forwarding_list_reads_one_snapshot(self, calls):
+        recorded = calls(["pi-bridge", "forwarding", "list"])
+        assert [c["argv"] for c in recorded] == [["sudo", "iptables", "-t", "nat", "-S"]]
+
+    def test_clients(self, calls):
+        recorded = calls(["pi-bridge", "clients"])
+        assert len(recorded) == 1
+
+    def test_batch_shares_snapshot(self, calls):
+        recorded = calls(["pi-bridge", "batch"],
+                         input="forwarding list\nforwarding list\nstatus\n")
+        iptables = [c for c in recorded if "iptables" in c["argv"]]
+        # status reads POSTROUTING itself; the two lists share one nat snapshot
+        assert len(iptables) == 2
+
+    def test_records_sudo_and_exit_status(self, calls):
+        recorded = calls(["pi-bridge", "forwarding", "list"])
+        assert recorded[0]["sudo"] is True
+        assert recorded[0]["returncode"] == 0
+        assert recorded[0]["duration_ms"] >= 0
+
+
+class TestProfile:
+    def test_summary(self, run):
+        result = run(["pi-bridge", "--profile", "status"])
+        assert "Profile:" in result.stdout
+        assert "9 external call(s)" in result.stdout
+        assert "systemctl" in result.stdout
+
+    def test_profile_after_command_belongs_to_it(self, run):
+        result = run(["pi-bridge", "forwarding", "list", "--profile"], check=False)
+        assert result.returncode == 2
+        assert "unrecognized arguments: --profile" in result.stdout
+        assert "Profile:" not in result.stdout
+
+    def test_trace_file(self, run, tmp_path):
+        trace = tmp_path / "trace.json"
+        run(["pi-bridge", "--profile-trace", str(trace), "forwarding", "list"])
+        events = json.loads(trace.read_text())["traceEvents"]
+        names = [e["name"] for e in events if e["ph"] == "X"]
+        assert "import forwarding" in names
+        assert "forwarding" in names
+        assert "sudo iptables -t nat -S" in names
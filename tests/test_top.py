@@ -0,0 +1,48 @@
+"""Tests for the top dashboard."""
+
+
+def test_batch_frame(run, stations):
+    stations(
+        {"mac": "aa:bb:cc:00:00:01", "signal": -48, "tx_bitrate": 866.7, "rx_bitrate": 650.0},
+        {"mac": "aa:bb:cc:00:00:02", "signal": -77, "tx_bitrate": 6.5},
+    )
+    result = run(["pi-bridge", "top", "--batch", "-n", "1"])
+    rows = result.stdout.splitlines()
+    assert rows[0].startswith('pi-bridge top: wlan1 "PiNet"')
+    assert "● hostapd" in result.stdout
+    assert "Uplink:   eth0" in result.stdout
+    assert "Clients: 2" in result.stdout
+    # Strongest first, with rates read from hostapd's control socket
+    first, second = [row for row in rows if row.startswith("aa:bb:cc")]
+    assert first.startswith("aa:bb:cc:00:00:01") and "-48 dBm" in first and "866.7 M" in first
+    assert second.startswith("aa:bb:cc:00:00:02") and "6.5 M" in second
+
+
+def test_refresh_does_not_fork(calls, stations):
+    stations({"mac": "aa:bb:cc:00:00:01", "signal": -48, "tx_bitrate": 866.7})
+    recorded = calls(["pi-bridge", "top", "--batch", "-n", "2"])
+    programs = [c["argv"][1] if c["sudo"] else c["argv"][0] for c in recorded]
+    # Startup reads config and unit states once; the second frame forks nothing
+    assert sorted(programs) == ["cat", "iptables", "journalctl", "systemctl"]
+
+
+def test_control_socket_group_setting(run):
+    conf = run(["cat", "/etc/hostapd/hostapd.conf"]).stdout
+    assert "ctrl_interface=DIR=/var/run/hostapd GROUP=netdev" in conf
+    assert "ctrl_interface_group" not in conf
+
+
+def test_warns_when_falling_back_to_iw(run, stations):
+    stations({"mac": "aa:bb:cc:00:00:01", "signal": -48, "tx_bitrate": 866.7})
+    conf = "/etc/hostapd/hostapd.conf"
+    with open(conf) as f:
+        original = f.read()
+    with open(conf, "w") as f:
+        f.write(original.replace("ctrl_interface=DIR=/var/run/hostapd", "ctrl_interface=DIR=/nonexistent"))
+    try:
+        result = run(["pi-bridge", "top", "--batch", "-n", "1"])
+    finally:
+        with open(conf, "w") as f:
+            f.write(original)
+    assert "hostapd control socket unavailable (/nonexistent/wlan1:" in result.stdout
+    assert "Clients: 1   (via iw: /nonexistent/wlan1:" in result.stdout
@@ -0,0 +1,86 @@
+"""Tests for hostapd tuning profiles."""
+import os
+from pathlib import Path
+
+import pytest
+
+HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
+
+
+@pytest.fixture(autouse=True)
+def restore_hostapd_conf():
+    original = HOSTAPD_CONF.read_bytes()
+    yield
+    HOSTAPD_CONF.write_bytes(original)
+
+
+def test_setup_writes_default_profile():
+    content = HOSTAPD_CONF.read_text()
+    assert "# pi-bridge tuning: balanced\n" in content
+    assert "wmm_ac_vo_txop_limit=47\n" in content
+    # There is no hostapd binary here, so no CONFIG_AIRTIME_POLICY either
+    assert "airtime_mode=" not in content
+
+
+def test_airtime_only_with_airtime_policy(run, tmp_path):
+    hostapd = tmp_path / "hostapd"
+    hostapd.write_bytes(b"\x7fELF...airtime_mode\x00airtime_update_interval\x00...")
+    env = dict(os.environ, PI_BRIDGE_HOSTAPD_BINARY=str(hostapd))
+    run(["pi-bridge", "tuning", "set", "low-latency"], env=env)
+    content = HOSTAPD_CONF.read_text()
+    assert "airtime_mode=2\n" in content and "airtime_update_interval=100\n" in content
+
+    hostapd.write_bytes(b"\x7fELF...")
+    result = run(["pi-bridge", "tuning", "set", "balanced"], env=env)
+    assert "built without CONFIG_AIRTIME_POLICY" in result.stdout
+    assert "airtime_" not in HOSTAPD_CONF.read_text()
+    assert "Airtime fairness: off" in run(["pi-bridge", "tuning"], env=env).stdout
+
+
+def test_setup_default_keeps_station_limit():
+    # balanced doesn't cap stations below hostapd's own default
+    assert "max_num_sta=" not in HOSTAPD_CONF.read_text()
+
+
+def test_switch_reloads_config_file(calls, sim):
+    reloads = sim("state")["state"]["hostapd"]["reloads"]
+
+    recorded = calls(["pi-bridge", "tuning", "set", "low-latency"])
+    commands = [" ".join(c["argv"]) for c in recorded]
+    # hostapd re-reads the file it was just given; no per-setting SET calls
+    assert "sudo systemctl reload hostapd" in commands
+    assert not any("hostapd_cli" in c for c in commands)
+
+    content = HOSTAPD_CONF.read_text()
+    assert content.count("# pi-bridge tuning:") == 1
+    assert "# pi-bridge tuning: low-latency\n" in content and "dtim_period=1\n" in content
+    hostapd = sim("state")["state"]["hostapd"]
+    assert hostapd["reloads"] == reloads + 1
+    assert hostapd["config"]["dtim_period"] == "1"
+    assert hostapd["config"]["wmm_ac_be_cwmax"] == "6"
+
+
+def test_switch_warns_about_station_limit(run, stations):
+    stations(*({"mac": f"aa:bb:cc:dd:ee:{i:02x}", "signal": -50, "tx_bitrate": 72.2} for i in range(14)))
+    result = run(["pi-bridge", "tuning", "set", "throughput"])
+    assert "14 clients are connected but throughput allows 12; 2 won't be able to reconnect." in result.stdout
+    assert "Tuning profile set to throughput (reload)" in result.stdout
+    assert "Tuning profile: throughput" in run(["pi-bridge", "tuning"]).stdout
+
+    result = run(["pi-bridge", "tuning", "set", "balanced"])
+    assert "won't be able to reconnect" not in result.stdout
+    assert "max_num_sta=" not in HOSTAPD_CONF.read_text()
+
+
+def test_show_station_bitrates(run, stations):
+    stations(
+        {"mac": "aa:bb:cc:dd:ee:01", "signal": -45, "tx_bitrate": 144.4, "rx_bitrate": 130.0},
+        {"mac": "aa:bb:cc:dd:ee:02", "signal": -80, "tx_bitrate": 6.0},
+    )
+    result = run(["pi-bridge", "tuning", "show"])
+    rows = [line for line in result.stdout.splitlines() if "aa:bb:cc" in line]
+    # The slow station needs most of the airtime, and is listed first
+    assert "aa:bb:cc:dd:ee:02" in rows[0] and "96%" in rows[0]
+    assert "aa:bb:cc:dd:ee:01" in rows[1] and "4%" in rows[1]
+    assert "TX bitrate: min 6.0, median 75.2, max 144.4 Mbit/s" in result.stdout
+    assert "1 station(s) at 802.11g rates or below" in result.stdout
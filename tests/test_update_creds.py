@@ -0,0 +1,88 @@
+"""Tests for credential rotation by reloading hostapd."""
+import subprocess
+from pathlib import Path
+
+import pytest
+
+HOSTAPD_CONF = Path("/etc/hostapd/hostapd.conf")
+
+
+@pytest.fixture(autouse=True)
+def restore_hostapd_conf():
+    original = HOSTAPD_CONF.read_bytes()
+    yield
+    HOSTAPD_CONF.write_bytes(original)
+
+
+def programs(recorded):
+    return [" ".join(c["argv"][1:] if c["sudo"] else c["argv"]) for c in recorded]
+
+
+def test_passphrase_rotation_reloads(calls, run):
+    recorded = calls(["pi-bridge", "update-creds", "--passphrase-stdin"], input="rotated-secret\n")
+    commands = programs(recorded)
+    assert "systemctl reload hostapd" in commands
+    assert not any(c.startswith("systemctl restart") for c in commands)
+    # The secret only travels over stdin into hostapd.conf, never on a command line
+    assert not any("rotated-secret" in " ".join(c["argv"]) for c in recorded)
+    assert "wpa_passphrase=rotated-secret" in HOSTAPD_CONF.read_text()
+    assert "Rotated" not in run(["hostapd_cli", "-i", "wlan1", "status"]).stdout
+
+
+def test_ssid_rotation(run):
+    result = run(["pi-bridge", "update-creds", "--ssid", "Rotated Net"])
+    assert "Credentials updated (reload)" in result.stdout
+    assert "ssid=Rotated Net" in HOSTAPD_CONF.read_text()
+    assert run(["hostapd_cli", "-i", "wlan1", "status"]).stdout.count("ssid[0]=Rotated Net") == 1
+
+
+def test_passphrase_written_literally(run):
+    run(["pi-bridge", "update-creds", "--passphrase-stdin"], input="back\\slash\\1 pass\n")
+    assert "wpa_passphrase=back\\slash\\1 pass\n" in HOSTAPD_CONF.read_text()
+
+
+def test_rejects_bad_ssid(run):
+    original = HOSTAPD_CONF.read_text()
+    result = run(["pi-bridge", "update-creds", "--ssid", "x" * 33], check=False)
+    assert result.returncode != 0
+    assert "SSID must be at most 32 bytes" in result.stdout
+    result = run(["pi-bridge", "update-creds", "--ssid", "net\nmacaddr_acl=1"], check=False)
+    assert "SSID must not contain control characters" in result.stdout
+    assert HOSTAPD_CONF.read_text() == original
+
+
+def reconnect(output: str) -> float:
+    """Seconds until every client was back, from update-creds --measure."""
+    line = next(line for line in output.splitlines() if "Reconnect:" in line)
+    return float(line.split(" in ")[1].split("s ")[0])
+
+
+def test_reload_outage_is_shorter_than_restart(run, stations):
+    # Reloading still deauthenticates every station, but the radio stays up
+    stations({"mac": "aa:bb:cc:dd:ee:01", "signal": -50, "tx_bitrate": 72.2},
+             {"mac": "aa:bb:cc:dd:ee:02", "signal": -60, "tx_bitrate": 65.0})
+    reload = run(["pi-bridge", "update-creds", "--passphrase-stdin", "--measure"],
+                 input="rotated-secret\n").stdout
+    assert "Reconnect: 2/2 client(s)" in reload and "(2 dropped)" in reload
+
+    restart = run(["pi-bridge", "update-creds", "--passphrase-stdin", "--measure", "--restart"],
+                  input="rotated-secret\n").stdout
+    assert "Credentials updated (restart)" in restart and "(2 dropped)" in restart
+    # The simulated restart keeps the AP down 1.5 s longer than the longest reassociation spread
+    assert reconnect(restart) > 1.5
+    assert reconnect(reload) < 3.0 + 0.5
+
+
+def test_falls_back_to_restart(calls, sim):
+    sim("fault", command="systemctl", match="reload hostapd", returncode=1,
+        stderr="Failed to reload hostapd.service: Job type reload is not applicable for unit hostapd.service.")
+    commands = programs(calls(["pi-bridge", "update-creds", "--passphrase-stdin"],
+                              input="rotated-secret\n"))
+    assert "systemctl restart hostapd" in commands
+
+
+def test_rejects_short_passphrase(run):
+    result = run(["pi-bridge", "update-creds", "--passphrase-stdin"], input="short\n", check=False)
+    assert result.returncode == 1
+    assert "8-63 characters" in result.stdout
+    assert "wpa_passphrase=testpassword" in HOSTAPD_CONF.read_text()
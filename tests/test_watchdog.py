@@ -0,0 +1,133 @@
+"""Tests for the watchdog command."""
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+
+@pytest.fixture
+def watchdog(run, tmp_path):
+    """Run `pi-bridge watchdog --once` with its own state dir; returns (result, incidents)."""
+    env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+
+    def _watchdog(*args):
+        result = run(["pi-bridge", "watchdog", "--once", "--settle", "0", *args], env=env, check=False)
+        log = tmp_path / "watchdog.jsonl"
+        incidents = [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+        return result, incidents
+
+    yield _watchdog
+    run(["systemctl", "start", "wlan1-static-ip", "hostapd", "dnsmasq"])
+    run(["ip", "link", "set", "wlan1", "up"])
+
+
+def test_healthy(watchdog):
+    result, incidents = watchdog()
+    assert result.returncode == 0
+    assert "AP healthy" in result.stdout
+    assert incidents == []
+
+
+def test_restarts_crashed_hostapd(run, watchdog):
+    run(["systemctl", "stop", "hostapd"])
+    result, incidents = watchdog()
+    assert result.returncode == 0
+    assert "hostapd inactive" in result.stdout
+    [incident] = incidents
+    # reload is skipped when hostapd is not running
+    assert [a["action"] for a in incident["actions"]] == ["restart"]
+    assert incident["recovery_s"] is not None
+
+
+def test_escalates_when_interface_stays_down(run, watchdog):
+    run(["ip", "link", "set", "wlan1", "down"])
+    result, incidents = watchdog()
+    assert result.returncode == 0
+    assert "wlan1 down" in result.stdout
+    assert [a["action"] for a in incidents[0]["actions"]] == ["reload", "restart"]
+
+
+def test_gives_up_when_repairs_fail(run, watchdog, sim):
+    run(["systemctl", "stop", "hostapd"])
+    sim("fault", command="systemctl", match="restart")
+    result, incidents = watchdog()
+    assert result.returncode == 1
+    assert "AP still unhealthy" in result.stdout
+    assert incidents[0]["recovered"] is None
+    first = incidents[0]["actions"][0]
+    assert (first["action"], first["ok"]) == ("restart", False)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """Start `pi-bridge watchdog` in the background; returns a reader for its incident log."""
+    env = dict(os.environ, PI_BRIDGE_STATE_DIR=str(tmp_path))
+    processes = []
+
+    def _daemon(*args):
+        processes.append(subprocess.Popen(
+            ["pi-bridge", "watchdog", "--interval", "0.2", "--settle", "0", *args],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+
+        def incidents():
+            log = tmp_path / "watchdog.jsonl"
+            return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+        return incidents
+
+    yield _daemon
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.1)
+
+
+# Stations fixtures come first in the test arguments so the daemon is stopped
+# before they are cleared
+CLIENTS = ({"mac": "aa:bb:cc:dd:ee:01", "signal": -50, "tx_bitrate": 72.2},
+           {"mac": "aa:bb:cc:dd:ee:02", "signal": -60, "tx_bitrate": 65.0})
+
+
+def test_station_drop_stays_open_until_clients_return(stations, sim, daemon):
+    stations(*CLIENTS)
+    incidents = daemon()
+    # Let it see the clients first
+    time.sleep(1.5)
+    reloads = sim("state")["state"]["hostapd"]["reloads"]
+    stations()
+    wait_for(lambda: sim("state")["state"]["hostapd"]["reloads"] > reloads)
+    # The reload brought nobody back, so the incident isn't closed as recovered
+    time.sleep(1.0)
+    assert incidents() == []
+
+    stations(*CLIENTS)
+    wait_for(lambda: incidents())
+    [incident] = incidents()
+    assert incident["problems"] == ["stations dropped from 2 to 0"]
+    # Clients get time to reassociate before the watchdog escalates
+    assert [a["action"] for a in incident["actions"]] == ["reload"]
+    assert incident["recovery_s"] >= 1.0
+
+
+def test_station_drop_times_out(stations, daemon):
+    stations(*CLIENTS)
+    incidents = daemon("--station-timeout", "1")
+    time.sleep(1.5)
+
+    stations()
+    wait_for(lambda: incidents())
+    [incident] = incidents()
+    assert incident["recovered"] is None
+    assert [a["action"] for a in incident["actions"]] == ["reload"]
+    # An empty AP is now normal: no new incident
+    time.sleep(1.0)
+    assert len(incidents()) == 1